@@ -0,0 +1,146 @@
+import os
+import sys
+import csv
+import json
+import math
+import argparse
+import collections
+import concurrent.futures
+import multiprocessing
+from components.file_listing import list_image_files
+from components.file_filter import compile_filter, match_files
+from components.decoding import is_tiff, decode_image
+from components.tiff_reader import TiffRegionReader
+from components.image_metrics import compare
+
+# Headless comparison of two folders: files are listed and filtered like the
+# viewer does, paired by position (what the arrow keys show side by side), and
+# compared in worker processes. One line is written per pair as soon as it is
+# done, so memory stays flat however many pairs there are.
+#
+#   python batch_compare.py LEFT RIGHT [--filter-a REGEX] [--filter-b REGEX]
+#                           [--format csv|jsonl] [--output FILE] [--workers N]
+
+FIELDS = ['index', 'file_a', 'file_b', 'width', 'height', 'mse', 'psnr', 'ssim', 'max_error', 'data_range', 'error']
+
+# Pairs handed to the workers ahead of the one being written, per worker
+QUEUE_PER_WORKER = 4
+
+
+def _open_source(path):
+    # (shape, dtype, rows(y0, y1), close) of an image's samples, decoded like the viewer
+    if is_tiff(path):
+        reader = TiffRegionReader.open(path)
+        if reader is not None:
+            shape = (reader.height, reader.width) + ((reader.samples,) if reader.samples > 1 else ())
+            return (shape, reader.dtype,
+                    lambda y0, y1: reader.read_region(0, 0, y0, reader.width, y1), reader.close)
+    image = decode_image(path)
+    if image.isNull():
+        raise ValueError(f"cannot decode {os.path.basename(path)}")
+    channels = image.channels
+    shape = (image.height(), image.width()) + ((channels,) if channels > 1 else ())
+    return shape, image.samples().dtype, lambda y0, y1: image.window(0, y0, image.width(), y1), lambda: None
+
+
+def compare_pair(index, path_a, path_b):
+    # Runs in a worker process
+    row = {'index': index, 'file_a': path_a, 'file_b': path_b}
+    sources = []
+    try:
+        sources.append(_open_source(path_a))
+        sources.append(_open_source(path_b))
+        (shape_a, dtype_a, rows_a, _), (shape_b, dtype_b, rows_b, _) = sources
+        row.update(compare(rows_a, rows_b, shape_a, shape_b, dtype_a, dtype_b).as_dict())
+    except Exception as e:
+        row['error'] = str(e) or type(e).__name__
+    finally:
+        for source in sources:
+            source[3]()
+    return row
+
+
+def list_side(folder, pattern):
+    files = list_image_files(folder)
+    regex = compile_filter(pattern)
+    return match_files(files, {}, regex) if regex is not None else files
+
+
+class _CsvWriter:
+    def __init__(self, stream):
+        self.writer = csv.DictWriter(stream, FIELDS, extrasaction='ignore')
+        self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+
+class _JsonLinesWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, row):
+        # Identical images have an infinite PSNR, which JSON cannot represent
+        row = {k: (None if isinstance(v, float) and not math.isfinite(v) else v) for k, v in row.items()}
+        self.stream.write(json.dumps(row) + '\n')
+
+
+def run(pairs, writer, workers, flush):
+    # Keeps at most workers * QUEUE_PER_WORKER pairs in flight and writes the
+    # results in pair order
+    failed = 0
+    # spawn: the same start method on every platform, and no inherited state
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        pending = collections.deque()
+        try:
+            for pair in pairs:
+                pending.append(executor.submit(compare_pair, *pair))
+                if len(pending) >= workers * QUEUE_PER_WORKER:
+                    failed += _write(pending.popleft().result(), writer, flush)
+            while pending:
+                failed += _write(pending.popleft().result(), writer, flush)
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+    return failed
+
+
+def _write(row, writer, flush):
+    writer.write(row)
+    flush()
+    return 1 if row.get('error') else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the images of two folders pair by pair (PSNR, SSIM, max error)")
+    parser.add_argument('folder_a')
+    parser.add_argument('folder_b')
+    parser.add_argument('--filter-a', default='', help="regex on the file names of folder A, as in the viewer")
+    parser.add_argument('--filter-b', default='', help="regex on the file names of folder B")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    parser.add_argument('--output', help="file to write (default: standard output)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    files_a = list_side(args.folder_a, args.filter_a)
+    files_b = list_side(args.folder_b, args.filter_b)
+    count = min(len(files_a), len(files_b))
+    if len(files_a) != len(files_b):
+        print(f"{len(files_a)} files in A, {len(files_b)} in B: comparing the first {count} pairs", file=sys.stderr)
+    pairs = ((i, files_a[i], files_b[i]) for i in range(count))
+
+    stream = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        writer = (_CsvWriter if args.format == 'csv' else _JsonLinesWriter)(stream)
+        failed = run(pairs, writer, max(1, args.workers), stream.flush)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    if failed:
+        print(f"{failed} of {count} pairs could not be compared", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import concurrent.futures
+import numpy as np
+import tifffile
+
+# Decode throughput of compressed TIFFs with decode threads vs. worker processes,
+# for an increasing number of workers. Threads stop scaling once the codecs and
+# the numpy conversion contend for the GIL; processes keep scaling with cores.
+#
+#   python benchmarks/decode_scaling.py [--files 16] [--size 2048] [--compression zlib]
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from components.decoding import decode_image, decode_for_display # noqa: E402
+from components.process_decode import ProcessDecoder # noqa: E402
+
+
+def make_files(folder, count, size, compression):
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:size, 0:size]
+    base = ((x + y) * (65535 / (2 * size))).astype(np.uint16)
+    paths = []
+    for i in range(count):
+        data = base + rng.integers(0, 512, (size, size), dtype=np.uint16)
+        path = os.path.join(folder, f"frame_{i:03d}.tif")
+        tifffile.imwrite(path, data, compression=compression, tile=(256, 256))
+        paths.append(path)
+    return paths
+
+
+def run(paths, workers, decode):
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        for decoded in executor.map(decode, paths):
+            if decoded.isNull():
+                raise RuntimeError("decode failed")
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TIFF decode scaling: threads vs. processes")
+    parser.add_argument('--files', type=int, default=16)
+    parser.add_argument('--size', type=int, default=2048)
+    parser.add_argument('--compression', default='zlib')
+    parser.add_argument('--workers', type=int, nargs='*')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    workers = args.workers or sorted({1, 2, 4, cores} | ({cores // 2} if cores > 4 else set()))
+    print(f"{args.files} x {args.size}x{args.size} uint16 TIFF ({args.compression}), {cores} cores")
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = make_files(folder, args.files, args.size, args.compression)
+        print(f"{'workers':>7} | {'threads s':>9} {'img/s':>7} {'x':>5} | {'procs s':>9} {'img/s':>7} {'x':>5}")
+        base_threads = base_procs = None
+        for n in workers:
+            t_threads = run(paths, n, decode_image)
+
+            processes = ProcessDecoder(n)
+            try:
+                # Start the worker processes before timing
+                run(paths[:n], n, lambda p: decode_for_display(p, None, processes))
+                t_procs = run(paths, n, lambda p: decode_for_display(p, None, processes))
+            finally:
+                processes.shutdown()
+
+            base_threads = base_threads or t_threads
+            base_procs = base_procs or t_procs
+            print(f"{n:>7} | {t_threads:>9.2f} {len(paths) / t_threads:>7.1f} {base_threads / t_threads:>5.2f}"
+                  f" | {t_procs:>9.2f} {len(paths) / t_procs:>7.1f} {base_procs / t_procs:>5.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import numpy as np
+import tifffile
+
+# Timings of the paths that decide how the viewer feels: listing a folder,
+# filtering it, decoding each format and sample type, the high-bit-depth
+# conversion, and how long a panel takes from load_image() to pixels on screen.
+# Everything runs on synthetic data with the offscreen Qt platform; results go
+# to JSON so two versions can be compared.
+#
+#   python benchmarks/suite.py [--files 20000] [--sizes 512 2048] [--output run.json]
+#                              [--baseline previous.json]
+#
+# Sizes up to 16384 are supported (--sizes 512 4096 16384); the largest take a
+# while to generate and several GB of temporary disk space.
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt6.QtCore import QEventLoop, PYQT_VERSION_STR # noqa: E402
+from PyQt6.QtWidgets import QApplication # noqa: E402
+from components.file_listing import list_image_files # noqa: E402
+from components.file_filter import compile_filter, match_files # noqa: E402
+from components.folder_index import FolderIndex # noqa: E402
+from components.decoding import decode_image, array_to_qimage # noqa: E402
+from components.dtype_convert import to_uint8 # noqa: E402
+from components.image_cache import ImageCache # noqa: E402
+from components.decode_pool import DecodePool # noqa: E402
+from components.image_panel import ImagePanel # noqa: E402
+
+# (format, sample type) of the generated images; Qt writes the 8-bit formats
+IMAGE_KINDS = [('jpg', 'uint8'), ('png', 'uint8'), ('webp', 'uint8'),
+               ('tif', 'uint8'), ('tif', 'uint16'), ('tif', 'float32')]
+
+# Names mixed into the listing folder besides images
+_OTHER_NAMES = ['.txt', '.json', '.xml', '.raw']
+
+# A panel that has not shown its image after this long counts as failed (ms)
+LOAD_TIMEOUT_MS = 120000
+
+
+def make_pixels(size, dtype, rng):
+    # Smooth gradients with noise: compresses like real photos, not like constant data
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / max(1, size - 1)
+    rgb = np.stack([x, y, (x + y) / 2], axis=2)
+    rgb += rng.normal(0, 0.02, rgb.shape).astype(np.float32)
+    np.clip(rgb, 0, 1, out=rgb)
+    if dtype == 'float32':
+        return rgb[..., 0] * 1000 - 200 # Grey, outside [0, 1] like measured data
+    if dtype == 'uint16':
+        return (rgb[..., 0] * 65535).astype(np.uint16)
+    return (rgb * 255).astype(np.uint8)
+
+
+def make_images(folder, sizes, kinds=IMAGE_KINDS):
+    # One file per (size, format, sample type): {name: path}
+    rng = np.random.default_rng(0)
+    images = {}
+    for size in sizes:
+        for ext, dtype in kinds:
+            data = make_pixels(size, dtype, rng)
+            path = os.path.join(folder, f"{size}_{dtype}.{ext}")
+            if ext == 'tif':
+                tifffile.imwrite(path, data, compression='zlib', tile=(256, 256) if size > 1024 else None)
+            elif not array_to_qimage(data).save(path, None, 90):
+                print(f"Cannot write {ext} here, skipped", file=sys.stderr)
+                continue
+            images[f"{ext}.{dtype}.{size}"] = path
+    return images
+
+
+def make_listing(folder, count):
+    # count empty files with image names (and a few others): only names matter when listing
+    exts = ['.jpg', '.png', '.webp', '.tif', '.TIFF']
+    for i in range(count):
+        ext = _OTHER_NAMES[i % len(_OTHER_NAMES)] if i % 10 == 9 else exts[i % len(exts)]
+        open(os.path.join(folder, f"cam{i % 4}_frame_{i:07d}{ext}"), 'wb').close()
+
+
+def summarize(times):
+    return {'runs': len(times), 'min': min(times), 'median': statistics.median(times),
+            'mean': statistics.fmean(times), 'max': max(times)}
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return summarize(times)
+
+
+def bench_listing(folder, repeat, results):
+    results['list.files'] = timed(lambda: list_image_files(folder), repeat)
+    # Reopening a folder: the listing comes from the on-disk index instead
+    with tempfile.TemporaryDirectory() as db_folder:
+        index = FolderIndex(os.path.join(db_folder, 'index.sqlite'))
+        files = list_image_files(folder)
+        entries = {os.path.basename(p): (0, 0) for p in files}
+        index.store(folder, 1, entries)
+        results['list.index_load'] = timed(lambda: index.load(folder), repeat)
+        index.close()
+    return files
+
+
+def bench_filter(files, repeat, results):
+    names = {p: os.path.basename(p) for p in files}
+    for label, pattern in (('substring', 'cam2'), ('regex', r'frame_\d+5\.(png|tif)$')):
+        regex = compile_filter(pattern)
+        results[f'filter.{label}'] = timed(lambda: match_files(files, names, regex), repeat)
+
+
+def bench_decode(images, repeat, results):
+    for name, path in images.items():
+        results[f'decode.{name}'] = timed(lambda: decode_image(path), repeat)
+
+
+def bench_convert(sizes, repeat, results):
+    rng = np.random.default_rng(1)
+    for size in sizes:
+        for dtype in ('uint16', 'float32'):
+            data = make_pixels(size, dtype, rng)
+            results[f'convert.{dtype}.{size}'] = timed(lambda: to_uint8(data), repeat)
+
+
+def _wait(done, timeout_ms):
+    # Pumps events until done() or the timeout; returns when it happened, or None
+    start = time.perf_counter()
+    loop = QEventLoop()
+    while not done():
+        if (time.perf_counter() - start) * 1000 > timeout_ms:
+            return None
+        loop.processEvents(QEventLoop.ProcessEventsFlag.WaitForMoreEvents, 5)
+    return time.perf_counter()
+
+
+def bench_panel(app, images, repeat, results):
+    # load_image() to the first pixels (preview or full image) and to the full image,
+    # with a cold cache every run
+    cache = ImageCache()
+    pool = DecodePool(cache)
+    panel = ImagePanel(cache=cache, pool=pool)
+    panel.resize(1200, 800)
+    panel.show()
+    app.processEvents()
+    loaded = []
+    panel.image_changed.connect(lambda: loaded.append(True))
+    for name, path in images.items():
+        first, full = [], []
+        for _ in range(repeat):
+            panel.load_image(None)
+            cache.clear()
+            loaded.clear()
+            start = time.perf_counter()
+            panel.load_image(path)
+            t_first = _wait(lambda: loaded or panel.showing_preview, LOAD_TIMEOUT_MS)
+            t_full = _wait(lambda: loaded, LOAD_TIMEOUT_MS)
+            if t_first is None or t_full is None:
+                print(f"Timed out loading {name}", file=sys.stderr)
+                break
+            first.append(t_first - start)
+            full.append(t_full - start)
+            app.processEvents() # Paint before the next run
+        if full:
+            results[f'panel.first_pixels.{name}'] = summarize(first)
+            results[f'panel.full_image.{name}'] = summarize(full)
+    panel.load_image(None)
+    pool.wait()
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {'commit': commit or None, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'cpus': os.cpu_count(), 'numpy': np.__version__, 'tifffile': tifffile.__version__,
+            'pyqt': PYQT_VERSION_STR, 'args': vars(args)}
+
+
+def print_comparison(results, baseline):
+    # Median of every timing against the same timing of an earlier run
+    old = baseline.get('results', {})
+    print(f"{'benchmark':<40} {'median ms':>10} {'before':>10} {'change':>8}")
+    for name, stats in results.items():
+        now = stats['median'] * 1000
+        before = old.get(name, {}).get('median')
+        if before is None:
+            print(f"{name:<40} {now:>10.2f} {'-':>10} {'':>8}")
+        else:
+            before *= 1000
+            change = (now - before) / before * 100 if before else 0.0
+            print(f"{name:<40} {now:>10.2f} {before:>10.2f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan, filter, decode and first-paint benchmarks")
+    parser.add_argument('--files', type=int, default=20000, help="files in the listing folder")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[512, 2048], help="image sides to generate")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per case")
+    parser.add_argument('--output', help="JSON file to write (default: standard output)")
+    parser.add_argument('--baseline', help="JSON of an earlier run to compare with")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = {}
+    with tempfile.TemporaryDirectory() as listing_folder, tempfile.TemporaryDirectory() as image_folder:
+        make_listing(listing_folder, args.files)
+        images = make_images(image_folder, args.sizes)
+
+        files = bench_listing(listing_folder, args.repeat, results)
+        bench_filter(files, args.repeat, results)
+        bench_decode(images, args.repeat, results)
+        bench_convert(args.sizes, args.repeat, results)
+        bench_panel(app, images, args.repeat, results)
+
+    report = {'environment': environment(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+import io
+import os
+import re
+import bz2
+import gzip
+import json
+import lzma
+import hashlib
+import struct
+import tarfile
+import threading
+import zipfile
+import zlib
+from collections import OrderedDict
+from components.file_listing import is_image_name
+
+# ZIP and TAR archives opened like folders. A member is addressed as if the
+# archive were a directory, "<archive>/<member name>", so it sorts, filters and
+# pairs by its base name like a file. The archive is indexed once (the ZIP central directory
+# or the TAR headers) and the index is kept on disk; members are then read
+# straight from the archive: stored members through a seekable window onto it,
+# compressed ones decompressed into memory. Open file handles are pooled per
+# archive. No Qt in here.
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# The first path component with an archive suffix that has more path after it
+_MEMBER_PATH = re.compile(r'^(.*?(?:%s))[/\\](.+)$' % '|'.join(re.escape(s) for s in ARCHIVE_SUFFIXES),
+                          re.IGNORECASE | re.DOTALL)
+
+# Idle file handles kept open per archive
+HANDLES_PER_ARCHIVE = 4
+
+# Archives whose index (and handles) stay in memory
+MAX_OPEN_ARCHIVES = 8
+
+# Archive indexes kept on disk; the least recently used ones are deleted beyond this
+MAX_STORED_INDEXES = 64
+
+INDEX_VERSION = 1
+
+# Local file header of a ZIP member: signature, ..., name length, extra length
+_ZIP_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+
+_index_directory = None
+
+
+def set_index_directory(directory):
+    # Where archive indexes are stored (None: rebuilt once per session)
+    global _index_directory
+    _index_directory = directory
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def member_path(archive, name):
+    return archive + '/' + name
+
+
+def split_member(path):
+    # (archive, member name) of a member path, or None for a plain file (also
+    # one inside a directory that merely has an archive's name)
+    match = _MEMBER_PATH.match(path)
+    if match is None or not os.path.isfile(match.group(1)):
+        return None
+    return match.group(1), match.group(2)
+
+
+def is_member(path):
+    return split_member(path) is not None
+
+
+def disk_path(path):
+    # The file on disk that holds path: its archive for a member
+    member = split_member(path)
+    return member[0] if member is not None else path
+
+
+def _stream_opener(path):
+    # Opens the (decompressed) byte stream a TAR archive's offsets refer to
+    lower = path.lower()
+    if lower.endswith(('.tar.gz', '.tgz')):
+        return gzip.open
+    if lower.endswith(('.tar.bz2', '.tbz2')):
+        return bz2.open
+    if lower.endswith(('.tar.xz', '.txz')):
+        return lzma.open
+    return _open_binary
+
+
+def _open_binary(path):
+    return open(path, 'rb')
+
+
+# Where a member's bytes are: for ZIP the local header offset (the data offset
+# is resolved on the first read), for TAR the data offset in the stream
+class _Member:
+    __slots__ = ('offset', 'size', 'method', 'stored_size', 'data_offset')
+
+    def __init__(self, offset, size, method, stored_size, data_offset=None):
+        self.offset = offset
+        self.size = size
+        self.method = method # ZIP compression method; 0 (stored) for TAR
+        self.stored_size = stored_size
+        self.data_offset = data_offset
+
+
+class Archive:
+    def __init__(self, path, kind, members):
+        self.path = path
+        self.kind = kind # 'zip' or 'tar'
+        self.members = members # name -> _Member
+        self._opener = _open_binary if kind == 'zip' else _stream_opener(path)
+        # Plain files seek; a compressed TAR is a stream that only seeks forward cheaply
+        self.seekable = self._opener is _open_binary
+        self._lock = threading.Lock()
+        self._idle = [] # Pooled handles
+
+    @classmethod
+    def build(cls, path, token=None):
+        # Reads the central directory or walks the TAR headers
+        members = {}
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as zf:
+                for info in zf.infolist():
+                    if token is not None:
+                        token.check()
+                    if info.is_dir() or info.flag_bits & 0x1 or not is_image_name(info.filename):
+                        continue # Directories, encrypted members, other files
+                    members[info.filename] = _Member(info.header_offset, info.file_size,
+                                                     info.compress_type, info.compress_size)
+            return cls(path, 'zip', members)
+        with tarfile.open(path, 'r:*') as tf:
+            for info in tf:
+                if token is not None:
+                    token.check()
+                if info.isfile() and not info.sparse and is_image_name(info.name):
+                    members[info.name] = _Member(info.offset_data, info.size, 0, info.size, info.offset_data)
+        return cls(path, 'tar', members)
+
+    def names(self):
+        return sorted(self.members)
+
+    def _borrow(self, offset):
+        with self._lock:
+            if self.seekable:
+                if self._idle:
+                    return self._idle.pop()
+            else:
+                # A stream skips forward by decompressing the gap but starts over to
+                # go back: take the handle closest before offset
+                before = [fh for fh in self._idle if fh.tell() <= offset]
+                if before:
+                    fh = max(before, key=lambda fh: fh.tell())
+                    self._idle.remove(fh)
+                    return fh
+        return self._opener(self.path)
+
+    def _give_back(self, fh):
+        with self._lock:
+            if len(self._idle) < HANDLES_PER_ARCHIVE:
+                self._idle.append(fh)
+                return
+        fh.close()
+
+    def read_at(self, offset, size):
+        fh = self._borrow(offset)
+        try:
+            fh.seek(offset)
+            data = fh.read(size)
+        except BaseException:
+            fh.close()
+            raise
+        self._give_back(fh)
+        return data
+
+    def readinto_at(self, offset, buffer):
+        # Fills buffer from offset without an intermediate copy; returns the count read
+        fh = self._borrow(offset)
+        try:
+            fh.seek(offset)
+            count = fh.readinto(buffer)
+        except BaseException:
+            fh.close()
+            raise
+        self._give_back(fh)
+        return count
+
+    def _data_offset(self, member):
+        if member.data_offset is None:
+            header = _ZIP_LOCAL_HEADER.unpack(self.read_at(member.offset, _ZIP_LOCAL_HEADER.size))
+            if header[0] != b'PK\x03\x04':
+                raise ValueError(f"Bad ZIP member header in {os.path.basename(self.path)}")
+            member.data_offset = member.offset + _ZIP_LOCAL_HEADER.size + header[10] + header[11]
+        return member.data_offset
+
+    def open(self, name):
+        # Binary file object of a member: a window onto the archive when it is
+        # stored in a seekable archive, else the decompressed bytes in memory
+        member = self.members.get(name)
+        if member is None:
+            raise FileNotFoundError(f"{name} not in {self.path}")
+        offset = self._data_offset(member)
+        if member.method == zipfile.ZIP_STORED and self.seekable:
+            return io.BufferedReader(_MemberWindow(self, offset, member.size))
+        return io.BytesIO(self._read(member, offset))
+
+    def read(self, name):
+        member = self.members.get(name)
+        if member is None:
+            raise FileNotFoundError(f"{name} not in {self.path}")
+        return self._read(member, self._data_offset(member))
+
+    def _read(self, member, offset):
+        data = self.read_at(offset, member.stored_size)
+        if member.method == zipfile.ZIP_STORED:
+            return data
+        if member.method == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(data, -15)
+        if member.method == zipfile.ZIP_BZIP2:
+            return bz2.decompress(data)
+        raise ValueError(f"Unsupported ZIP compression {member.method}")
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for fh in idle:
+            fh.close()
+
+    def to_json(self):
+        return {'kind': self.kind,
+                'members': [[name, m.offset, m.size, m.method, m.stored_size] for name, m in self.members.items()]}
+
+    @classmethod
+    def from_json(cls, path, state):
+        members = {}
+        for name, offset, size, method, stored_size in state['members']:
+            members[name] = _Member(offset, size, method, stored_size, offset if state['kind'] == 'tar' else None)
+        return cls(path, state['kind'], members)
+
+
+# A stored member as a raw, seekable file: each read borrows a pooled handle of
+# the archive, so concurrent readers (e.g. region workers) never share a position
+class _MemberWindow(io.RawIOBase):
+    def __init__(self, archive, offset, size):
+        super().__init__()
+        self.archive = archive
+        self.offset = offset
+        self.size = size
+        self.name = archive.path
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            pos += self._pos
+        elif whence == io.SEEK_END:
+            pos += self.size
+        self._pos = max(0, pos)
+        return self._pos
+
+    def readinto(self, buffer):
+        count = max(0, min(len(buffer), self.size - self._pos))
+        if count == 0:
+            return 0
+        count = self.archive.readinto_at(self.offset + self._pos, memoryview(buffer)[:count])
+        self._pos += count
+        return count
+
+
+_archives = OrderedDict() # (path, mtime_ns, size) -> Archive
+_archives_lock = threading.Lock()
+
+
+def _index_file(key):
+    digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    return os.path.join(_index_directory, digest + '.json')
+
+
+def _load_index(path, key):
+    if _index_directory is None:
+        return None
+    try:
+        with open(_index_file(key), encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('version') != INDEX_VERSION:
+            return None
+        os.utime(_index_file(key)) # Marks it as recently used
+        return Archive.from_json(path, state)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _store_index(archive, key):
+    if _index_directory is None:
+        return
+    state = archive.to_json()
+    state['version'] = INDEX_VERSION
+    path = _index_file(key)
+    try:
+        os.makedirs(_index_directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp, path) # Readers never see a half-written file
+        stored = sorted((os.path.getmtime(p), p) for p in
+                        (os.path.join(_index_directory, n) for n in os.listdir(_index_directory)))
+        for _, old in stored[:-MAX_STORED_INDEXES]:
+            os.remove(old)
+    except OSError as e:
+        print(f"Could not store archive index: {e}")
+
+
+def open_archive(path, token=None):
+    # The indexed Archive of path, indexing it on first use. An archive that was
+    # rewritten (new mtime or size) is indexed again.
+    st = os.stat(path)
+    key = (os.path.normcase(os.path.abspath(path)), st.st_mtime_ns, st.st_size)
+    with _archives_lock:
+        archive = _archives.get(key)
+        if archive is not None:
+            _archives.move_to_end(key)
+            return archive
+    archive = _load_index(path, key)
+    if archive is None:
+        archive = Archive.build(path, token)
+        _store_index(archive, key)
+    with _archives_lock:
+        archive = _archives.setdefault(key, archive)
+        _archives.move_to_end(key)
+        while len(_archives) > MAX_OPEN_ARCHIVES:
+            _, old = _archives.popitem(last=False)
+            old.close()
+    return archive
+
+
+def list_archive(path, token=None):
+    # Sorted member paths of the images in an archive
+    return [member_path(path, name) for name in open_archive(path, token).names()]
+
+
+def open_member(path):
+    archive, name = split_member(path)
+    return open_archive(archive).open(name)
+
+
+def read_member(path):
+    archive, name = split_member(path)
+    return open_archive(archive).read(name)
+
+
+def file_source(path):
+    # What to hand a reader that takes a path or a file object (e.g. tifffile)
+    return open_member(path) if is_member(path) else path
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt6.QtGui import QImage, qRgb
+from components.decoding import DecodedImage, CancelToken, DecodeCancelled, qimage_array
+from components.image_metrics import compare, heat_lut
+
+# Metrics remembered per file pair (heatmaps live in the shared image cache)
+MAX_RESULTS = 256
+
+
+class CompareSignals(QObject):
+    done = pyqtSignal(object, object, object, object) # pair key, CompareResult, DecodedImage heatmap, error
+
+
+class CompareTask(QRunnable):
+    def __init__(self, key, source_a, source_b, signals, token):
+        super().__init__()
+        self.key = key
+        self.source_a = source_a
+        self.source_b = source_b
+        self.signals = signals
+        self.token = token
+
+    def run(self):
+        (shape_a, dtype_a, rows_a), (shape_b, dtype_b, rows_b) = self.source_a, self.source_b
+        try:
+            height, width = min(shape_a[0], shape_b[0]), min(shape_a[1], shape_b[1])
+            # The heat indices are written straight into an 8-bit indexed image;
+            # Qt applies the colour map when converting it for display
+            heat = QImage(width, height, QImage.Format.Format_Indexed8)
+            heat.setColorTable([qRgb(int(r), int(g), int(b)) for r, g, b in heat_lut()])
+            result = compare(rows_a, rows_b, shape_a, shape_b, dtype_a, dtype_b,
+                             heat_out=qimage_array(heat, 1), token=self.token)
+            heat = heat.convertToFormat(QImage.Format.Format_RGB32)
+        except DecodeCancelled:
+            return
+        except Exception as e:
+            self.signals.done.emit(self.key, None, None, str(e))
+            return
+        self.signals.done.emit(self.key, result, DecodedImage(heat), None)
+
+
+# Compares the images of two panels in the background. One comparison runs at a
+# time; asking for another pair cancels it. Results are kept per file pair.
+class Comparer(QObject):
+    compared = pyqtSignal(object, object) # CompareResult, DecodedImage heatmap
+    failed = pyqtSignal(str)
+
+    def __init__(self, cache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.signals = CompareSignals(self)
+        self.signals.done.connect(self._on_done)
+        self._results = OrderedDict() # pair key -> CompareResult
+        self._running = None # (pair key, CancelToken)
+
+    def request(self, panel_a, panel_b):
+        source_a, source_b = panel_a.sample_rows(), panel_b.sample_rows()
+        if source_a is None or source_b is None or panel_a.current_key is None or panel_b.current_key is None:
+            self.cancel()
+            return
+        key = ('diff', panel_a.current_key, panel_b.current_key)
+        result = self._results.get(key)
+        heat = self.cache.get(key) if result is not None else None
+        if heat is not None:
+            self.cancel()
+            self._results.move_to_end(key)
+            self.compared.emit(result, heat)
+            return
+        if self._running is not None and self._running[0] == key:
+            return
+        self.cancel()
+        token = CancelToken()
+        self._running = (key, token)
+        QThreadPool.globalInstance().start(CompareTask(key, source_a, source_b, self.signals, token))
+
+    def cancel(self):
+        if self._running is not None:
+            self._running[1].cancel()
+            self._running = None
+
+    def _on_done(self, key, result, heat, error):
+        if self._running is None or self._running[0] != key:
+            return
+        self._running = None
+        if error:
+            self.failed.emit(error)
+            return
+        self._results[key] = result
+        while len(self._results) > MAX_RESULTS:
+            self._results.popitem(last=False)
+        heat = self.cache.put(key, heat)
+        self.compared.emit(result, heat)
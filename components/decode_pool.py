@@ -0,0 +1,194 @@
+import threading
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from components.decoding import decode_for_display, DecodedImage, CancelToken, DecodeCancelled
+from components.tiff_reader import TiffRegionReader
+from components import tracing
+
+# Job priorities (higher runs first)
+PRIORITY_THUMBNAIL = 0
+PRIORITY_PREFETCH = 1
+PRIORITY_VISIBLE = 2
+PRIORITY_PREVIEW = 3
+
+# Jobs a single owner (e.g. one panel) may have queued or running at once
+DEFAULT_MAX_IN_FLIGHT = 2
+
+
+# Handle returned by DecodePool.submit; one job may serve several requests
+class DecodeRequest:
+    def __init__(self, job, owner, callback):
+        self.job = job
+        self.owner = owner
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        if not self.cancelled:
+            self.job.pool.cancel(self)
+
+
+class DecodeJob(QRunnable):
+    def __init__(self, pool, path, key, priority, decode=None, page=0):
+        super().__init__()
+        # Lifetime is managed by DecodePool._jobs, not by QThreadPool
+        self.setAutoDelete(False)
+        self.pool = pool
+        self.path = path
+        self.key = key
+        self.priority = priority
+        self.decode = decode # Alternative decode(path, token), e.g. thumbnails; not cached
+        self.page = page # Page of a multi-page TIFF (key must include it)
+        self.token = CancelToken()
+        self.requests = []
+        self.started = False
+        self.submitted = tracing.now()
+
+    def run(self):
+        self.started = True
+        result, error = None, None
+        try:
+            if self.decode is not None:
+                result = self.decode(self.path, self.token)
+            else:
+                # Only full decodes count towards the file's load breakdown
+                tracing.record('queued', self.submitted, tracing.now() - self.submitted, path=self.path)
+                with tracing.span('decode_job', category='pool', priority=self.priority):
+                    result = decode_for_display(self.path, self.token, self.pool.processes, self.page)
+                if isinstance(result, DecodedImage):
+                    if result.isNull():
+                        result, error = None, "Failed to decode"
+                    elif self.pool.cache is not None:
+                        result = self.pool.cache.put(self.key, result)
+        except DecodeCancelled:
+            error = "Cancelled"
+        except Exception as e:
+            error = str(e)
+        self.pool.job_finished.emit(self, result, error)
+
+
+# Fixed-size pool of decode workers shared by all panels and the prefetcher.
+# Identical requests are merged into one job, superseded jobs are cancelled
+# cooperatively and each owner is capped to a few jobs in flight.
+class DecodePool(QObject):
+    job_finished = pyqtSignal(object, object, object) # job, DecodedImage / TiffRegionReader or None, error
+
+    def __init__(self, cache=None, max_threads=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.processes = None # Optional ProcessDecoder for GIL-bound TIFF decoding
+        self.max_in_flight = max_in_flight
+        self.pool = QThreadPool(self)
+        if max_threads is None:
+            max_threads = max(2, QThreadPool.globalInstance().maxThreadCount() - 1)
+        self.pool.setMaxThreadCount(max_threads)
+
+        self._jobs = {} # key -> DecodeJob
+        self._owned = {} # id(owner) -> [DecodeRequest]
+        self.job_finished.connect(self._on_job_finished)
+
+    def submit(self, path, key, priority, owner=None, callback=None, limit=None, decode=None, page=0):
+        # With decode, key must not collide with the keys of full decodes; with a
+        # page, key is the page's key (image_cache.page_key)
+        job = self._jobs.get(self._slot(key, path))
+        if job is not None and not job.token.cancelled:
+            # Already queued: bump priority by re-queueing if this request is more urgent
+            if priority > job.priority and not job.started and self.pool.tryTake(job):
+                job.priority = priority
+                self.pool.start(job, priority)
+        else:
+            job = DecodeJob(self, path, key, priority, decode, page)
+            self._jobs[self._slot(key, path)] = job
+            self.pool.start(job, priority)
+
+        request = DecodeRequest(job, owner, callback)
+        job.requests.append(request)
+        if owner is not None:
+            owned = self._owned.setdefault(id(owner), [])
+            owned.append(request)
+            limit = self.max_in_flight if limit is None else limit
+            while len(owned) > limit:
+                self.cancel(owned[0])
+        return request
+
+    def cancel(self, request):
+        if request.cancelled:
+            return
+        request.cancelled = True
+        self._forget(request)
+
+        job = request.job
+        if any(not r.cancelled for r in job.requests):
+            return
+        # Nobody is waiting for this job any more
+        job.token.cancel()
+        if not job.started and self.pool.tryTake(job):
+            self._drop_job(job)
+
+    def cancel_owner(self, owner):
+        for request in list(self._owned.get(id(owner), [])):
+            self.cancel(request)
+
+    def in_flight(self, owner):
+        return len(self._owned.get(id(owner), []))
+
+    def clear(self):
+        for job in list(self._jobs.values()):
+            for request in list(job.requests):
+                self.cancel(request)
+
+    def wait(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
+
+    def _forget(self, request):
+        if request.owner is None:
+            return
+        owned = self._owned.get(id(request.owner))
+        if owned and request in owned:
+            owned.remove(request)
+            if not owned:
+                del self._owned[id(request.owner)]
+
+    def _slot(self, key, path):
+        # Files that could not be stat'ed have no cache key; merge them by path only
+        return key if key is not None else ('path', path)
+
+    def _drop_job(self, job):
+        slot = self._slot(job.key, job.path)
+        if self._jobs.get(slot) is job:
+            del self._jobs[slot]
+
+    def _on_job_finished(self, job, result, error):
+        self._drop_job(job)
+        # An opened reader holds a file: every request it is handed to closes it
+        # once, and one nobody waits for any more is closed here
+        reader = result if isinstance(result, TiffRegionReader) else None
+        live = [request for request in job.requests if not request.cancelled]
+        if reader is not None:
+            for _ in live[1:]:
+                reader.share()
+            if not live:
+                reader.close()
+        for request in live:
+            if request.cancelled:
+                # Cancelled by an earlier callback
+                if reader is not None:
+                    reader.close()
+                continue
+            self._forget(request)
+            if request.callback is not None:
+                request.callback(job.path, result, error)
+            elif reader is not None:
+                reader.close()
+
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+
+# Process-wide pool; must first be created from the GUI thread
+def shared_pool(cache=None):
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = DecodePool(cache)
+        return _shared_pool
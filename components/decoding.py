@@ -0,0 +1,336 @@
+import os
+import threading
+import numpy as np
+import tifffile
+from PyQt6.QtCore import Qt, QBuffer, QIODevice
+from PyQt6.QtGui import QImage, QImageReader, QImageIOHandler
+from components.tiff_reader import TiffRegionReader, TiffStack, REGION_MIN_SIDE, open_stack, keep_stack
+from components.dtype_convert import convert_into
+from components.levels import levels_into, sample_stats
+from components.archive_source import is_member, read_member, file_source
+from components import tracing
+
+# Decoding shared by the visible loaders and background prefetch workers.
+# Everything here is safe to call from any thread (QImage, not QPixmap).
+
+
+class DecodeCancelled(Exception):
+    pass
+
+
+# Cooperative cancellation flag, checked by the decoders between stages
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set():
+            raise DecodeCancelled()
+
+
+def _check(token):
+    if token is not None:
+        token.check()
+
+
+def is_tiff(path):
+    return path.lower().endswith(('.tif', '.tiff'))
+
+
+def _image_reader(path):
+    # QImageReader of a file, or of the bytes of an archive member
+    if not is_member(path):
+        return QImageReader(path)
+    buffer = QBuffer()
+    buffer.setData(read_member(path))
+    buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+    reader = QImageReader(buffer, os.path.splitext(path)[1][1:].lower().encode())
+    reader.buffer = buffer # The reader does not own its device
+    return reader
+
+
+# Memory layout of the QImage formats that can be read through numpy directly:
+# format -> (dtype, stored channels, logical order of the channels we report)
+_VIEW_LAYOUTS = {
+    QImage.Format.Format_Grayscale8: (np.uint8, 1, None),
+    QImage.Format.Format_Grayscale16: (np.uint16, 1, None),
+    QImage.Format.Format_RGB888: (np.uint8, 3, None),
+    QImage.Format.Format_RGBA8888: (np.uint8, 4, None),
+    QImage.Format.Format_RGBA64: (np.uint16, 4, None),
+    QImage.Format.Format_RGB32: (np.uint8, 4, (2, 1, 0)), # B G R x in memory
+    QImage.Format.Format_ARGB32: (np.uint8, 4, (2, 1, 0, 3)), # B G R A in memory
+}
+
+
+# A decoded image: the 8-bit QImage that is displayed plus, for high-bit-depth
+# or float data, the original samples so values can be inspected unconverted.
+# For 8-bit data the samples are a read-only view into the QImage itself.
+class DecodedImage:
+    def __init__(self, qimage, samples=None):
+        if not qimage.isNull() and qimage.format() not in _VIEW_LAYOUTS:
+            # Palette, mono and packed formats have no direct numpy layout
+            fmt = QImage.Format.Format_ARGB32 if qimage.hasAlphaChannel() else QImage.Format.Format_RGB32
+            qimage = qimage.convertToFormat(fmt)
+        self.qimage = qimage
+        self.source = samples
+        self._view = None
+        self._stats = None
+        self.page_count = 1 # Pages of the file this page came from
+
+    def isNull(self):
+        return self.qimage.isNull()
+
+    def width(self):
+        return self.qimage.width()
+
+    def height(self):
+        return self.qimage.height()
+
+    @property
+    def nbytes(self):
+        extra = self.source.nbytes if self.source is not None else 0
+        return self.qimage.sizeInBytes() + extra
+
+    @property
+    def channels(self):
+        samples = self.samples()
+        if samples.ndim == 2:
+            return 1
+        order = _VIEW_LAYOUTS[self.qimage.format()][2] if self.source is None else None
+        return len(order) if order else samples.shape[2]
+
+    def samples(self):
+        if self.source is not None:
+            return self.source
+        if self._view is None:
+            dtype, channels, _ = _VIEW_LAYOUTS[self.qimage.format()]
+            self._view = qimage_array(self.qimage, channels, dtype, writable=False)
+        return self._view
+
+    def stats(self):
+        # Histogram of the samples, taken once per image from a subsample
+        if self._stats is None:
+            self._stats = sample_stats(self.samples())
+        return self._stats
+
+    def leveled(self, window, step=1, token=None):
+        # 8-bit QImage of the samples through window = (low, high, gamma); the
+        # image itself is left alone. step > 1 gives a subsampled quick version.
+        samples = self.samples()[::step, ::step]
+        if self.source is None and samples.dtype == np.uint8:
+            # Channels stay in the memory order of the QImage format
+            qimg = QImage(samples.shape[1], samples.shape[0], self.qimage.format())
+            levels_into(samples, qimage_array(qimg, _VIEW_LAYOUTS[qimg.format()][1]), window, token=token)
+            return qimg
+        return array_to_qimage(samples, token=token, window=window)
+
+    def window(self, x0, y0, x1, y1):
+        # Samples of [y0:y1, x0:x1] (clipped), with channels in R, G, B(, A) order
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(self.width(), x1), min(self.height(), y1)
+        win = self.samples()[y0:y1, x0:x1]
+        if self.source is None:
+            order = _VIEW_LAYOUTS[self.qimage.format()][2]
+            if order is not None:
+                win = win[..., list(order)]
+        return win
+
+
+# Large TIFFs that can be read by region are returned as a TiffRegionReader
+# (nothing decoded yet); everything else is decoded to a DecodedImage
+def decode_for_display(path, token=None, processes=None, page=0):
+    # processes: optional ProcessDecoder for whole TIFFs; formats Qt decodes
+    # natively stay on the calling thread, as do archive members (the workers
+    # would have to index the archive again). page: page of a multi-page TIFF.
+    _check(token)
+    if is_tiff(path):
+        if page > 0 or open_stack(path) is not None:
+            return load_tiff(path, token, page)
+        with tracing.span('tiff.open', path=path):
+            reader = TiffRegionReader.open(path)
+        if reader is not None:
+            return reader
+        if processes is not None and not is_member(path):
+            with tracing.span('process_decode', path=path):
+                decoded = processes.decode_tiff(path, token, _decoded_from_buffers)
+            if decoded is not None:
+                return decoded
+    return decode_image(path, token)
+
+
+def _decoded_from_buffers(display, samples):
+    # Copies shared-memory results into memory owned by this process
+    return DecodedImage(array_to_qimage(display), samples.copy() if samples is not None else None)
+
+
+def decode_image(path, token=None):
+    _check(token)
+    if is_tiff(path):
+        return load_tiff(path, token)
+
+    reader = _image_reader(path)
+    _check(token)
+    with tracing.span('decode', path=path): # Disk read and decode: Qt does both in read()
+        qimg = reader.read()
+    _check(token)
+    with tracing.span('convert', path=path):
+        return DecodedImage(qimg)
+
+
+def decode_scaled(path, max_side, token=None):
+    # 8-bit QImage whose longer side is at most max_side, reading as little as the
+    # format allows: the codec's own scaling (e.g. JPEG DCT scaling) through
+    # QImageReader, or a coarse pyramid/subsampled level of a TIFF
+    _check(token)
+    if is_tiff(path):
+        qimg = _scaled_tiff(path, max_side, token)
+    else:
+        reader = _image_reader(path)
+        size = reader.size()
+        if size.isValid() and max(size.width(), size.height()) > max_side:
+            reader.setScaledSize(size.scaled(max_side, max_side, Qt.AspectRatioMode.KeepAspectRatio))
+        _check(token)
+        qimg = reader.read()
+    _check(token)
+    if not qimg.isNull() and max(qimg.width(), qimg.height()) > max_side:
+        qimg = qimg.scaled(max_side, max_side, Qt.AspectRatioMode.KeepAspectRatio,
+                           Qt.TransformationMode.SmoothTransformation)
+    return qimg
+
+
+def _scaled_tiff(path, max_side, token):
+    reader = TiffRegionReader.open(path, min_side=0)
+    if reader is None:
+        return load_tiff(path, token).qimage
+    try:
+        return _read_level(reader, reader.level_for(max_side), token)
+    finally:
+        reader.close()
+
+
+def _read_level(reader, level, token):
+    w, h = reader.level_size(level)
+    data = reader.read_region(level, 0, 0, w, h, token)
+    return array_to_qimage(data, reader.value_range(data, token), token)
+
+
+# Reduced-size stand-in shown while the full decode runs; width/height are
+# those of the full image, so the view can be laid out for it already
+class PreviewImage:
+    def __init__(self, qimage, width, height):
+        self.qimage = qimage
+        self.width = width
+        self.height = height
+
+
+def decode_preview(path, max_side, token=None):
+    # PreviewImage with a longer side of about max_side, or None when reading one
+    # would not be much cheaper than the full decode (e.g. PNG, which has no
+    # reduced decode, or a TIFF without a pyramid or memory-mappable data)
+    _check(token)
+    if is_tiff(path):
+        reader = TiffRegionReader.open(path, min_side=0)
+        if reader is None:
+            return None
+        try:
+            # Files read by region already draw their overview first
+            if max(reader.width, reader.height) > REGION_MIN_SIDE:
+                return None
+            level = reader.level_for(max_side)
+            if not reader.reads_cheaply(level):
+                return None
+            with tracing.span('preview.decode', path=path):
+                return PreviewImage(_read_level(reader, level, token), reader.width, reader.height)
+        finally:
+            reader.close()
+
+    reader = _image_reader(path)
+    size = reader.size()
+    if (not size.isValid() or max(size.width(), size.height()) < 2 * max_side
+            or not reader.supportsOption(QImageIOHandler.ImageOption.ScaledSize)):
+        return None
+    reader.setScaledSize(size.scaled(max_side, max_side, Qt.AspectRatioMode.KeepAspectRatio))
+    _check(token)
+    with tracing.span('preview.decode', path=path):
+        qimg = reader.read()
+    if qimg.isNull():
+        return None
+    return PreviewImage(qimg, size.width(), size.height())
+
+
+def load_tiff(path, token=None, page=0):
+    # Read using tifffile. Multi-page files are indexed once and kept open; only
+    # the requested page is decoded.
+    stack = open_stack(path)
+    if stack is None:
+        tif = tifffile.TiffFile(file_source(path))
+        try:
+            with tracing.span('tiff.index', path=path):
+                stack = TiffStack.from_file(path, tif)
+            if stack is None:
+                with tracing.span('decode', path=path):
+                    _check(token)
+                    data = tif.asarray()
+        finally:
+            if stack is None:
+                tif.close()
+        if stack is not None:
+            keep_stack(stack)
+    if stack is not None:
+        with tracing.span('decode', path=path, page=page):
+            data = stack.read(page, token)
+    _check(token)
+    # Keep the original samples when the display image is a lossy 8-bit mapping
+    samples = data if data.dtype != np.uint8 else None
+    with tracing.span('convert', path=path, dtype=str(data.dtype)):
+        decoded = DecodedImage(array_to_qimage(data, token=token), samples)
+    if stack is not None:
+        decoded.page_count = stack.count
+    return decoded
+
+
+def _qimage_format(data):
+    if data.ndim == 2:
+        return QImage.Format.Format_Grayscale8, 1
+    if data.ndim == 3 and data.shape[2] == 3:
+        return QImage.Format.Format_RGB888, 3
+    if data.ndim == 3 and data.shape[2] == 4:
+        return QImage.Format.Format_RGBA8888, 4
+    return None, 0
+
+
+# Numpy view of a QImage's pixels (rows are padded to 4 bytes). The read-only
+# variant uses constBits() so a shared image is never detached (copied).
+def qimage_array(qimg, channels, dtype=np.uint8, writable=True):
+    ptr = qimg.bits() if writable else qimg.constBits()
+    ptr.setsize(qimg.sizeInBytes())
+    itemsize = np.dtype(dtype).itemsize
+    shape = (qimg.height(), qimg.width()) + ((channels,) if channels > 1 else ())
+    strides = (qimg.bytesPerLine(), channels * itemsize) + ((itemsize,) if channels > 1 else ())
+    return np.ndarray(shape, dtype, buffer=ptr, strides=strides)
+
+
+# Converts samples of any supported type straight into a new QImage's buffer,
+# so no intermediate 8-bit array or extra copy is made. window: (low, high, gamma)
+# display levels instead of the default conversion.
+def array_to_qimage(data, vrange=None, token=None, window=None):
+    fmt, channels = _qimage_format(data)
+    if fmt is None:
+        return QImage()
+
+    height, width = data.shape[:2]
+    qimg = QImage(width, height, fmt)
+    if qimg.isNull():
+        return qimg
+    if window is not None:
+        levels_into(data, qimage_array(qimg, channels), window, token=token)
+    else:
+        convert_into(data, qimage_array(qimg, channels), vrange, token=token)
+    return qimg
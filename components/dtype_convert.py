@@ -0,0 +1,124 @@
+import numpy as np
+
+# Conversion of scientific sample formats to the 8-bit display buffer, one block
+# of rows at a time so the temporaries stay small whatever the image size.
+# Pure numpy, so it is shared by the viewer and headless tools.
+#
+#   uint8           unchanged
+#   uint16          top 8 bits (value / 256), as the viewer always did
+#   float, other    linear stretch of [min, max] (NaN ignored) to 0..255
+#   integer types
+#
+# Byte-swapped (big-endian) input is handled chunk by chunk as well.
+
+# Size of the temporary work buffer per chunk (bytes)
+DEFAULT_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def rows_per_chunk(data, chunk_bytes):
+    # Rows of data per chunk whose float64 working copy fits chunk_bytes
+    if data.shape[0] == 0:
+        return 1
+    row_items = data.size // data.shape[0]
+    return max(1, chunk_bytes // max(1, row_items * 8))
+
+
+def work_dtype(dtype):
+    # Float type samples of dtype are stretched in
+    if dtype.kind == 'f':
+        return dtype.newbyteorder('=')
+    # float32 is exact for 8/16-bit integers; wider ones need float64
+    return np.dtype(np.float32) if dtype.itemsize <= 2 else np.dtype(np.float64)
+
+
+def needs_range(dtype):
+    if dtype == np.uint8 or dtype == np.bool_:
+        return False
+    if dtype.kind == 'u' and dtype.itemsize == 2:
+        return False
+    return dtype.kind in 'fiu'
+
+
+def value_range(data, chunk_bytes=DEFAULT_CHUNK_BYTES, token=None):
+    # Min and max in a single pass over the rows; NaNs are skipped like np.nanmin/np.nanmax
+    lo = hi = None
+    step = rows_per_chunk(data, chunk_bytes)
+    for start in range(0, data.shape[0], step):
+        if token is not None:
+            token.check()
+        chunk = data[start:start + step]
+        if chunk.size == 0:
+            continue
+        c_lo = np.fmin.reduce(chunk, axis=None)
+        c_hi = np.fmax.reduce(chunk, axis=None)
+        lo = c_lo if lo is None else np.fmin(lo, c_lo)
+        hi = c_hi if hi is None else np.fmax(hi, c_hi)
+    if lo is None:
+        return 0, 0
+    return lo, hi
+
+
+def convert_into(data, out, vrange=None, chunk_bytes=DEFAULT_CHUNK_BYTES, token=None):
+    # Writes the 8-bit display version of data into out (uint8, same shape; may be
+    # a strided view straight into a QImage). Returns out.
+    dtype = data.dtype
+    step = rows_per_chunk(data, chunk_bytes)
+
+    if dtype == np.uint8 or dtype == np.bool_:
+        for start in range(0, data.shape[0], step):
+            if token is not None:
+                token.check()
+            chunk = data[start:start + step]
+            if dtype == np.bool_:
+                np.multiply(chunk, 255, out=out[start:start + step], casting='unsafe')
+            else:
+                out[start:start + step] = chunk
+        return out
+
+    tmp_shape = (min(step, data.shape[0]),) + data.shape[1:]
+
+    if dtype.kind == 'u' and dtype.itemsize == 2:
+        tmp = np.empty(tmp_shape, np.uint16)
+        for start in range(0, data.shape[0], step):
+            if token is not None:
+                token.check()
+            chunk = data[start:start + step]
+            t = tmp[:chunk.shape[0]]
+            np.right_shift(chunk, 8, out=t)
+            np.copyto(out[start:start + step], t, casting='unsafe')
+        return out
+
+    if dtype.kind not in 'fiu':
+        raise ValueError(f"Unsupported sample type {dtype}")
+
+    if vrange is None:
+        vrange = value_range(data, chunk_bytes, token)
+    work = work_dtype(dtype)
+    lo = work.type(vrange[0])
+    span = work.type(vrange[1]) - lo
+    if not span or not np.isfinite(span):
+        out[...] = 0
+        return out
+
+    tmp = np.empty(tmp_shape, work)
+    for start in range(0, data.shape[0], step):
+        if token is not None:
+            token.check()
+        chunk = data[start:start + step]
+        t = tmp[:chunk.shape[0]]
+        np.subtract(chunk, lo, out=t, casting='unsafe')
+        np.divide(t, span, out=t)
+        # A range narrower than the data (e.g. estimated on a subsample) must not wrap around
+        np.clip(t, 0, 1, out=t)
+        np.multiply(t, 255, out=t)
+        # NaN has no 8-bit value; show it as black
+        np.nan_to_num(t, copy=False, nan=0.0)
+        np.copyto(out[start:start + step], t, casting='unsafe')
+    return out
+
+
+def to_uint8(data, vrange=None, chunk_bytes=DEFAULT_CHUNK_BYTES, token=None):
+    if data.dtype == np.uint8:
+        return data
+    out = np.empty(data.shape, np.uint8)
+    return convert_into(data, out, vrange, chunk_bytes, token)
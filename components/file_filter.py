@@ -0,0 +1,152 @@
+import os
+import re
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from components.decoding import CancelToken, DecodeCancelled
+from components import tracing
+
+# Typing pauses shorter than this are one edit
+DEBOUNCE_MS = 150
+
+# A pattern extended by characters outside this set can only match fewer names
+_REGEX_META = set('.^$*+?{}[]\\|()')
+
+# Names checked between cancellation checks
+_CHECK_EVERY = 4096
+
+
+def compile_filter(pattern):
+    # None for an empty or invalid pattern; both show every file
+    if not pattern:
+        return None
+    try:
+        return re.compile(pattern)
+    except re.error:
+        print(f"Invalid regex: {pattern}")
+        return None
+
+
+def narrows(old, new):
+    # True when every name matching new also matches the valid pattern old: new is
+    # old followed by plain characters, so each match of new contains one of old
+    return bool(old) and new.startswith(old) and not _REGEX_META.intersection(new[len(old):])
+
+
+def match_files(files, names, regex, token=None):
+    result = []
+    search = regex.search
+    for i, path in enumerate(files):
+        if token is not None and i % _CHECK_EVERY == 0:
+            token.check()
+        name = names.get(path)
+        if name is None:
+            name = os.path.basename(path)
+        if search(name):
+            result.append(path)
+    return result
+
+
+class FilterSignals(QObject):
+    done = pyqtSignal(int, str, list) # run id, pattern, matching paths
+
+
+class FilterTask(QRunnable):
+    def __init__(self, run_id, pattern, regex, files, names, signals, token):
+        super().__init__()
+        self.run_id = run_id
+        self.pattern = pattern
+        self.regex = regex
+        self.files = files
+        self.names = names
+        self.signals = signals
+        self.token = token
+
+    def run(self):
+        try:
+            with tracing.span('filter', category='filter', pattern=self.pattern, files=len(self.files)):
+                result = match_files(self.files, self.names, self.regex, self.token)
+        except DecodeCancelled:
+            return
+        self.signals.done.emit(self.run_id, self.pattern, result)
+
+
+# Regex filter of one side's file list. Edits are debounced and evaluated on a
+# worker; when the new pattern only narrows the applied one, only the current
+# result is searched again. Basenames are computed once, when files are added.
+class FileFilter(QObject):
+    filtered = pyqtSignal(list) # matching paths for the newly applied pattern
+
+    def __init__(self, listing, parent=None):
+        super().__init__(parent)
+        self.listing = listing # callable() -> (all files, currently filtered files)
+        self.pattern = "" # Pattern the current result was computed with
+        self.regex = None
+        self.names = {} # path -> basename
+
+        self._wanted = ""
+        self._version = 0 # Bumped whenever the file list changes
+        self._next_id = 0
+        self._running = None # (run id, version, CancelToken)
+        self.signals = FilterSignals(self)
+        self.signals.done.connect(self._on_done)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(DEBOUNCE_MS)
+        self._timer.timeout.connect(self._run)
+
+    def set_pattern(self, pattern):
+        self._wanted = pattern
+        self._timer.start()
+
+    def reset(self):
+        # A different folder: drop the names, keep the pattern
+        self.names = {}
+        self._version += 1
+
+    def extend(self, paths):
+        # Registers new files; returns those matching the applied pattern
+        names = self.names
+        for path in paths:
+            names[path] = os.path.basename(path)
+        self._version += 1
+        if self.regex is None:
+            return list(paths)
+        return match_files(paths, names, self.regex)
+
+    def discard(self, paths):
+        for path in paths:
+            self.names.pop(path, None)
+        self._version += 1
+
+    def _run(self, narrow=True):
+        if self._running is not None:
+            self._running[2].cancel()
+            self._running = None
+        pattern = self._wanted
+        regex = compile_filter(pattern)
+        all_files, files = self.listing()
+        if regex is None:
+            self._apply(pattern, None, list(all_files))
+            return
+        source = files if narrow and narrows(self.pattern, pattern) else all_files
+        self._next_id += 1
+        token = CancelToken()
+        self._running = (self._next_id, self._version, token)
+        # The lists are copied: scan batches keep changing them on this thread
+        QThreadPool.globalInstance().start(
+            FilterTask(self._next_id, pattern, regex, list(source), self.names, self.signals, token))
+
+    def _on_done(self, run_id, pattern, result):
+        if self._running is None or self._running[0] != run_id:
+            return
+        version = self._running[1]
+        self._running = None
+        if version != self._version:
+            # Files arrived while filtering; evaluate again over the full list
+            self._run(narrow=False)
+            return
+        self._apply(pattern, compile_filter(pattern), result)
+
+    def _apply(self, pattern, regex, result):
+        self.pattern = pattern if regex is not None else ""
+        self.regex = regex
+        self.filtered.emit(result)
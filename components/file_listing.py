@@ -0,0 +1,61 @@
+import os
+from bisect import bisect_left
+
+# Which files in a folder count as images, and how a folder is listed.
+# No Qt in here, so headless tools list folders exactly like the viewer.
+
+# Supported extensions
+IMG_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff'}
+
+# Changes up to this many paths are bisected into a sorted list one by one
+SMALL_CHANGE = 64
+
+
+def is_image_name(name):
+    return os.path.splitext(name)[1].lower() in IMG_EXTENSIONS
+
+
+def iter_image_entries(folder, token=None):
+    # Yields the os.DirEntry of every image file in folder, in directory order.
+    # scandir reuses the type information of the listing, so no stat per file.
+    with os.scandir(folder) as it:
+        for entry in it:
+            if token is not None:
+                token.check()
+            if is_image_name(entry.name):
+                try:
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                yield entry
+
+
+def list_image_files(folder):
+    # Sorted full paths of the images in folder
+    return sorted(entry.path for entry in iter_image_entries(folder))
+
+
+def apply_changes(files, added, removed):
+    # Returns the sorted list files with the sorted paths added inserted and the
+    # paths removed taken out. Small changes are bisected in place; larger bursts
+    # are merged in one linear pass.
+    if len(added) + len(removed) <= SMALL_CHANGE:
+        for path in removed:
+            i = bisect_left(files, path)
+            if i < len(files) and files[i] == path:
+                del files[i]
+        for path in added:
+            i = bisect_left(files, path)
+            if i == len(files) or files[i] != path:
+                files.insert(i, path)
+        return files
+    if removed:
+        gone = set(removed)
+        files = [f for f in files if f not in gone]
+    if added:
+        files.extend(added)
+        files.sort() # Two sorted runs: a linear merge
+        # Drop duplicates of names that were already listed
+        files = [f for i, f in enumerate(files) if i == 0 or files[i - 1] != f]
+    return files
@@ -0,0 +1,142 @@
+import os
+from bisect import bisect_left
+from collections import OrderedDict
+from PyQt6.QtWidgets import QListView, QAbstractItemView
+from PyQt6.QtGui import QPixmap
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QPoint, pyqtSignal
+from components.image_cache import cache_key
+from components.decode_pool import PRIORITY_THUMBNAIL
+from components.thumbnails import THUMB_SIDE
+
+# Thumbnails kept in memory by all filmstrips together, as pixmaps ready to draw
+MEMORY_THUMBS = 1024
+
+# Thumbnail decodes queued at once; far more than fit on screen
+MAX_REQUESTS = 256
+
+# Thumbnails of one side's (filtered) file list. Only rows the view asks to draw
+# are decoded; requests for rows scrolled out of view are cancelled.
+class FilmstripModel(QAbstractListModel):
+    def __init__(self, pool, store, parent=None):
+        super().__init__(parent)
+        self.pool = pool
+        self.store = store
+        self.files = []
+        self._pixmaps = OrderedDict() # path -> QPixmap
+        self.max_thumbs = MEMORY_THUMBS # This strip's share of MEMORY_THUMBS
+        self._pending = {} # path -> DecodeRequest
+        self._failed = set()
+
+    def set_files(self, files):
+        self.beginResetModel()
+        self.files = files
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.files)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        row = index.row()
+        if not index.isValid() or row >= len(self.files):
+            return None
+        path = self.files[row]
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self._pixmaps.get(path)
+            if pixmap is not None:
+                self._pixmaps.move_to_end(path)
+                return pixmap
+            self._request(path)
+            return None
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return f"{row + 1}: {os.path.basename(path)}"
+        return None
+
+    def _request(self, path):
+        request = self._pending.get(path)
+        if (request is not None and not request.cancelled) or path in self._failed:
+            return
+        key = cache_key(path)
+        self._pending[path] = self.pool.submit(
+            path, ('thumbnail', key if key is not None else path), PRIORITY_THUMBNAIL,
+            owner=self, limit=MAX_REQUESTS,
+            decode=lambda path, token, key=key: self.store.thumbnail(path, key, token),
+            callback=self._on_thumbnail)
+
+    def retain(self, first, last):
+        # Drops requests for rows outside [first, last]
+        keep = set(self.files[max(0, first):last + 1])
+        for path in list(self._pending):
+            if path not in keep:
+                self._pending.pop(path).cancel()
+
+    def _on_thumbnail(self, path, qimg, error):
+        self._pending.pop(path, None)
+        if qimg is None:
+            if error != "Cancelled":
+                self._failed.add(path)
+            return
+        self._pixmaps[path] = QPixmap.fromImage(qimg)
+        while len(self._pixmaps) > self.max_thumbs:
+            self._pixmaps.popitem(last=False)
+        row = bisect_left(self.files, path)
+        if row < len(self.files) and self.files[row] == path:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+# Horizontal strip of thumbnails under a panel. QListView with uniform item sizes
+# only lays out and paints the visible rows, so a 50k-file folder costs no more
+# than the thumbnails on screen.
+class Filmstrip(QListView):
+    row_clicked = pyqtSignal(int)
+
+    def __init__(self, pool, store, parent=None):
+        super().__init__(parent)
+        self.filmstrip_model = FilmstripModel(pool, store, self)
+        self.setModel(self.filmstrip_model)
+        self.setFlow(QListView.Flow.LeftToRight)
+        self.setWrapping(False)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.LayoutMode.SinglePass)
+        self.setIconSize(QSize(THUMB_SIDE, THUMB_SIDE))
+        self.setGridSize(QSize(THUMB_SIDE + 8, THUMB_SIDE + 8))
+        self.setFixedHeight(THUMB_SIDE + 28)
+        self.setHorizontalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setFocusPolicy(Qt.FocusPolicy.NoFocus) # Arrow keys keep navigating both panels
+        self.setStyleSheet("QListView { background-color: #181818; border: none; }"
+                           "QListView::item:selected { background-color: #3a5f8a; }")
+        self.clicked.connect(lambda index: self.row_clicked.emit(index.row()))
+        # Rows scrolled away lose their queued decodes before the next paint asks for new ones
+        self.horizontalScrollBar().valueChanged.connect(self._update_visible)
+
+    def set_files(self, files):
+        self.filmstrip_model.set_files(files)
+        self._update_visible()
+
+    def share_memory(self, strips):
+        # This strip is one of strips sharing MEMORY_THUMBS
+        self.filmstrip_model.max_thumbs = max(1, MEMORY_THUMBS // max(1, strips))
+
+    def set_current(self, row):
+        if 0 <= row < self.filmstrip_model.rowCount():
+            index = self.filmstrip_model.index(row)
+            self.setCurrentIndex(index)
+            self.scrollTo(index, QAbstractItemView.ScrollHint.PositionAtCenter)
+        else:
+            self.clearSelection()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_visible()
+
+    def _update_visible(self):
+        rect = self.viewport().rect()
+        first = self.indexAt(QPoint(rect.left() + 1, rect.center().y()))
+        last = self.indexAt(QPoint(rect.right() - 1, rect.center().y()))
+        count = self.filmstrip_model.rowCount()
+        first_row = first.row() if first.isValid() else 0
+        last_row = last.row() if last.isValid() else count - 1
+        self.filmstrip_model.retain(first_row, last_row)
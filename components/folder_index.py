@@ -0,0 +1,113 @@
+import os
+import sqlite3
+import threading
+import time
+from components.file_listing import IMG_EXTENSIONS
+
+# Persistent listing of opened folders (one small SQLite file), so reopening a
+# large folder does not list and filter it again. A folder's entry is valid
+# while the directory mtime is unchanged: adding, removing or renaming a file
+# changes it, editing a file in place does not change the listing.
+# No Qt in here; the database path is chosen by the caller.
+
+SCHEMA_VERSION = 1
+
+# Folders remembered; the least recently opened ones are dropped first
+MAX_FOLDERS = 32
+
+# Directory mtimes this recent may still change within the same timestamp tick
+# (coarse network/FAT clocks), so such listings are not trusted later
+RACY_SECONDS = 2.0
+
+# Listing rules the stored entries were filtered with
+_RULES = ','.join(sorted(IMG_EXTENSIONS))
+
+
+def folder_key(folder):
+    return os.path.normcase(os.path.abspath(folder))
+
+
+# Stored state of one folder: name -> (size, mtime_ns)
+class FolderListing:
+    def __init__(self, dir_mtime_ns, entries):
+        self.dir_mtime_ns = dir_mtime_ns
+        self.entries = entries
+
+
+class FolderIndex:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        # Called with the lock held; scans run on pool threads
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.executescript(f"""
+                    DROP TABLE IF EXISTS files;
+                    DROP TABLE IF EXISTS folders;
+                    CREATE TABLE folders (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL,
+                                          dir_mtime_ns INTEGER NOT NULL, rules TEXT NOT NULL,
+                                          used REAL NOT NULL);
+                    CREATE TABLE files (folder_id INTEGER NOT NULL, name TEXT NOT NULL,
+                                        size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,
+                                        PRIMARY KEY (folder_id, name)) WITHOUT ROWID;
+                    PRAGMA user_version = {SCHEMA_VERSION};
+                """)
+            self._conn = conn
+        return self._conn
+
+    def load(self, folder):
+        # The stored listing of folder, or None if it was never stored
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT id, dir_mtime_ns, rules FROM folders WHERE path = ?",
+                                   (folder_key(folder),)).fetchone()
+                if row is None or row[2] != _RULES:
+                    return None
+                rows = conn.execute("SELECT name, size, mtime_ns FROM files WHERE folder_id = ?", (row[0],))
+                entries = {name: (size, mtime) for name, size, mtime in rows}
+                conn.execute("UPDATE folders SET used = ? WHERE id = ?", (time.time(), row[0]))
+                conn.commit()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Folder index unavailable: {e}")
+            return None
+        return FolderListing(row[1], entries)
+
+    def store(self, folder, dir_mtime_ns, entries):
+        if time.time() - dir_mtime_ns / 1e9 < RACY_SECONDS:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    path = folder_key(folder)
+                    conn.execute(
+                        "INSERT INTO folders (path, dir_mtime_ns, rules, used) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(path) DO UPDATE SET dir_mtime_ns = excluded.dir_mtime_ns, "
+                        "rules = excluded.rules, used = excluded.used",
+                        (path, dir_mtime_ns, _RULES, time.time()))
+                    folder_id = conn.execute("SELECT id FROM folders WHERE path = ?", (path,)).fetchone()[0]
+                    conn.execute("DELETE FROM files WHERE folder_id = ?", (folder_id,))
+                    conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?)",
+                                     ((folder_id, name, size, mtime) for name, (size, mtime) in entries.items()))
+                    self._prune(conn)
+        except (sqlite3.Error, OSError) as e:
+            print(f"Could not update folder index: {e}")
+
+    def _prune(self, conn):
+        stale = [r[0] for r in conn.execute(
+            "SELECT id FROM folders ORDER BY used DESC LIMIT -1 OFFSET ?", (MAX_FOLDERS,))]
+        for folder_id in stale:
+            conn.execute("DELETE FROM files WHERE folder_id = ?", (folder_id,))
+            conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
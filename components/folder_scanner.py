@@ -0,0 +1,143 @@
+import os
+import time
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from components.decoding import CancelToken, DecodeCancelled
+from components.file_listing import iter_image_entries
+from components.archive_source import is_archive, list_archive
+from components import tracing
+
+# Batches start small so the first image appears at once, then grow so a huge
+# folder is delivered in a few dozen merges rather than thousands
+FIRST_BATCH = 1
+MAX_BATCH = 8192
+
+# A partial batch is still delivered after this long, so slow shares show progress
+FLUSH_INTERVAL = 0.2
+
+
+class ScanSignals(QObject):
+    batch_found = pyqtSignal(int, list) # scan id, sorted paths
+    finished = pyqtSignal(int, object) # scan id, error or None
+
+
+class FolderScanTask(QRunnable):
+    def __init__(self, scan_id, folder, signals, token, index=None):
+        super().__init__()
+        self.scan_id = scan_id
+        self.folder = folder
+        self.signals = signals
+        self.token = token
+        self.index = index
+
+    def run(self):
+        error = None
+        try:
+            if is_archive(self.folder):
+                # Archives keep their own index; listing one reads no member data
+                with tracing.span('scan.archive', category='scan', folder=self.folder):
+                    paths = list_archive(self.folder, self.token)
+                for start in range(0, len(paths), MAX_BATCH):
+                    self._emit(paths[start:start + MAX_BATCH])
+            else:
+                self._scan_folder()
+        except DecodeCancelled:
+            return
+        except Exception as e:
+            error = str(e)
+        if not self.token.cancelled:
+            self.signals.finished.emit(self.scan_id, error)
+
+    def _scan_folder(self):
+        # Taken before listing: a change during the scan invalidates what is stored
+        dir_mtime = os.stat(self.folder).st_mtime_ns
+        with tracing.span('scan.index_load', category='scan', folder=self.folder):
+            known = self.index.load(self.folder) if self.index is not None else None
+        if known is not None and known.dir_mtime_ns == dir_mtime:
+            self._emit([os.path.join(self.folder, name) for name in known.entries])
+        else:
+            with tracing.span('scan.list', category='scan', folder=self.folder):
+                entries = self._scan(known.entries if known is not None else {})
+            if self.index is not None:
+                with tracing.span('scan.index_store', category='scan', folder=self.folder):
+                    self.index.store(self.folder, dir_mtime, entries)
+
+    def _scan(self, known):
+        # Streams the listing; only names missing from the stored listing are stat'ed
+        entries = {}
+        batch = []
+        limit = FIRST_BATCH
+        last_flush = time.monotonic()
+        for entry in iter_image_entries(self.folder, self.token):
+            meta = known.get(entry.name)
+            if meta is None:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue # Removed while listing
+                meta = (st.st_size, st.st_mtime_ns)
+            entries[entry.name] = meta
+            batch.append(entry.path)
+            if len(batch) >= limit or time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                self._emit(batch)
+                batch = []
+                limit = min(MAX_BATCH, limit * 8)
+                last_flush = time.monotonic()
+        if batch:
+            self._emit(batch)
+        return entries
+
+    def _emit(self, batch):
+        # Sorting here keeps the GUI side to a linear merge
+        batch.sort()
+        self.token.check()
+        self.signals.batch_found.emit(self.scan_id, batch)
+
+
+# Lists folders on a worker thread, one running scan per side. Starting a new
+# scan for a side cancels the previous one; batches of a superseded scan are
+# dropped by id even if they were already queued to the GUI thread.
+# With a FolderIndex, unchanged folders are served from it in a single batch.
+class FolderScanner(QObject):
+    batch_found = pyqtSignal(str, list) # side, sorted paths
+    finished = pyqtSignal(str, object) # side, error or None
+
+    def __init__(self, index=None, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.signals = ScanSignals(self)
+        self.signals.batch_found.connect(self._on_batch)
+        self.signals.finished.connect(self._on_finished)
+        self._next_id = 0
+        self._scans = {} # side -> (scan id, CancelToken)
+
+    def start(self, side, folder):
+        self.cancel(side)
+        self._next_id += 1
+        token = CancelToken()
+        self._scans[side] = (self._next_id, token)
+        QThreadPool.globalInstance().start(FolderScanTask(self._next_id, folder, self.signals, token, self.index))
+
+    def cancel(self, side):
+        scan = self._scans.pop(side, None)
+        if scan is not None:
+            scan[1].cancel()
+
+    def is_scanning(self, side):
+        return side in self._scans
+
+    def _side_of(self, scan_id):
+        for side, (sid, _) in self._scans.items():
+            if sid == scan_id:
+                return side
+        return None
+
+    def _on_batch(self, scan_id, paths):
+        side = self._side_of(scan_id)
+        if side is not None:
+            self.batch_found.emit(side, paths)
+
+    def _on_finished(self, scan_id, error):
+        side = self._side_of(scan_id)
+        if side is not None:
+            del self._scans[side]
+            self.finished.emit(side, error)
@@ -0,0 +1,116 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, QTimer, QFileSystemWatcher, pyqtSignal
+from components.file_listing import iter_image_entries
+
+# Change notifications arriving within this window are handled together, so a
+# capture rig writing thousands of files costs a few listings, not thousands
+COALESCE_MS = 300
+
+
+class DiffSignals(QObject):
+    diffed = pyqtSignal(int, list, list, object) # generation, sorted added, sorted removed, error or None
+
+
+class FolderDiffTask(QRunnable):
+    def __init__(self, generation, folder, known, signals):
+        super().__init__()
+        self.generation = generation
+        self.folder = folder
+        self.known = known # Snapshot of the side's sorted file list
+        self.signals = signals
+
+    def run(self):
+        # Always reports back, so the watcher knows the diff is over
+        added = removed = []
+        error = None
+        try:
+            listed = {entry.path for entry in iter_image_entries(self.folder)}
+        except OSError as e:
+            error = str(e)
+        else:
+            known = set(self.known)
+            added = sorted(listed - known)
+            removed = sorted(known - listed)
+        self.signals.diffed.emit(self.generation, added, removed, error)
+
+
+# Watches the open folder of each side and reports which image files appeared
+# or disappeared. The watcher only says that a directory changed, so the folder
+# is listed again off the GUI thread and compared with the current list.
+class FolderWatcher(QObject):
+    files_changed = pyqtSignal(str, list, list) # side, sorted added, sorted removed
+    failed = pyqtSignal(str, str) # side, error (e.g. the folder was deleted)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self._on_directory_changed)
+        self.signals = DiffSignals(self)
+        self.signals.diffed.connect(self._on_diffed)
+
+        self._folders = {} # side -> folder
+        self._generation = {} # side -> id of the current watch
+        self._next_generation = 0
+        self._timers = {}
+        self._running = set() # generations with a diff in progress
+        self._listing = None # callable(side) -> (sorted files, busy)
+
+    def set_listing(self, listing):
+        # listing(side) returns the side's current sorted file list and whether
+        # it is still being filled by a scan (then the diff waits)
+        self._listing = listing
+
+    def watch(self, side, folder):
+        self.unwatch(side)
+        self._next_generation += 1
+        self._generation[side] = self._next_generation
+        self._folders[side] = folder
+        if folder not in self.watcher.directories():
+            self.watcher.addPath(folder)
+
+    def unwatch(self, side):
+        folder = self._folders.pop(side, None)
+        self._generation.pop(side, None)
+        if side in self._timers:
+            self._timers[side].stop()
+        if folder is not None and folder not in self._folders.values():
+            self.watcher.removePath(folder)
+
+    def _on_directory_changed(self, folder):
+        for side, watched in self._folders.items():
+            if watched == folder:
+                self._schedule(side)
+
+    def _schedule(self, side):
+        timer = self._timers.get(side)
+        if timer is None:
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.timeout.connect(lambda side=side: self._diff(side))
+            self._timers[side] = timer
+        # Not restarted by later notifications: a steady stream still gets handled
+        if not timer.isActive():
+            timer.start(COALESCE_MS)
+
+    def _diff(self, side):
+        folder = self._folders.get(side)
+        if folder is None or self._listing is None:
+            return
+        files, busy = self._listing(side)
+        generation = self._generation[side]
+        if busy or generation in self._running:
+            # The running scan or diff may not see this change; look again afterwards
+            self._schedule(side)
+            return
+        self._running.add(generation)
+        task = FolderDiffTask(generation, folder, list(files), self.signals)
+        QThreadPool.globalInstance().start(task)
+
+    def _on_diffed(self, generation, added, removed, error):
+        self._running.discard(generation)
+        for side, current in self._generation.items():
+            if current == generation:
+                if error is not None:
+                    self.failed.emit(side, error)
+                elif added or removed:
+                    self.files_changed.emit(side, added, removed)
+                return
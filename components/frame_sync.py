@@ -0,0 +1,49 @@
+from PyQt6.QtCore import QObject, QTimer
+
+# A panel waits at most this long for the others before showing its frame (ms)
+MAX_HOLD_MS = 400
+
+
+# Shows the frames of several panels in the same event-loop turn. Each panel
+# that is loading holds its decoded image until every panel of the gate has one
+# (or failed), so a synchronized step flips all panels together instead of one
+# after the other; past MAX_HOLD_MS the frames that are ready are shown anyway.
+class FrameGate(QObject):
+    def __init__(self, panels, parent=None):
+        super().__init__(parent)
+        self.waiting = set(id(panel) for panel in panels)
+        self.released = not self.waiting
+        self._held = [] # show() of each panel that is ready
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(MAX_HOLD_MS)
+        self._timer.timeout.connect(self.release)
+        if not self.released:
+            self._timer.start()
+
+    def hold(self, panel, show):
+        # True if show() was kept for later; False: show now
+        if self.released or id(panel) not in self.waiting:
+            return False
+        self._held.append(show)
+        self._arrived(panel)
+        return True
+
+    def skip(self, panel):
+        # The panel has nothing to show (no file, or the decode failed)
+        if not self.released:
+            self._arrived(panel)
+
+    def _arrived(self, panel):
+        self.waiting.discard(id(panel))
+        if not self.waiting:
+            self.release()
+
+    def release(self):
+        if self.released:
+            return
+        self.released = True
+        self._timer.stop()
+        held, self._held = self._held, []
+        for show in held:
+            show()
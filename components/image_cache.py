@@ -0,0 +1,154 @@
+import os
+import threading
+from collections import OrderedDict
+from components.archive_source import disk_path
+
+# Default budget for decoded pixels kept in memory (bytes)
+DEFAULT_BUDGET_BYTES = 1024 * 1024 * 1024
+
+
+# Decoded images are keyed by path + mtime + size so edited files are re-decoded
+# (archive members by those of their archive). Returns None when the file cannot
+# be stat'ed; callers then bypass the cache.
+def cache_key(path):
+    try:
+        st = os.stat(disk_path(path))
+    except OSError:
+        return None
+    return (os.path.normcase(os.path.abspath(path)), st.st_mtime_ns, st.st_size)
+
+
+def page_key(key, page):
+    # Key of one page of a multi-page file; page 0 is the file's own key
+    if key is None or page == 0:
+        return key
+    return key + (('page', page),)
+
+
+def image_nbytes(image):
+    if hasattr(image, 'nbytes'):
+        return int(image.nbytes)
+    if hasattr(image, 'sizeInBytes'):
+        return int(image.sizeInBytes())
+    return 0
+
+
+# Thread-safe LRU cache of decoded images, bounded by a byte budget (not an entry count)
+class ImageCache:
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # key -> (image, nbytes)
+        self._budget = max(0, int(budget_bytes))
+        self._used = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def budget(self):
+        return self._budget
+
+    @property
+    def used_bytes(self):
+        return self._used
+
+    def set_budget(self, budget_bytes):
+        with self._lock:
+            self._budget = max(0, int(budget_bytes))
+            self._evict_locked()
+
+    def get(self, key):
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def peek(self, key):
+        # Like get() but without touching LRU order or counters
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def contains(self, key):
+        # Does not touch LRU order or counters (used by prefetch bookkeeping)
+        if key is None:
+            return False
+        with self._lock:
+            return key in self._entries
+
+    def size_of(self, key):
+        # Bytes held for key (0 if absent), without touching LRU order or counters
+        if key is None:
+            return 0
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else 0
+
+    # Returns the image that is now canonical for key: if another decode of the
+    # same file got there first, its buffer is kept and shared instead of a duplicate
+    def put(self, key, image):
+        if key is None or image is None:
+            return image
+        nbytes = image_nbytes(image)
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None:
+                self._entries.move_to_end(key)
+                return old[0]
+            # An image larger than the whole budget would only flush everything else
+            if nbytes > self._budget:
+                return image
+            self._entries[key] = (image, nbytes)
+            self._used += nbytes
+            self._evict_locked()
+            return image
+
+    def discard(self, key):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._used -= old[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._used = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'used_bytes': self._used,
+                'budget_bytes': self._budget,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _evict_locked(self):
+        while self._used > self._budget and self._entries:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self._used -= nbytes
+            self.evictions += 1
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+# Process-wide instance shared by every ImagePanel
+def shared_cache():
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ImageCache()
+        return _shared_cache
@@ -0,0 +1,46 @@
+from PyQt6.QtWidgets import QGraphicsItem
+from PyQt6.QtGui import QImage, QPainter
+from PyQt6.QtCore import Qt, QRectF, QSizeF
+
+
+# Graphics item that paints a decoded QImage directly. Unlike QGraphicsPixmapItem
+# it needs no QPixmap conversion, so the image drawn is the very buffer held by
+# the cache and read by the pixel inspector.
+class ImageItem(QGraphicsItem):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption, True)
+        self._image = QImage()
+        self._size = QSizeF() # Size in scene units; differs from the image for previews
+        self.transformation_mode = Qt.TransformationMode.FastTransformation
+
+    def image(self):
+        return self._image
+
+    def setImage(self, image, size=None):
+        # size: area to stretch the image over, e.g. a reduced preview over the full image
+        self.prepareGeometryChange()
+        self._image = image if image is not None else QImage()
+        self._size = QSizeF(size) if size is not None else QSizeF(self._image.size())
+        self.update()
+
+    def isNull(self):
+        return self._image.isNull()
+
+    def boundingRect(self):
+        return QRectF(0, 0, self._size.width(), self._size.height())
+
+    def setTransformationMode(self, mode):
+        self.transformation_mode = mode
+        self.update()
+
+    def paint(self, painter, option, widget=None):
+        if self._image.isNull():
+            return
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform,
+                              self.transformation_mode == Qt.TransformationMode.SmoothTransformation)
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        sx = self._image.width() / self._size.width()
+        sy = self._image.height() / self._size.height()
+        source = QRectF(exposed.x() * sx, exposed.y() * sy, exposed.width() * sx, exposed.height() * sy)
+        painter.drawImage(exposed, self._image, source)
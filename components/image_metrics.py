@@ -0,0 +1,169 @@
+import math
+import numpy as np
+from components.dtype_convert import DEFAULT_CHUNK_BYTES, value_range
+
+# Difference metrics between two images, computed strip by strip so memory stays
+# bounded whatever the image size. Images are given as row readers:
+# rows(y0, y1) -> samples of rows [y0, y1) in R, G, B(, A) order.
+# Pure numpy, so it is shared by the viewer and headless tools.
+
+# SSIM window (uniform, as in Wang et al. / skimage's default) and constants
+SSIM_WIN = 7
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+
+# Colour map of the difference heatmap: black, blue, red, yellow, white
+_HEAT_STOPS = np.array([0.0, 0.25, 0.55, 0.8, 1.0])
+_HEAT_RGB = np.array([[0, 0, 0], [30, 40, 200], [220, 30, 30], [250, 220, 40], [255, 255, 255]], float)
+
+
+def heat_lut():
+    # 256 x 3 uint8 table: index 0 = no difference, 255 = the largest difference
+    x = np.linspace(0, 1, 256)
+    return np.stack([np.interp(x, _HEAT_STOPS, _HEAT_RGB[:, c]) for c in range(3)], axis=1).astype(np.uint8)
+
+
+class CompareResult:
+    def __init__(self, width, height, mse, max_error, data_range, ssim):
+        self.width = width
+        self.height = height
+        self.mse = mse
+        self.max_error = max_error
+        self.data_range = data_range
+        self.ssim = ssim
+
+    @property
+    def psnr(self):
+        if self.mse == 0:
+            return math.inf
+        return 10 * math.log10(self.data_range ** 2 / self.mse)
+
+    def as_dict(self):
+        return {'width': self.width, 'height': self.height, 'mse': self.mse, 'psnr': self.psnr,
+                'ssim': self.ssim, 'max_error': self.max_error, 'data_range': self.data_range}
+
+
+def _as_float(a, channels):
+    a = a.astype(np.float32, copy=False)
+    if a.ndim == 3 and a.shape[2] == 4 and channels == 3:
+        a = a[..., :3] # Alpha only when both sides have it
+    if channels == 1 and a.ndim == 3:
+        a = a[..., :3].mean(axis=2)
+    return a
+
+
+def _channels(shape):
+    return shape[2] if len(shape) == 3 else 1
+
+
+def _common_channels(shape_a, shape_b):
+    ca, cb = _channels(shape_a), _channels(shape_b)
+    if ca == cb:
+        return ca
+    if min(ca, cb) >= 3:
+        return 3
+    return 1 # Grey against colour: compare luminance
+
+
+def data_range_of(dtype_a, dtype_b, rows_a=None, rows_b=None, height=0):
+    # Peak value used by PSNR/SSIM: the integer type's range, or the span of float data
+    if dtype_a.kind in 'ui' and dtype_b.kind in 'ui':
+        return float(max(np.iinfo(dtype_a).max, np.iinfo(dtype_b).max))
+    lo, hi = math.inf, -math.inf
+    for rows in (rows_a, rows_b):
+        if rows is None:
+            continue
+        for y0 in range(0, height, 256):
+            l, h = value_range(rows(y0, min(height, y0 + 256)))
+            lo, hi = min(lo, float(l)), max(hi, float(h))
+    span = hi - lo
+    return span if span > 0 and math.isfinite(span) else 1.0
+
+
+def _box_sum(x, win):
+    # Sums over every win x win window (valid positions only), via an integral image
+    s = np.zeros((x.shape[0] + 1, x.shape[1] + 1), np.float64)
+    np.cumsum(np.cumsum(x, axis=0, dtype=np.float64), axis=1, out=s[1:, 1:])
+    return s[win:, win:] - s[:-win, win:] - s[win:, :-win] + s[:-win, :-win]
+
+
+def _ssim_sum(a, b, data_range):
+    # Sum and count of the SSIM map over all full windows of two single-channel strips
+    if a.shape[0] < SSIM_WIN or a.shape[1] < SSIM_WIN:
+        return 0.0, 0
+    n = SSIM_WIN * SSIM_WIN
+    mu_a = _box_sum(a, SSIM_WIN) / n
+    mu_b = _box_sum(b, SSIM_WIN) / n
+    # Sample (co)variances, as skimage does by default
+    norm = n / (n - 1)
+    var_a = (_box_sum(a * a, SSIM_WIN) / n - mu_a * mu_a) * norm
+    var_b = (_box_sum(b * b, SSIM_WIN) / n - mu_b * mu_b) * norm
+    cov = (_box_sum(a * b, SSIM_WIN) / n - mu_a * mu_b) * norm
+    c1 = (SSIM_K1 * data_range) ** 2
+    c2 = (SSIM_K2 * data_range) ** 2
+    ssim = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(ssim.sum()), ssim.size
+
+
+def _strip_rows(width, channels, chunk_bytes):
+    # Several float64 temporaries per pixel in the SSIM step
+    return max(SSIM_WIN * 2, chunk_bytes // max(1, width * max(channels, 1) * 8 * 6))
+
+
+def compare(rows_a, rows_b, shape_a, shape_b, dtype_a, dtype_b, heat_out=None,
+            chunk_bytes=DEFAULT_CHUNK_BYTES, token=None):
+    # Compares the common top-left area of two images. heat_out, if given, is a
+    # (height, width) uint8 array that receives the per-pixel largest channel
+    # difference scaled so that the image's maximum error maps to 255.
+    height = min(shape_a[0], shape_b[0])
+    width = min(shape_a[1], shape_b[1])
+    channels = _common_channels(shape_a, shape_b)
+    data_range = data_range_of(np.dtype(dtype_a), np.dtype(dtype_b), rows_a, rows_b, height)
+    step = _strip_rows(width, channels, chunk_bytes)
+    halo = SSIM_WIN - 1
+
+    sq_sum = 0.0
+    max_error = 0.0
+    ssim_sum, ssim_count = 0.0, 0
+    for y0 in range(0, height, step):
+        if token is not None:
+            token.check()
+        y1 = min(height, y0 + step)
+        # Windows straddling strips: each strip also reads the rows below it
+        ye = min(height, y1 + halo)
+        a = _as_float(rows_a(y0, ye)[:, :width], channels)
+        b = _as_float(rows_b(y0, ye)[:, :width], channels)
+        d = np.abs(a[:y1 - y0] - b[:y1 - y0])
+        sq_sum += float(np.square(d, dtype=np.float64).sum())
+        if d.size:
+            max_error = max(max_error, float(np.nanmax(d)))
+
+        # SSIM of each channel, averaged (skimage's channel_axis); the mean over
+        # all windows of all channels, as every channel has the same windows.
+        # Only windows starting inside this strip are counted here.
+        planes = [(a, b)] if a.ndim == 2 else [(a[..., c], b[..., c]) for c in range(a.shape[2])]
+        for pa, pb in planes:
+            s, c = _ssim_sum(pa[:y1 - y0 + halo], pb[:y1 - y0 + halo], data_range)
+            ssim_sum += s
+            ssim_count += c
+
+    mse = sq_sum / max(1, width * height * channels)
+    result = CompareResult(width, height, mse, max_error, data_range,
+                           ssim_sum / ssim_count if ssim_count else 1.0)
+    if heat_out is not None:
+        _write_heat(rows_a, rows_b, width, height, channels, max_error, heat_out, step, token)
+    return result
+
+
+def _write_heat(rows_a, rows_b, width, height, channels, max_error, out, step, token):
+    scale = 255.0 / max_error if max_error > 0 else 0.0
+    for y0 in range(0, height, step):
+        if token is not None:
+            token.check()
+        y1 = min(height, y0 + step)
+        d = np.abs(_as_float(rows_a(y0, y1)[:, :width], channels) - _as_float(rows_b(y0, y1)[:, :width], channels))
+        if d.ndim == 3:
+            d = d.max(axis=2)
+        np.multiply(d, scale, out=d)
+        np.nan_to_num(d, copy=False, nan=255.0)
+        np.copyto(out[y0:y1, :width], np.clip(d, 0, 255), casting='unsafe')
@@ -1,12 +1,21 @@
 import os
 import sys
+import math
 import subprocess
+import warnings
 import numpy as np
-import tifffile
 from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QGraphicsView, QGraphicsScene, 
-                             QGraphicsPixmapItem, QLabel, QSizePolicy, QMenu, QApplication)
-from PyQt6.QtGui import QPixmap, QImage, QPainter, QCursor, QAction
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QSize, QEvent, QRectF
+                             QLabel, QSizePolicy, QMenu, QApplication, QMessageBox)
+from PyQt6.QtGui import QPainter, QCursor, QAction, QTransform
+from PyQt6.QtCore import Qt, pyqtSignal, QSize, QSizeF, QEvent, QRectF, QTimer
+from components.image_cache import shared_cache, cache_key, page_key
+from components.decode_pool import shared_pool, PRIORITY_VISIBLE, PRIORITY_PREVIEW, PRIORITY_PREFETCH
+from components.tiled_item import TiledImageItem, ImagePyramidSource, RegionTileSource, TILED_MIN_SIDE
+from components.tiff_reader import TiffRegionReader
+from components.image_item import ImageItem
+from components.decoding import decode_preview
+from components.archive_source import disk_path, is_member
+from components import tracing
 
 # Helper to import pywin32 components safely
 try:
@@ -16,74 +25,61 @@ try:
 except ImportError:
     HAS_WIN32 = False
 
-class ImageLoader(QThread):
-    image_loaded = pyqtSignal(QImage, str, int) # image, path, load_id
-    error_occurred = pyqtSignal(str)
+# Mouse moves are folded into one pixel readout per frame
+HOVER_INTERVAL_MS = 16
 
-    def __init__(self, path, load_id, parent=None):
-        super().__init__(parent)
-        self.path = path
-        self.load_id = load_id
-        self._is_cancelled = False
+CHANNEL_NAMES = {1: ('V',), 3: ('R', 'G', 'B'), 4: ('R', 'G', 'B', 'A')}
 
-    def run(self):
-        if not self.path:
-            return
+# Refresh rate of the performance HUD
+HUD_INTERVAL_MS = 250
 
-        try:
-            if self.path.lower().endswith(('.tif', '.tiff')):
-                qimg = self._load_tiff(self.path)
-            else:
-                qimg = QImage(self.path)
+# Pages of a multi-page TIFF decoded ahead in the direction of travel
+PAGE_PREFETCH = 3
 
-            if not qimg.isNull():
-                self.image_loaded.emit(qimg, self.path, self.load_id)
-            else:
-                self.error_occurred.emit(f"Failed to load {os.path.basename(self.path)}")
-                
-        except Exception as e:
-            self.error_occurred.emit(str(e))
+# Wheel steps within one frame are applied as one zoom (ms)
+ZOOM_FRAME_MS = 16
+ZOOM_STEP = 1.25
+
+
+def format_sample(value, dtype):
+    if dtype.kind == 'f':
+        return f"{value:.4g}"
+    if dtype.itemsize == 1:
+        return f"{int(value):03d}"
+    if dtype.itemsize == 2 and dtype.kind == 'u':
+        return f"{int(value):05d}"
+    return f"{int(value)}"
 
-    def _load_tiff(self, path):
-         # Read using tifffile
-        data = tifffile.imread(path)
-        
-        # Handle Floating Point
-        if data.dtype.kind == 'f':
-            data_min = np.nanmin(data)
-            data_max = np.nanmax(data)
-            if data_max != data_min:
-                data = (data - data_min) / (data_max - data_min)
-            else:
-                data = np.zeros_like(data)
-            data = (data * 255).astype(np.uint8)
-        elif data.dtype == np.uint16:
-            data = (data / 256).astype(np.uint8)
-        
-        height, width = data.shape[:2]
-        
-        if data.ndim == 2:
-            return QImage(data.data, width, height, data.strides[0], QImage.Format.Format_Grayscale8).copy()
-        elif data.ndim == 3:
-            if data.shape[2] == 3:
-                return QImage(data.data, width, height, data.strides[0], QImage.Format.Format_RGB888).copy()
-            elif data.shape[2] == 4:
-                return QImage(data.data, width, height, data.strides[0], QImage.Format.Format_RGBA8888).copy()
-        
-        return QImage()
+
+# Graphics view that reports how long each paint took, while tracing is on
+class TracedGraphicsView(QGraphicsView):
+    painted = pyqtSignal(object, object) # start, duration (ns; beyond a 32-bit int)
+
+    def paintEvent(self, event):
+        if not tracing.enabled():
+            super().paintEvent(event)
+            return
+        start = tracing.now()
+        super().paintEvent(event)
+        self.painted.emit(start, tracing.now() - start)
 
 
 class ImagePanel(QWidget):
     pixel_info_changed = pyqtSignal(str)
+    hover_moved = pyqtSignal(int, int) # image coordinates, (-1, -1) when the mouse leaves
+    image_changed = pyqtSignal() # A full image (not a preview) is shown, or none
+    view_changed = pyqtSignal() # The user zoomed or panned
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, cache=None, pool=None):
         super().__init__(parent)
+        self.cache = cache if cache is not None else shared_cache()
+        self.pool = pool if pool is not None else shared_pool(self.cache)
         self.layout = QVBoxLayout(self)
         self.layout.setContentsMargins(0, 0, 0, 0)
         
         # Graphics View Setup
         self.scene = QGraphicsScene()
-        self.view = QGraphicsView(self.scene)
+        self.view = TracedGraphicsView(self.scene)
         self.view.setDragMode(QGraphicsView.DragMode.NoDrag) # Default to NoDrag (Arrow Cursor)
         self.view.setTransformationAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
         self.view.setResizeAnchor(QGraphicsView.ViewportAnchor.AnchorUnderMouse)
@@ -94,24 +90,74 @@ class ImagePanel(QWidget):
         self.view.setStyleSheet("background-color: #1e1e1e;")
         self.view.setMouseTracking(True)
         self.view.viewport().installEventFilter(self)
+        self.view.painted.connect(self._on_painted)
+        # Pans by dragging or with the scroll bars are reported; programmatic ones are not
+        self.view.horizontalScrollBar().valueChanged.connect(self._on_scrolled)
+        self.view.verticalScrollBar().valueChanged.connect(self._on_scrolled)
         
         # Context Menu
         self.view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.view.customContextMenuRequested.connect(self.show_context_menu)
 
-        # Image Item
-        self.pixmap_item = QGraphicsPixmapItem()
-        self.scene.addItem(self.pixmap_item)
+        # Image Item (draws the decoded QImage itself; no QPixmap copy)
+        self.direct_item = ImageItem()
+        self.scene.addItem(self.direct_item)
+        self.tiled_item = None # Replaces direct_item for very large images
         
         self.layout.addWidget(self.view)
         
         self.current_path = None
-        self.current_image = None
+        self.current_key = None
+        self.current_image = None # DecodedImage
+        self.region_reader = None # TiffRegionReader when the image is read by region
+        self.probe_size = 1 # Side of the N x N neighbourhood reported by the inspector
+
+        self._hover_pos = None
+        self._hover_timer = QTimer(self)
+        self._hover_timer.setSingleShot(True)
+        self._hover_timer.setInterval(HOVER_INTERVAL_MS)
+        self._hover_timer.timeout.connect(self._update_pixel_info)
         self.current_interpolation = Qt.TransformationMode.FastTransformation
         self.load_id = 0 
-        
-        # Keep track of active loaders to prevent GC
-        self._active_loaders = set()
+        self._request = None # Pending decode for the visible image
+        self._preview_request = None
+        self.showing_preview = False # A reduced preview stands in for the image being decoded
+        self.frame_gate = None # frame_sync.FrameGate this panel's next frame waits at, if any
+
+        # Display levels (window/level, gamma, auto contrast) applied to the decoded
+        # samples; None shows the image as decoded
+        self.levels = None
+        self._window = None # (low, high, gamma) of the image shown
+        self._levels_owner = object() # Owner of full-resolution level jobs in the pool
+
+        # Multi-page TIFFs: the page shown, how many there are, and neighbour prefetch
+        self.current_page = 0
+        self.page_count = 1
+        self._page_step = 1
+        self._page_owner = object() # Owner of neighbour page requests in the pool
+
+        # Zoom and pan: wheel bursts are folded into one scale per frame; a ViewLink,
+        # when set, shares the view with other panels
+        self.link = None
+        self._dragging = False
+        self._applying_view = False
+        self._pending_zoom = 1.0
+        self._zoom_timer = QTimer(self)
+        self._zoom_timer.setSingleShot(True)
+        self._zoom_timer.setInterval(ZOOM_FRAME_MS)
+        self._zoom_timer.timeout.connect(self._apply_pending_zoom)
+
+        # Load timings: load_image() until the image (or its preview) is first painted
+        self._trace_start = None
+        self._trace_preview = False
+        self.hud = QLabel(self.view.viewport())
+        self.hud.setStyleSheet("background-color: rgba(0, 0, 0, 170); color: #8f8; font-family: monospace;"
+                               " font-size: 11px; padding: 4px;")
+        self.hud.move(8, 8)
+        self.hud.hide()
+        self._hud_timer = QTimer(self)
+        self._hud_timer.setInterval(HUD_INTERVAL_MS)
+        self._hud_timer.timeout.connect(self._update_hud)
 
     def eventFilter(self, source, event):
         if source == self.view.viewport():
@@ -120,71 +166,378 @@ class ImagePanel(QWidget):
             elif event.type() == QEvent.Type.MouseButtonPress:
                 if event.button() == Qt.MouseButton.LeftButton:
                     self.view.setDragMode(QGraphicsView.DragMode.ScrollHandDrag)
+                    self._dragging = True
             elif event.type() == QEvent.Type.MouseButtonRelease:
                 if event.button() == Qt.MouseButton.LeftButton:
                     self.view.setDragMode(QGraphicsView.DragMode.NoDrag)
+                    self._dragging = False
             elif event.type() == QEvent.Type.Leave:
+                 self._hover_timer.stop()
+                 self._hover_pos = None
                  self.pixel_info_changed.emit("")
+                 self.hover_moved.emit(-1, -1)
                  
         return super().eventFilter(source, event)
 
+    def image_item(self):
+        return self.tiled_item if self.tiled_item is not None else self.direct_item
+
+    def has_image(self):
+        return self.tiled_item is not None or not self.direct_item.isNull()
+
+    def _clear_tiled_item(self):
+        if self.tiled_item is not None:
+            self.tiled_item.stop()
+            self.scene.removeItem(self.tiled_item)
+            self.tiled_item = None
+
     def _handle_mouse_move(self, event):
-        if self.pixmap_item.pixmap().isNull() or self.current_image is None:
+        # Only remember the position; the readout runs at most once per frame
+        self._hover_pos = event.position().toPoint()
+        if not self._hover_timer.isActive():
+            self._hover_timer.start()
+
+    def _update_pixel_info(self):
+        if self._hover_pos is None or not self.has_image():
             return
 
-        view_pos = event.pos()
-        scene_pos = self.view.mapToScene(view_pos)
-        item_pos = self.pixmap_item.mapFromScene(scene_pos)
-        
+        scene_pos = self.view.mapToScene(self._hover_pos)
+        item_pos = self.image_item().mapFromScene(scene_pos)
         x = int(item_pos.x())
         y = int(item_pos.y())
-        
-        w = self.current_image.width()
-        h = self.current_image.height()
-
-        if 0 <= x < w and 0 <= y < h:
-            color = self.current_image.pixelColor(x, y)
-            r, g, b = color.red(), color.green(), color.blue()
-            info = f"X:{x:04d} Y:{y:04d} | R:{r:03d} G:{g:03d} B:{b:03d}"
-            self.pixel_info_changed.emit(info)
+
+        info = self.describe_pixel(x, y)
+        self.pixel_info_changed.emit(info)
+        if info:
+            self.hover_moved.emit(x, y)
         else:
-            self.pixel_info_changed.emit("")
+            self.hover_moved.emit(-1, -1)
+
+    def set_probe_size(self, size):
+        self.probe_size = max(1, size)
+        self._update_pixel_info()
+
+    def sample_window(self, x, y):
+        # Source samples of the probe neighbourhood around (x, y), or None outside the image
+        if self.current_image is not None:
+            w, h = self.current_image.width(), self.current_image.height()
+        elif self.region_reader is not None:
+            w, h = self.region_reader.width, self.region_reader.height
+        else:
+            return None
+        if not (0 <= x < w and 0 <= y < h):
+            return None
+
+        half = self.probe_size // 2
+        x0, y0, x1, y1 = x - half, y - half, x + half + 1, y + half + 1
+        if self.current_image is not None:
+            return self.current_image.window(x0, y0, x1, y1)
+        return self.region_reader.read_region(0, x0, y0, x1, y1)
+
+    def describe_pixel(self, x, y):
+        try:
+            win = self.sample_window(x, y)
+        except Exception:
+            return ""
+        if win is None or win.size == 0:
+            return ""
+
+        channels = win.shape[2] if win.ndim == 3 else 1
+        names = CHANNEL_NAMES.get(channels, tuple(f"C{i}" for i in range(channels)))
+        flat = win.reshape(-1, channels)
+        text = f"X:{x:04d} Y:{y:04d} | "
+
+        if self.probe_size == 1:
+            return text + " ".join(f"{n}:{format_sample(v, win.dtype)}" for n, v in zip(names, flat[0]))
+
+        if win.dtype.kind == 'f':
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning) # All-NaN windows
+                mean, lo, hi = np.nanmean(flat, axis=0), np.nanmin(flat, axis=0), np.nanmax(flat, axis=0)
+        else:
+            mean, lo, hi = flat.mean(axis=0), flat.min(axis=0), flat.max(axis=0)
+        join = lambda values, dtype: "/".join(format_sample(v, dtype) for v in values)
+        return (text + f"{self.probe_size}x{self.probe_size} {''.join(names)} "
+                f"mean:{'/'.join(f'{v:.1f}' for v in mean)} "
+                f"min:{join(lo, win.dtype)} max:{join(hi, win.dtype)}")
 
-    def load_image(self, file_path):
+    def load_image(self, file_path, page=0):
         # Increment load ID to invalidate previous renders
         self.load_id += 1
+        if file_path != self.current_path:
+            self.page_count = 1
+            self.pool.cancel_owner(self._page_owner)
+        self.current_page = page
+
+        # The previous visible image is no longer wanted; let the worker stop early
+        for request in (self._request, self._preview_request):
+            if request is not None:
+                request.cancel()
+        self._request = self._preview_request = None
+        self.showing_preview = False
         
         self.current_path = file_path
+        self.current_key = None
+        self.region_reader = None
+        self._window = None
+        self.pool.cancel_owner(self._levels_owner)
+        self._trace_start = None
+        if file_path and tracing.enabled():
+            tracing.begin(file_path)
+            self._trace_start = tracing.now()
+            self._trace_preview = False
         if not file_path:
-            self.pixmap_item.setPixmap(QPixmap())
+            if self.frame_gate is not None:
+                self.frame_gate.skip(self)
+            self._clear_tiled_item()
+            self.direct_item.setImage(None)
             self.current_image = None
             self.scene.setSceneRect(QRectF()) # Reset scene rect
+            self.image_changed.emit()
+            return
+
+        # Decoded images are shared between panels through the cache
+        key = page_key(cache_key(file_path), page)
+        self.current_key = key
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._on_image_loaded(cached, file_path, self.load_id)
             return
 
         # Start new load
-        loader = ImageLoader(file_path, self.load_id)
-        loader.image_loaded.connect(self._on_image_loaded)
-        # Clean up reference when finished
-        loader.finished.connect(lambda: self._cleanup_loader(loader))
-        
-        self._active_loaders.add(loader)
-        loader.start()
+        load_id = self.load_id
+        self._request = self.pool.submit(
+            file_path, key, PRIORITY_VISIBLE, owner=self, page=page,
+            callback=lambda path, result, error: self._on_decoded(path, result, error, load_id))
+        if page > 0:
+            return # Pages of a stack are small enough; the previous page stays up meanwhile
+
+        # Meanwhile, a quick decode at about the viewport size is shown first
+        side = self.preview_side()
+        self._preview_request = self.pool.submit(
+            file_path, ('preview', key if key is not None else file_path, side), PRIORITY_PREVIEW, owner=self,
+            decode=lambda path, token: decode_preview(path, side, token),
+            callback=lambda path, result, error: self._on_preview(result, load_id))
+
+    def preview_side(self):
+        viewport = self.view.viewport()
+        return max(256, int(max(viewport.width(), viewport.height()) * self.devicePixelRatioF()))
+
+    def _on_preview(self, preview, loaded_id):
+        if loaded_id != self.load_id:
+            return
+        self._preview_request = None
+        # Nothing to show, or the full image won the race
+        if preview is None or self._request is None:
+            return
+        self._clear_tiled_item()
+        self.direct_item.setImage(preview.qimage, QSizeF(preview.width, preview.height))
+        self.direct_item.setTransformationMode(self.current_interpolation)
+        self.scene.setSceneRect(self.direct_item.boundingRect())
+        self.initial_view()
+        self.showing_preview = True
+        self._trace_preview = True
+
+    def _on_decoded(self, path, result, error, loaded_id):
+        if loaded_id == self.load_id:
+            self._request = None
+            if self._preview_request is not None:
+                self._preview_request.cancel() # Too late to be useful
+                self._preview_request = None
+        if result is None:
+            if error:
+                print(f"Error loading {os.path.basename(path)}: {error}")
+            if loaded_id == self.load_id and self.frame_gate is not None:
+                self.frame_gate.skip(self)
+            return
+        if isinstance(result, TiffRegionReader):
+            self._on_region_opened(result, path, loaded_id)
+            return
+        self._on_image_loaded(result, path, loaded_id)
 
-    def _cleanup_loader(self, loader):
-        if loader in self._active_loaders:
-            self._active_loaders.remove(loader)
+    def _on_region_opened(self, reader, path, loaded_id):
+        if loaded_id != self.load_id:
+            reader.close()
+            return
+        if self.frame_gate is not None and self.frame_gate.hold(
+                self, lambda: self._on_region_opened(reader, path, loaded_id)):
+            return
 
-    def _on_image_loaded(self, qimg, path, loaded_id):
+        # Pixels are read per visible tile; the inspector reads from the file too
+        self.current_image = None
+        self.region_reader = reader
+        self._clear_tiled_item()
+        self.direct_item.setImage(None)
+        self.tiled_item = TiledImageItem(RegionTileSource(reader, self.levels))
+        self.scene.addItem(self.tiled_item)
+        self.tiled_item.setTransformationMode(self.current_interpolation)
+        self.scene.setSceneRect(self.tiled_item.boundingRect())
+        self.initial_view()
+        self.image_changed.emit()
+
+    def _on_image_loaded(self, decoded, path, loaded_id):
         # Ignore if this result is from an old, superseded load request
         if loaded_id != self.load_id:
             return
+        # Panels stepped together show their frames together
+        if self.frame_gate is not None and self.frame_gate.hold(
+                self, lambda: self._on_image_loaded(decoded, path, loaded_id)):
+            return
 
-        self.current_image = qimg.copy() # Store copy for pixel reading
-        pixmap = QPixmap.fromImage(qimg)
-        self.pixmap_item.setPixmap(pixmap)
-        self.pixmap_item.setTransformationMode(self.current_interpolation)
-        self.scene.setSceneRect(QRectF(pixmap.rect())) # Correctly set scene size for scrollbars
-        self.fit_to_view()
+        # One buffer per image: the cache, the pixel inspector and the scene item
+        # all hold the same implicitly shared QImage
+        self.current_image = decoded
+        with tracing.span('show', path=path):
+            if self.levels is not None:
+                self._show_levels(new_image=True)
+            else:
+                self._show_qimage(decoded.qimage)
+        # The preview was laid out at full size already; keep any zoom/pan made since
+        if not self.showing_preview:
+            with tracing.span('fit', path=path):
+                self.initial_view()
+        self.showing_preview = False
+        self.page_count = decoded.page_count
+        if self.page_count > 1 and path is not None:
+            self._prefetch_pages()
+        self.image_changed.emit()
+
+    def _show_qimage(self, qimg, size=None):
+        # size: area a reduced image stands in for (drawn stretched, never tiled)
+        self._clear_tiled_item()
+        if size is None and max(qimg.width(), qimg.height()) > TILED_MIN_SIDE:
+            # Too big to draw in one go: render from a tile pyramid built in the background
+            self.direct_item.setImage(None)
+            self.tiled_item = TiledImageItem(ImagePyramidSource(qimg))
+            self.scene.addItem(self.tiled_item)
+        else:
+            self.direct_item.setImage(qimg, size)
+        item = self.image_item()
+        item.setTransformationMode(self.current_interpolation)
+        self.scene.setSceneRect(item.boundingRect()) # Correctly set scene size for scrollbars
+
+    def set_levels(self, levels):
+        # levels.Levels, or None to show the images as decoded
+        self.levels = levels
+        if self.region_reader is not None and self.tiled_item is not None:
+            self.tiled_item.source.set_levels(levels)
+        elif self.current_image is not None and not self.showing_preview:
+            self._show_levels()
+
+    def level_stats(self):
+        # Histogram of the image shown (levels.SampleStats), or None
+        if self.current_image is not None:
+            return self.current_image.stats()
+        if self.region_reader is not None and self.tiled_item is not None:
+            return self.tiled_item.source.stats()
+        return None
+
+    def _show_levels(self, new_image=False):
+        image = self.current_image
+        window = self.levels.window(image.stats()) if self.levels is not None else None
+        if window == self._window and not new_image:
+            return
+        self._window = window
+        self.pool.cancel_owner(self._levels_owner)
+        if window is None:
+            self._show_qimage(image.qimage)
+            return
+        # Large images: a subsampled version about the size of the viewport right
+        # away, the full resolution from the pool (one job; newer levels cancel it)
+        w, h = image.width(), image.height()
+        step = math.ceil(max(w, h) / self.preview_side())
+        if step <= 1:
+            self._show_qimage(image.leveled(window))
+            return
+        self._show_qimage(image.leveled(window, step), QSizeF(w, h))
+        load_id = self.load_id
+        self.pool.submit(self.current_path, ('levels', self.current_key or id(image), window), PRIORITY_VISIBLE,
+                         owner=self._levels_owner, limit=1,
+                         decode=lambda path, token: image.leveled(window, 1, token),
+                         callback=lambda path, result, error: self._on_leveled(result, window, load_id))
+
+    def _on_leveled(self, qimg, window, loaded_id):
+        if loaded_id != self.load_id or window != self._window or qimg is None or qimg.isNull():
+            return
+        self._show_qimage(qimg)
+
+    def show_page(self, page):
+        # Shows another page of the current multi-page file
+        page = max(0, min(page, self.page_count - 1))
+        if not self.current_path or page == self.current_page:
+            return
+        self._page_step = 1 if page > self.current_page else -1
+        self.load_image(self.current_path, page)
+
+    def _prefetch_pages(self):
+        # The next pages in the direction of travel, and the one behind
+        key = cache_key(self.current_path)
+        step = self._page_step
+        for offset in [step * i for i in range(1, PAGE_PREFETCH + 1)] + [-step]:
+            page = self.current_page + offset
+            if 0 <= page < self.page_count and not self.cache.contains(page_key(key, page)):
+                self.pool.submit(self.current_path, page_key(key, page), PRIORITY_PREFETCH,
+                                 owner=self._page_owner, limit=PAGE_PREFETCH + 1, page=page)
+
+    def _on_painted(self, start, duration):
+        path = self.current_path
+        if self._trace_start is None or not self.has_image():
+            # Repaints (panning, zooming, the HUD itself) go to the trace only
+            tracing.record('paint', start, duration, category='paint')
+            return
+        tracing.record('paint', start, duration, path=path)
+        if self.showing_preview:
+            if self._trace_preview:
+                tracing.record('total.preview', self._trace_start, start + duration - self._trace_start, path=path)
+                self._trace_preview = False
+        else:
+            tracing.record('total', self._trace_start, start + duration - self._trace_start, path=path)
+            self._trace_start = None
+
+    def set_hud_visible(self, visible):
+        self.hud.setVisible(visible)
+        if visible:
+            self._update_hud()
+            self._hud_timer.start()
+        else:
+            self._hud_timer.stop()
+
+    def _update_hud(self):
+        if not self.current_path:
+            self.hud.setText("No image")
+        else:
+            stages = tracing.breakdown(self.current_path)
+            lines = [self.elide(os.path.basename(self.current_path))]
+            lines += [f"{stage:<14}{ms:9.1f} ms" for stage, ms in stages]
+            if not stages:
+                lines.append("(no timings yet)" if tracing.enabled() else "(tracing off)")
+            self.hud.setText("\n".join(lines))
+        self.hud.adjustSize()
+
+    @staticmethod
+    def elide(text, max_len=28):
+        return text if len(text) <= max_len else "..." + text[-(max_len - 3):]
+
+    def set_image(self, decoded):
+        # Shows an image computed elsewhere (e.g. a difference map) instead of a file
+        self.load_image(None)
+        self._on_image_loaded(decoded, None, self.load_id)
+
+    def sample_rows(self):
+        # (shape, dtype, rows(y0, y1)) of the source samples shown, for whole-image
+        # computations off the GUI thread; None without an image or while the next loads
+        if self._request is not None:
+            return None
+        if self.current_image is not None:
+            image = self.current_image
+            channels = image.channels
+            shape = (image.height(), image.width()) + ((channels,) if channels > 1 else ())
+            return shape, image.samples().dtype, lambda y0, y1: image.window(0, y0, image.width(), y1)
+        if self.region_reader is not None:
+            reader = self.region_reader
+            shape = (reader.height, reader.width) + ((reader.samples,) if reader.samples > 1 else ())
+            return shape, reader.dtype, lambda y0, y1: reader.read_region(0, 0, y0, reader.width, y1)
+        return None
 
     def set_interpolation_mode(self, mode_str):
         if mode_str == "Bilinear":
@@ -192,39 +545,112 @@ class ImagePanel(QWidget):
         else:
             self.current_interpolation = Qt.TransformationMode.FastTransformation
         
-        self.pixmap_item.setTransformationMode(self.current_interpolation)
+        self.image_item().setTransformationMode(self.current_interpolation)
         self.view.viewport().update()
 
     def fit_to_view(self):
-        if self.pixmap_item.pixmap().isNull():
+        if not self.has_image():
+            return
+        self.view.fitInView(self.image_item(), Qt.AspectRatioMode.KeepAspectRatio)
+
+    def initial_view(self):
+        # A new image (or size): linked panels take the shared view, others fit
+        if self.link is not None and self.link.state is not None:
+            self.set_view_state(self.link.state)
+        else:
+            self.fit_to_view()
+
+    def view_state(self):
+        # (zoom, cx, cy): screen pixels per image width and the view centre in
+        # normalized image coordinates; None without an image
+        rect = self.scene.sceneRect()
+        if not self.has_image() or rect.width() <= 0 or rect.height() <= 0:
+            return None
+        centre = self.view.mapToScene(self.view.viewport().rect().center())
+        return (self.view.transform().m11() * rect.width(),
+                centre.x() / rect.width(), centre.y() / rect.height())
+
+    def set_view_state(self, state):
+        rect = self.scene.sceneRect()
+        if state is None or not self.has_image() or rect.width() <= 0 or rect.height() <= 0:
+            return
+        zoom, cx, cy = state
+        scale = zoom / rect.width()
+        self._applying_view = True
+        try:
+            self.view.setTransform(QTransform.fromScale(scale, scale))
+            self.view.centerOn(cx * rect.width(), cy * rect.height())
+        finally:
+            self._applying_view = False
+
+    def _on_scrolled(self):
+        if self._applying_view:
             return
-        self.view.fitInView(self.pixmap_item, Qt.AspectRatioMode.KeepAspectRatio)
+        if (self._dragging or self.view.horizontalScrollBar().isSliderDown()
+                or self.view.verticalScrollBar().isSliderDown()):
+            self.view_changed.emit()
 
     def resizeEvent(self, event):
-        self.fit_to_view()
+        self.initial_view()
         super().resizeEvent(event)
 
     def wheelEvent(self, event):
-        if self.pixmap_item.pixmap().isNull():
+        if not self.has_image():
             return
-            
-        zoom_in_factor = 1.25
-        zoom_out_factor = 1 / zoom_in_factor
 
-        if event.angleDelta().y() > 0:
-            zoom_factor = zoom_in_factor
-        else:
-            zoom_factor = zoom_out_factor
-
-        self.view.scale(zoom_factor, zoom_factor)
+        zoom_factor = ZOOM_STEP if event.angleDelta().y() > 0 else 1 / ZOOM_STEP
+        # The first step shows at once; further steps within the frame wait for it
+        if self._zoom_timer.isActive():
+            self._pending_zoom *= zoom_factor
+            return
+        self._zoom_by(zoom_factor)
+        self._zoom_timer.start()
+
+    def _apply_pending_zoom(self):
+        if self._pending_zoom != 1.0:
+            factor, self._pending_zoom = self._pending_zoom, 1.0
+            self._zoom_by(factor)
+            self._zoom_timer.start()
+
+    def _zoom_by(self, factor):
+        self.view.scale(factor, factor) # Anchored under the mouse
+        self.view_changed.emit()
+
+    def memory_report(self):
+        image_bytes = self.current_image.nbytes if self.current_image is not None else 0
+        cached = self.cache.peek(self.current_key)
+        shared = (cached is not None and self.current_image is not None
+                  and cached.qimage.cacheKey() == self.current_image.qimage.cacheKey())
+        display_bytes = self.tiled_item.source.memory_bytes() if self.tiled_item is not None else 0
+        return {
+            'image_bytes': image_bytes,
+            'shared_with_cache': shared,
+            'display_bytes': display_bytes,
+            'total_bytes': image_bytes + display_bytes,
+        }
+
+    def action_memory(self):
+        mb = 1024 * 1024
+        report = self.memory_report()
+        stats = self.cache.stats()
+        text = (f"Decoded image: {report['image_bytes'] / mb:.1f} MB"
+                f" (shared with cache: {'yes' if report['shared_with_cache'] else 'no'})\n"
+                f"Display copies: {report['display_bytes'] / mb:.1f} MB\n"
+                f"Panel total: {report['total_bytes'] / mb:.1f} MB\n\n"
+                f"Cache: {stats['used_bytes'] / mb:.1f} / {stats['budget_bytes'] / mb:.0f} MB"
+                f" in {stats['entries']} images\n"
+                f"Hits: {stats['hits']}  Misses: {stats['misses']}  Evictions: {stats['evictions']}")
+        QMessageBox.information(self, "Memory Usage", text)
 
     def show_context_menu(self, pos):
-        if not self.current_path or not os.path.exists(self.current_path):
+        # Archive members are revealed and described through their archive
+        if not self.current_path or not os.path.exists(disk_path(self.current_path)):
             return
 
         menu = QMenu(self)
         
         action_open = QAction("Open", self)
+        action_open.setEnabled(not is_member(self.current_path))
         action_open.triggered.connect(self.action_open)
         menu.addAction(action_open)
 
@@ -236,6 +662,10 @@ class ImagePanel(QWidget):
         action_copy.triggered.connect(self.action_copy)
         menu.addAction(action_copy)
 
+        action_memory = QAction("Memory Usage", self)
+        action_memory.triggered.connect(self.action_memory)
+        menu.addAction(action_memory)
+
         menu.addSeparator()
 
         action_props = QAction("Properties", self)
@@ -250,7 +680,7 @@ class ImagePanel(QWidget):
 
     def action_reveal(self):
         if self.current_path:
-            path = os.path.normpath(self.current_path)
+            path = os.path.normpath(disk_path(self.current_path))
             subprocess.run(['explorer', '/select,', path])
 
     def action_copy(self):
@@ -262,7 +692,7 @@ class ImagePanel(QWidget):
             return
 
         try:
-            path = os.path.normpath(self.current_path)
+            path = os.path.normpath(disk_path(self.current_path))
             shell.ShellExecuteEx(
                 nShow=win32con.SW_SHOW,
                 fMask=shellcon.SEE_MASK_INVOKEIDLIST,
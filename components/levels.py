@@ -0,0 +1,159 @@
+import math
+import numpy as np
+from components.dtype_convert import DEFAULT_CHUNK_BYTES, convert_into, rows_per_chunk, work_dtype
+
+# Display levels: the source samples mapped to 8 bits through a window
+# (low, high) and a gamma, instead of the fixed conversion done at load time.
+# Integer samples of up to 16 bits go through a table indexed by the raw value;
+# everything else is scaled into a 4096-step table. Histograms are taken from a
+# subsample, so auto contrast on a huge image costs about as much as on a small
+# one. Pure numpy, like dtype_convert.
+
+# Samples looked at for the histogram (the image is subsampled down to about this)
+STATS_SAMPLES = 1 << 20
+HIST_BINS = 1024
+
+# Auto contrast clips this share of the samples (percent) at each end
+AUTO_CLIP = 0.5
+
+# Steps of the table used for float and wide integer samples
+FLOAT_TABLE_STEPS = 4096
+
+
+# Histogram of an image's samples (alpha excluded) over [lo, hi]
+class SampleStats:
+    def __init__(self, lo, hi, counts):
+        self.lo = lo
+        self.hi = hi
+        self.counts = counts
+        self._cumulative = np.cumsum(counts)
+
+    def percentile(self, q):
+        # Approximate value below which q percent of the samples lie
+        total = self._cumulative[-1] if len(self._cumulative) else 0
+        if not total or self.hi <= self.lo:
+            return self.lo
+        i = int(np.searchsorted(self._cumulative, total * q / 100.0))
+        return self.lo + (self.hi - self.lo) * min(i + 1, len(self.counts)) / len(self.counts)
+
+
+def sample_stats(samples):
+    # SampleStats from a strided subsample of at most about STATS_SAMPLES values
+    if samples.ndim == 3 and samples.shape[2] in (2, 4):
+        samples = samples[..., :samples.shape[2] - 1]
+    pixels = samples.shape[0] * samples.shape[1]
+    step = max(1, math.ceil(math.sqrt(pixels * (samples.size // max(1, pixels)) / STATS_SAMPLES)))
+    sub = np.asarray(samples[::step, ::step]).ravel()
+    if sub.dtype.kind == 'f':
+        sub = sub[np.isfinite(sub)]
+    if sub.size == 0:
+        return SampleStats(0.0, 0.0, np.zeros(HIST_BINS, np.int64))
+    lo, hi = float(sub.min()), float(sub.max())
+    if hi <= lo:
+        return SampleStats(lo, hi, np.zeros(HIST_BINS, np.int64))
+    counts, _ = np.histogram(sub, bins=HIST_BINS, range=(lo, hi))
+    return SampleStats(lo, hi, counts)
+
+
+# What a panel shows: a fixed window, or auto contrast (low/high None) resolved
+# against each image's own histogram. gamma > 1 brightens the mid-tones.
+class Levels:
+    def __init__(self, low=None, high=None, gamma=1.0):
+        self.low = low
+        self.high = high
+        self.gamma = gamma
+
+    @property
+    def auto(self):
+        return self.low is None or self.high is None
+
+    def window(self, stats):
+        # (low, high, gamma) for an image with these stats; None while they are unknown
+        if not self.auto:
+            return (self.low, self.high, self.gamma)
+        if stats is None:
+            return None
+        return (stats.percentile(AUTO_CLIP), stats.percentile(100 - AUTO_CLIP), self.gamma)
+
+
+def _ramp(x, low, high, gamma):
+    # x (float array) -> uint8 through the window and gamma
+    span = high - low
+    if span > 0:
+        t = np.clip((x - low) / span, 0, 1)
+    else:
+        t = (x >= high).astype(np.float64)
+    if gamma != 1.0:
+        t = t ** (1.0 / gamma)
+    return (t * 255 + 0.5).astype(np.uint8)
+
+
+def level_table(dtype, window):
+    # Table indexed by the raw bits of each sample (any byte order or signedness)
+    low, high, gamma = window
+    index_type = np.uint8 if dtype.itemsize == 1 else np.uint16
+    values = np.arange(1 << (8 * dtype.itemsize), dtype=index_type).view(dtype)
+    return _ramp(values.astype(np.float64), low, high, gamma)
+
+
+def _uses_table(dtype):
+    return dtype.kind in 'iu' and dtype.itemsize <= 2
+
+
+def levels_into(data, out, window, chunk_bytes=DEFAULT_CHUNK_BYTES, token=None):
+    # Writes the 8-bit display version of data through window = (low, high, gamma)
+    # into out (uint8, same shape; may be a strided QImage view). An alpha channel
+    # is copied as it is. Returns out.
+    if data.ndim == 3 and data.shape[2] in (2, 4):
+        last = data.shape[2] - 1
+        levels_into(data[..., :last], out[..., :last], window, chunk_bytes, token)
+        convert_into(data[..., last:], out[..., last:], chunk_bytes=chunk_bytes, token=token)
+        return out
+
+    dtype = data.dtype
+    step = rows_per_chunk(data, chunk_bytes)
+    if dtype == np.bool_:
+        data = data.view(np.uint8)
+        dtype = data.dtype
+
+    if _uses_table(dtype):
+        table = level_table(dtype, window)
+        index_type = np.uint8 if dtype.itemsize == 1 else np.uint16
+        for start in range(0, data.shape[0], step):
+            if token is not None:
+                token.check()
+            chunk = data[start:start + step]
+            np.take(table, chunk.view(index_type), out=out[start:start + step], mode='clip')
+        return out
+
+    if dtype.kind not in 'fiu':
+        raise ValueError(f"Unsupported sample type {dtype}")
+
+    low, high, gamma = window
+    table = _ramp(np.linspace(0, 1, FLOAT_TABLE_STEPS), 0.0, 1.0, gamma)
+    work = work_dtype(dtype)
+    span = high - low
+    scale = work.type((FLOAT_TABLE_STEPS - 1) / span) if span > 0 else work.type(0)
+    tmp_shape = (min(step, data.shape[0]),) + data.shape[1:]
+    tmp = np.empty(tmp_shape, work)
+    index = np.empty(tmp_shape, np.intp)
+    for start in range(0, data.shape[0], step):
+        if token is not None:
+            token.check()
+        chunk = data[start:start + step]
+        t = tmp[:chunk.shape[0]]
+        np.subtract(chunk, work.type(low), out=t, casting='unsafe')
+        if span > 0:
+            np.multiply(t, scale, out=t)
+            np.clip(t, 0, FLOAT_TABLE_STEPS - 1, out=t)
+            np.add(t, 0.5, out=t) # Rounded by the cast below
+        else:
+            # A zero-width window is a threshold
+            np.greater_equal(t, 0, out=t, casting='unsafe')
+            np.multiply(t, FLOAT_TABLE_STEPS - 1, out=t)
+        # NaN has no 8-bit value; show it as black
+        np.nan_to_num(t, copy=False, nan=0.0)
+        i = index[:chunk.shape[0]]
+        np.copyto(i, t, casting='unsafe')
+        np.take(table, i, out=out[start:start + step], mode='clip')
+    return out
@@ -0,0 +1,158 @@
+import os
+import re
+from bisect import bisect_left, bisect_right
+
+# Pairing of the left and right file lists by a key taken from each file name
+# instead of by position, so one missing file does not shift every later pair.
+# The key is the name without its extension, or what a regex captures from it.
+# No Qt in here.
+
+
+def stem_key(name):
+    stem, dot, _ = name.rpartition('.')
+    return stem if dot else name
+
+
+def file_keys(files, key=stem_key):
+    # Key of every path; str methods rather than os.path keep 100k+ names fast
+    sep = os.sep
+    if os.altsep:
+        names = [p.replace(os.altsep, sep).rpartition(sep)[2] for p in files]
+    else:
+        names = [p.rpartition(sep)[2] for p in files]
+    if key is stem_key:
+        return [n.rpartition('.')[0] or n for n in names]
+    return [key(n) for n in names]
+
+
+def compile_pair_key(pattern):
+    # key(name) -> str or None (unpairable). With a capture group the first group is
+    # the key, otherwise the whole match. An empty or invalid pattern pairs by stem.
+    if not pattern:
+        return stem_key
+    try:
+        regex = re.compile(pattern)
+    except re.error:
+        print(f"Invalid regex: {pattern}")
+        return stem_key
+    group = 1 if regex.groups else 0
+
+    def key(name):
+        m = regex.search(name)
+        return m.group(group) if m is not None else None
+    return key
+
+
+# Pairs of two sorted file lists joined on their keys, built in one pass over each
+# list through a hash index. Pairs are kept in left order; each file is in at most
+# one pair (the first of several files with the same key wins).
+class PairIndex:
+    def __init__(self, files_a, files_b, key=stem_key):
+        # First file of each key on the right (built backwards so the first one wins)
+        keys_b = file_keys(files_b, key)
+        by_key = {k: ib for ib, k in zip(range(len(keys_b) - 1, -1, -1), reversed(keys_b))}
+        by_key.pop(None, None)
+
+        self.pairs = [] # (index in A, index in B), by index in A
+        self.position_a = {} # index in A -> position in pairs
+        self.position_b = {}
+        for ia, k in enumerate(file_keys(files_a, key)):
+            ib = by_key.get(k)
+            if ib is None or ib in self.position_b:
+                continue
+            self.position_a[ia] = self.position_b[ib] = len(self.pairs)
+            self.pairs.append((ia, ib))
+        self.count_b = len(files_b)
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def partner(self, side, index):
+        # Index of the file paired with index on side ('A' or 'B'), or None
+        if side == 'A':
+            pos = self.position_a.get(index)
+            return self.pairs[pos][1] if pos is not None else None
+        pos = self.position_b.get(index)
+        return self.pairs[pos][0] if pos is not None else None
+
+
+# Pairing of more than two lists: every list is paired with a reference list
+# (the first one that has files) through a PairIndex. A reference file is shown
+# only together with its partners in all the other lists. Empty lists (panels
+# with no folder open yet) take no part: they never break a group and their
+# index in a group is None.
+class PairGroup:
+    def __init__(self, lists, key=stem_key):
+        self.ref = next((i for i, files in enumerate(lists) if files), 0)
+        self.counts = [len(files) for files in lists]
+        self.indexes = [PairIndex(lists[self.ref], files, key) if files and i != self.ref else None
+                        for i, files in enumerate(lists)]
+        common = set(range(self.counts[self.ref]))
+        for index in self.indexes:
+            if index is not None:
+                common.intersection_update(index.position_a)
+        self.common = sorted(common) # Reference indices paired in every list that has files
+        self._position = {ia: pos for pos, ia in enumerate(self.common)}
+
+    def __len__(self):
+        return len(self.common)
+
+    def members(self, index_ref):
+        # Index in every list shown with reference file index_ref (None for an
+        # empty list), or None if that file is not in a full group
+        if index_ref not in self._position:
+            return None
+        return [index_ref if side == self.ref else index.partner('A', index_ref) if index is not None else None
+                for side, index in enumerate(self.indexes)]
+
+    def reference(self, side, index):
+        # Reference index of file index in list side, or None
+        if side == self.ref:
+            return index
+        pair_index = self.indexes[side]
+        return pair_index.partner('B', index) if pair_index is not None else None
+
+    def step(self, indices, direction):
+        # Indices of every list at the next (1) or previous (-1) group from the
+        # files shown (one index per list), or None
+        pos = None
+        for side, index in enumerate(indices):
+            pos = self._position.get(self.reference(side, index))
+            if pos is not None:
+                break
+        if pos is not None:
+            pos += direction
+        elif direction > 0:
+            pos = bisect_right(self.common, indices[self.ref])
+        else:
+            pos = bisect_left(self.common, indices[self.ref]) - 1
+        if not 0 <= pos < len(self.common):
+            return None
+        return self.members(self.common[pos])
+
+    def unmatched(self, side, limit=None):
+        # Files of list side not shown with a full group, in order
+        if side == self.ref:
+            result = []
+            for i in range(self.counts[side]):
+                if i not in self._position:
+                    result.append(i)
+                    if limit is not None and len(result) >= limit:
+                        break
+            return result
+        index = self.indexes[side]
+        result = []
+        for i in range(self.counts[side]):
+            if index.position_b.get(i) is None or index.pairs[index.position_b[i]][0] not in self._position:
+                result.append(i)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def unmatched_count(self, side):
+        if side == self.ref:
+            return self.counts[side] - len(self.common)
+        index = self.indexes[side]
+        if index is None:
+            return 0
+        return index.count_b - sum(1 for ia, _ in index.pairs if ia in self._position)
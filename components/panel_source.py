@@ -0,0 +1,69 @@
+from bisect import bisect_left
+from components.file_listing import apply_changes
+
+# The file list behind one panel: the open folder, its complete listing, the
+# filtered list shown and the position in it. The main window keeps one per
+# panel; the scanner, watcher and prefetcher know each by its key. No Qt in here.
+
+
+class PanelSource:
+    def __init__(self, key):
+        self.key = key # 'A', 'B', ...
+        self.folder = None
+        self.all_files = [] # Complete list
+        self.files = [] # Filtered list
+        self.index = 0
+
+    def open(self, folder):
+        # A different folder (None: closed); its files stream in through add_batch
+        self.folder = folder
+        self.all_files = []
+        self.files = []
+        self.index = 0
+
+    def current(self):
+        return self.files[self.index] if self.index < len(self.files) else None
+
+    def step(self, delta):
+        # Moves by delta if that stays inside the list; returns True if it moved
+        index = self.index + delta
+        if 0 <= index < len(self.files):
+            self.index = index
+            return True
+        return False
+
+    def jump(self, index):
+        if 0 <= index < len(self.files) and index != self.index:
+            self.index = index
+            return True
+        return False
+
+    def set_files(self, files):
+        # A new filter result
+        self.files = files
+        self.index = 0
+
+    def add_batch(self, paths, matched):
+        # A scan batch (sorted) and the part of it passing the filter. Returns the
+        # file shown before, which stays shown while earlier names keep arriving.
+        self.all_files.extend(paths)
+        self.all_files.sort() # Two sorted runs: a linear merge
+        shown = self.current()
+        if matched:
+            self.files.extend(matched)
+            self.files.sort()
+            self.index = bisect_left(self.files, shown) if shown is not None else 0
+        return shown
+
+    def apply_changes(self, added, removed, matched):
+        # Files that appeared in (matched: those passing the filter) or vanished from
+        # the folder. Returns True if the same file is still shown.
+        shown = self.current()
+        self.all_files = apply_changes(self.all_files, added, removed)
+        self.files = apply_changes(self.files, matched, removed)
+        if shown is not None:
+            # Stay on the same file; if it was deleted, on the one that followed it
+            self.index = min(bisect_left(self.files, shown), max(0, len(self.files) - 1))
+        else:
+            self.index = 0
+        return shown is not None and self.current() == shown
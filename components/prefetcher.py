@@ -0,0 +1,115 @@
+from collections import deque, defaultdict
+from PyQt6.QtCore import QObject
+from components.image_cache import cache_key
+from components.decoding import DecodedImage
+from components.tiff_reader import TiffRegionReader
+from components.decode_pool import PRIORITY_PREFETCH
+
+# Fraction of the cache budget the prefetch window may occupy, so prefetching
+# never evicts the images that are currently on screen
+DEFAULT_MEMORY_FRACTION = 0.5
+DEFAULT_DEPTH = 4
+
+
+# Decodes the images around the current indices into the shared cache.
+# The navigation direction of each side is guessed from its recent steps; images
+# ahead in that direction are fetched first and one image behind is kept warm.
+# However many sides there are, the window is bounded by the same share of the
+# cache budget.
+class Prefetcher(QObject):
+    def __init__(self, cache, pool, depth=DEFAULT_DEPTH, memory_fraction=DEFAULT_MEMORY_FRACTION, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.pool = pool
+        self.depth = depth
+        self.memory_fraction = memory_fraction
+        self.window_bytes = 0
+
+        self._history = defaultdict(lambda: deque(maxlen=4)) # side -> recent steps
+        self._pending = {} # cache key -> DecodeRequest
+
+    def memory_ceiling(self):
+        return int(self.cache.budget * self.memory_fraction)
+
+    def note_step(self, side, step):
+        self._history[side].append(step)
+
+    def direction(self, side):
+        total = sum(self._history[side])
+        if total > 0:
+            return 1
+        if total < 0:
+            return -1
+        return 0
+
+    def cancel(self):
+        # Drops queued work and asks running decodes to stop at their next checkpoint
+        self.pool.cancel_owner(self)
+        self._pending.clear()
+
+    def reset(self, side=None):
+        if side:
+            self._history.pop(side, None)
+        else:
+            self._history.clear()
+        self.cancel()
+
+    def schedule(self, sides):
+        # sides: [(side, files, index)] of every panel
+        self.window_bytes = 0
+        window = []
+        if self.depth > 0:
+            orders = [self._candidates(files, index, self.direction(side)) for side, files, index in sides]
+            # Interleave sides so all panels are ready for the same next frame
+            for i in range(max((len(order) for order in orders), default=0)):
+                for order in orders:
+                    if i < len(order):
+                        key = cache_key(order[i])
+                        if key is not None:
+                            window.append((order[i], key))
+
+        # Work that fell out of the window is stale; work still inside it keeps running
+        keys = {key for _, key in window}
+        for key in list(self._pending):
+            if key not in keys:
+                self._pending.pop(key).cancel()
+
+        ceiling = self.memory_ceiling()
+        for path, key in window:
+            if self.window_bytes >= ceiling:
+                break
+            held = self.cache.size_of(key)
+            if held:
+                self.window_bytes += held
+                continue
+            if key in self._pending and not self._pending[key].cancelled:
+                continue
+            self._pending[key] = self.pool.submit(
+                path, key, PRIORITY_PREFETCH, owner=self, limit=max(4 * self.depth, len(window)),
+                callback=lambda path, decoded, error, key=key: self._on_decoded(key, decoded))
+
+    def _on_decoded(self, key, decoded):
+        self._pending.pop(key, None)
+        if isinstance(decoded, TiffRegionReader):
+            # A region-read TIFF is only opened; the panel that shows it opens its own
+            decoded.close()
+            return
+        if not isinstance(decoded, DecodedImage):
+            return # Nothing decoded
+        self.window_bytes += decoded.nbytes
+        # Stop before the prefetch window pushes the visible images out of the cache
+        if self.window_bytes >= self.memory_ceiling():
+            self.cancel()
+
+    def _candidates(self, files, index, direction):
+        n = len(files)
+        if n == 0:
+            return []
+        if direction == 0:
+            # No clear direction (e.g. after a jump): alternate both ways
+            offsets = []
+            for d in range(1, self.depth // 2 + 1):
+                offsets += [d, -d]
+        else:
+            offsets = [direction * d for d in range(1, self.depth + 1)] + [-direction]
+        return [files[index + o] for o in offsets if 0 <= index + o < n]
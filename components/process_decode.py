@@ -0,0 +1,113 @@
+import math
+import concurrent.futures
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import tifffile
+from components.dtype_convert import convert_into
+
+# Optional decoding of whole TIFFs in worker processes. The codecs and the numpy
+# conversion hold the GIL for long stretches, so decode threads barely overlap;
+# processes do. Pixels come back through shared memory that the parent allocates
+# and owns, so nothing is pickled and an abandoned decode leaks nothing.
+# No Qt in here: the workers never import it.
+
+# How often a waiting decode checks for cancellation (seconds)
+_POLL_SECONDS = 0.05
+
+
+def tiff_layout(path):
+    # (shape, dtype) of the image a whole-file decode produces, or None if it cannot be displayed
+    with tifffile.TiffFile(path) as tif:
+        series = tif.series[0]
+        shape, dtype = tuple(series.shape), series.dtype
+    if len(shape) == 2 or (len(shape) == 3 and shape[2] in (3, 4)):
+        return shape, dtype
+    return None
+
+
+def _decode_into(path, shape, dtype, display_name, samples_name):
+    # Runs in a worker process: decodes path into the parent's buffers
+    display_shm = shared_memory.SharedMemory(name=display_name)
+    samples_shm = shared_memory.SharedMemory(name=samples_name) if samples_name else None
+    try:
+        display = np.ndarray(shape, np.uint8, buffer=display_shm.buf)
+        with tifffile.TiffFile(path) as tif:
+            if samples_shm is None:
+                tif.asarray(out=display)
+            else:
+                samples = np.ndarray(shape, dtype, buffer=samples_shm.buf)
+                tif.asarray(out=samples)
+                convert_into(samples, display)
+                del samples
+        del display
+    finally:
+        display_shm.close()
+        if samples_shm is not None:
+            samples_shm.close()
+
+
+# Shared buffers of one decode: the 8-bit display pixels and, for other sample
+# types, the original samples
+class _SharedBuffers:
+    def __init__(self, shape, dtype):
+        count = math.prod(shape)
+        self.display = shared_memory.SharedMemory(create=True, size=max(1, count))
+        self.samples = None
+        if dtype != np.uint8:
+            self.samples = shared_memory.SharedMemory(create=True, size=max(1, count * dtype.itemsize))
+
+    def release(self):
+        for shm in (self.display, self.samples):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self.display = self.samples = None
+
+
+class ProcessDecoder:
+    def __init__(self, workers):
+        self.workers = workers
+        # spawn: a forked child would inherit the parent's Qt and thread state
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+    def decode_tiff(self, path, token, consume):
+        # Decodes path in a worker and returns consume(display, samples), called with
+        # views of the shared buffers (samples is None for 8-bit data). The views are
+        # only valid during the call. Returns None when the layout is not displayable.
+        layout = tiff_layout(path)
+        if layout is None:
+            return None
+        shape, dtype = layout
+        buffers = _SharedBuffers(shape, dtype)
+        future = self.executor.submit(_decode_into, path, shape, dtype, buffers.display.name,
+                                      buffers.samples.name if buffers.samples is not None else None)
+        while True:
+            try:
+                future.result(timeout=_POLL_SECONDS)
+                break
+            except concurrent.futures.TimeoutError:
+                if token is not None and token.cancelled:
+                    # A running worker still writes into the buffers; free them after it
+                    if future.cancel():
+                        buffers.release()
+                    else:
+                        future.add_done_callback(lambda _: buffers.release())
+                    token.check()
+            except BaseException:
+                buffers.release()
+                raise
+
+        display = samples = None
+        try:
+            display = np.ndarray(shape, np.uint8, buffer=buffers.display.buf)
+            if buffers.samples is not None:
+                samples = np.ndarray(shape, dtype, buffer=buffers.samples.buf)
+            return consume(display, samples)
+        finally:
+            display = samples = None # Views must be gone before the memory is closed
+            buffers.release()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
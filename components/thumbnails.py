@@ -0,0 +1,80 @@
+import os
+import hashlib
+from PyQt6.QtGui import QImage
+from components.decoding import decode_scaled
+
+# Longer side of a thumbnail (pixels)
+THUMB_SIDE = 128
+
+# Thumbnails kept on disk; the least recently used files are deleted beyond this
+DISK_BUDGET_BYTES = 512 * 1024 * 1024
+
+
+# Thumbnails stored as small PNG files, one per (path, mtime, size) cache key, so
+# an edited file gets a new thumbnail and an unchanged one is never decoded twice
+class ThumbnailStore:
+    def __init__(self, directory, budget_bytes=DISK_BUDGET_BYTES):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+
+    def _file(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + '.png')
+
+    def load(self, key):
+        path = self._file(key)
+        if not os.path.exists(path):
+            return None
+        qimg = QImage(path)
+        if qimg.isNull():
+            return None
+        try:
+            os.utime(path) # Marks it as recently used for prune()
+        except OSError:
+            pass
+        return qimg
+
+    def save(self, key, qimg):
+        path = self._file(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            if qimg.save(tmp, 'PNG'):
+                os.replace(tmp, path) # Readers never see a half-written file
+        except OSError as e:
+            print(f"Could not store thumbnail: {e}")
+
+    def prune(self):
+        entries = []
+        total = 0
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.budget_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def thumbnail(self, path, key, token=None):
+        # Stored thumbnail of path, decoding (at reduced size) and storing it if needed
+        if key is not None:
+            qimg = self.load(key)
+            if qimg is not None:
+                return qimg
+        qimg = decode_scaled(path, THUMB_SIDE, token)
+        if qimg.isNull():
+            raise ValueError("Failed to decode")
+        if key is not None:
+            self.save(key, qimg)
+        return qimg
@@ -0,0 +1,280 @@
+import math
+import threading
+from collections import OrderedDict
+import numpy as np
+import tifffile
+from components.dtype_convert import needs_range, value_range
+from components.image_cache import cache_key
+from components.archive_source import file_source, is_member
+
+# Region reading for TIFFs too large to decode whole. Uncompressed files are
+# memory-mapped; tiled or stripped compressed files decode only the segments
+# that intersect the requested region. No Qt in here, so it can be used from
+# any worker thread or a headless tool.
+
+# Images with a side above this are read region by region
+REGION_MIN_SIDE = 8192
+
+# Virtual levels are added (by subsampling) until the coarsest fits this size
+OVERVIEW_SIDE = 512
+
+# Compressed files whose tiles or strips each hold more than this share of the
+# image are decoded whole instead: every region read (and every hovered pixel)
+# would decode most of the image again
+MAX_SEGMENT_SHARE = 1 / 16
+
+# Decoded segments kept per reader (bytes)
+SEGMENT_CACHE_BYTES = 128 * 1024 * 1024
+
+# Multi-page files kept open, so moving through their pages never indexes them again
+MAX_OPEN_STACKS = 4
+
+
+class _Level:
+    def __init__(self, series_level, memmap):
+        self.keyframe = series_level.keyframe
+        self.shape = series_level.shape
+        self.memmap = memmap
+
+
+class TiffRegionReader:
+    def __init__(self, path, tif, series):
+        self.path = path
+        self.tif = tif
+        self.dtype = series.dtype
+        self.height, self.width = series.shape[:2]
+        self.samples = series.shape[2] if len(series.shape) == 3 else 1
+
+        self._lock = threading.Lock() # The file handle is shared between workers
+        self._holders = 1 # Each holder calls close() once; the file closes with the last
+        self._segments = OrderedDict() # (stored level, segment index) -> ndarray
+        self._segment_bytes = 0
+
+        # Pyramid levels already stored in the file (SubIFDs, SVS/OME reduced pages)
+        stored = []
+        for i, level in enumerate(series.levels):
+            memmap = None
+            if level.keyframe.is_memmappable and not is_member(path):
+                try:
+                    memmap = tifffile.memmap(path, series=0, level=i, mode='r')
+                except Exception:
+                    memmap = None
+            stored.append(_Level(level, memmap))
+        self.levels = [(lvl, 1) for lvl in stored] # (stored level, subsampling step)
+
+        # Fill in coarser levels by subsampling the smallest stored one
+        base = stored[-1]
+        step = 1
+        while max(self._level_dims(base, step)) > OVERVIEW_SIDE:
+            step *= 2
+            self.levels.append((base, step))
+
+    @classmethod
+    def open(cls, path, min_side=REGION_MIN_SIDE):
+        # Returns None for files smaller than min_side or that this reader cannot address by region
+        try:
+            tif = tifffile.TiffFile(file_source(path))
+        except Exception:
+            return None
+        try:
+            series = tif.series[0]
+            keyframe = series.keyframe
+            if (series.axes not in ('YX', 'YXS') or len(series.pages) != 1
+                    or max(series.shape[:2]) <= min_side):
+                tif.close()
+                return None
+            if keyframe.planarconfig != 1 and len(series.shape) == 3:
+                tif.close()
+                return None
+            seg_h, seg_w = keyframe.chunks[:2]
+            if ((not keyframe.is_memmappable or is_member(path))
+                    and seg_h * seg_w > MAX_SEGMENT_SHARE * keyframe.imagelength * keyframe.imagewidth):
+                tif.close()
+                return None
+            return cls(path, tif, series)
+        except Exception:
+            tif.close()
+            return None
+
+    def share(self):
+        # One more holder of this reader (e.g. two panels showing the same file)
+        with self._lock:
+            self._holders += 1
+        return self
+
+    def close(self):
+        # Memory maps are released with the last view of them (a worker may still
+        # be copying a tile out of one); nothing can be read afterwards
+        with self._lock:
+            self._holders -= 1
+            if self._holders > 0:
+                return
+            self.tif.close()
+            self._segments.clear()
+            self._segment_bytes = 0
+            for level, _ in self.levels:
+                level.memmap = None
+
+    def reads_cheaply(self, index):
+        # True when reading a whole level touches little more than its own pixels:
+        # a stored pyramid level, or a subsampled memory map
+        level, step = self.levels[index]
+        return index > 0 and (step == 1 or level.memmap is not None)
+
+    def level_for(self, side):
+        # Coarsest level whose longer side is still at least side
+        for index in range(self.level_count - 1, -1, -1):
+            if max(self.level_size(index)) >= side:
+                return index
+        return 0
+
+    def value_range(self, samples=None, token=None):
+        # Display range shared by all tiles, estimated from the coarsest level, or
+        # from samples of a whole level the caller has read already
+        if not needs_range(self.dtype):
+            return None
+        if samples is None:
+            w, h = self.level_size(self.level_count - 1)
+            samples = self.read_region(self.level_count - 1, 0, 0, w, h, token)
+        return value_range(samples, token=token)
+
+    @property
+    def level_count(self):
+        return len(self.levels)
+
+    def _level_dims(self, level, step):
+        h, w = level.shape[:2]
+        return max(1, math.ceil(w / step)), max(1, math.ceil(h / step))
+
+    def level_size(self, index):
+        level, step = self.levels[index]
+        return self._level_dims(level, step)
+
+    def read_region(self, index, x0, y0, x1, y1, token=None):
+        # Pixels [y0:y1, x0:x1] of a level, in that level's coordinates
+        level, step = self.levels[index]
+        w, h = self._level_dims(level, step)
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(w, x1), min(h, y1)
+        if level.memmap is not None:
+            sl = level.memmap[y0 * step:y1 * step:step, x0 * step:x1 * step:step]
+            return np.ascontiguousarray(sl)
+        return self._read_segments(level, x0 * step, y0 * step, x1 * step, y1 * step, step, token)
+
+    def _read_segments(self, level, x0, y0, x1, y1, step, token):
+        keyframe = level.keyframe
+        seg_h, seg_w = keyframe.chunks[:2]
+        ny, nx = keyframe.chunked[:2]
+        out_h = len(range(y0, y1, step))
+        out_w = len(range(x0, x1, step))
+        out = np.zeros((out_h, out_w) + level.shape[2:], dtype=level.keyframe.dtype)
+
+        for iy in range(y0 // seg_h, min(ny, (y1 - 1) // seg_h + 1)):
+            for ix in range(x0 // seg_w, min(nx, (x1 - 1) // seg_w + 1)):
+                if token is not None:
+                    token.check()
+                seg = self._segment(level, iy * nx + ix)
+                sy, sx = iy * seg_h, ix * seg_w
+                # First source row/col inside both the segment and the subsampling grid
+                ry = max(y0, sy)
+                ry += (y0 - ry) % step
+                rx = max(x0, sx)
+                rx += (x0 - rx) % step
+                ey = min(y1, sy + seg.shape[0])
+                ex = min(x1, sx + seg.shape[1])
+                if ry >= ey or rx >= ex:
+                    continue
+                part = seg[ry - sy:ey - sy:step, rx - sx:ex - sx:step]
+                oy, ox = (ry - y0) // step, (rx - x0) // step
+                out[oy:oy + part.shape[0], ox:ox + part.shape[1]] = part
+        return out
+
+    def _segment(self, level, index):
+        key = (id(level), index)
+        with self._lock:
+            seg = self._segments.get(key)
+            if seg is not None:
+                self._segments.move_to_end(key)
+                return seg
+            fh = self.tif.filehandle
+            fh.seek(level.keyframe.dataoffsets[index])
+            data = fh.read(level.keyframe.databytecounts[index])
+
+        # Decoding happens outside the lock so workers overlap on CPU
+        seg, _, _ = level.keyframe.decode(data, index, jpegtables=level.keyframe.jpegtables)
+        seg = seg[0]
+        if seg.ndim == 3 and seg.shape[2] == 1 and len(level.shape) == 2:
+            seg = seg[..., 0]
+
+        with self._lock:
+            self._segments[key] = seg
+            self._segment_bytes += seg.nbytes
+            while self._segment_bytes > SEGMENT_CACHE_BYTES and len(self._segments) > 1:
+                _, old = self._segments.popitem(last=False)
+                self._segment_bytes -= old.nbytes
+        return seg
+
+
+# The pages of a multi-page or multi-series TIFF (z-stacks, time series, OME
+# series), indexed from the IFDs without decoding any pixel data. The file stays
+# open and one page is decoded per read; tifffile's file lock serializes the
+# reads while workers decode pages in parallel.
+class TiffStack:
+    def __init__(self, path, tif, pages):
+        self.path = path
+        self.tif = tif
+        self.pages = pages # [(series index, TiffPage or TiffFrame)]
+
+    @classmethod
+    def from_file(cls, path, tif):
+        # Takes over tif when it holds more than one page; None (tif untouched) otherwise
+        pages = []
+        for index, series in enumerate(tif.series):
+            pages.extend((index, page) for page in series.pages if page is not None)
+        if len(pages) < 2:
+            return None
+        tif.filehandle.set_lock(True)
+        return cls(path, tif, pages)
+
+    @property
+    def count(self):
+        return len(self.pages)
+
+    def read(self, index, token=None):
+        if token is not None:
+            token.check()
+        _, page = self.pages[max(0, min(index, len(self.pages) - 1))]
+        data = page.asarray()
+        if data.ndim == 3 and data.shape[0] in (3, 4) and data.shape[2] not in (3, 4):
+            data = np.moveaxis(data, 0, 2) # Planar RGB(A) page
+        return data
+
+    def close(self):
+        self.tif.close()
+
+
+_stacks = OrderedDict() # cache key -> TiffStack
+_stacks_lock = threading.Lock()
+
+
+def open_stack(path):
+    # The open TiffStack of path, if it was opened before (and is unchanged)
+    key = cache_key(path)
+    with _stacks_lock:
+        stack = _stacks.get(key)
+        if stack is not None:
+            _stacks.move_to_end(key)
+        return stack
+
+
+def keep_stack(stack):
+    # Evicted stacks are not closed here: a worker may still be reading one. Their
+    # files close when the last reference goes.
+    key = cache_key(stack.path)
+    if key is None:
+        return
+    with _stacks_lock:
+        _stacks[key] = stack
+        _stacks.move_to_end(key)
+        while len(_stacks) > MAX_OPEN_STACKS:
+            _stacks.popitem(last=False)
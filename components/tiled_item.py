@@ -0,0 +1,452 @@
+import math
+from collections import OrderedDict
+from PyQt6.QtWidgets import QGraphicsItem, QStyleOptionGraphicsItem
+from PyQt6.QtGui import QImage, QPixmap, QPainter
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, QRect, QRectF, pyqtSignal
+from components.decoding import CancelToken, DecodeCancelled, array_to_qimage
+from components.levels import sample_stats
+
+TILE_SIZE = 512
+
+# Images with a side above this are drawn as tiles (GPU textures and single
+# QPixmaps of this size become slow or fail outright)
+TILED_MIN_SIDE = 8192
+
+# Upper bound for tile pixmaps kept around by all items together (bytes), so
+# more panels share the budget instead of adding to it
+TILE_CACHE_BYTES = 256 * 1024 * 1024
+
+_tile_bytes_total = 0
+_region_pool = None
+
+
+def region_pool():
+    # Workers reading region tiles, shared by every panel
+    global _region_pool
+    if _region_pool is None:
+        _region_pool = QThreadPool()
+        _region_pool.setMaxThreadCount(max(2, QThreadPool.globalInstance().maxThreadCount() // 2))
+    return _region_pool
+
+
+def level_size(width, height, level):
+    scale = 1 << level
+    return max(1, math.ceil(width / scale)), max(1, math.ceil(height / scale))
+
+
+def level_count(width, height):
+    # Halve until the whole level fits in one tile
+    count = 1
+    while max(level_size(width, height, count - 1)) > TILE_SIZE:
+        count += 1
+    return count
+
+
+class PyramidSignals(QObject):
+    level_ready = pyqtSignal(int, QImage)
+
+
+# Builds the downscaled levels of an image pyramid in the background
+class PyramidBuilder(QRunnable):
+    def __init__(self, image, count):
+        super().__init__()
+        # Kept alive by the owning source so its token can still be cancelled
+        self.setAutoDelete(False)
+        self.image = image
+        self.count = count
+        self.token = CancelToken()
+        self.signals = PyramidSignals()
+
+    def run(self):
+        w, h = self.image.width(), self.image.height()
+        coarsest = self.count - 1
+        try:
+            # Overview first, so a zoomed-out view never has to touch full-resolution tiles
+            self.token.check()
+            size = level_size(w, h, coarsest)
+            self.signals.level_ready.emit(coarsest, self.image.scaled(
+                size[0], size[1], Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation))
+
+            prev = self.image
+            for level in range(1, coarsest):
+                self.token.check()
+                size = level_size(w, h, level)
+                prev = prev.scaled(size[0], size[1], Qt.AspectRatioMode.IgnoreAspectRatio,
+                                   Qt.TransformationMode.SmoothTransformation)
+                self.signals.level_ready.emit(level, prev)
+        except DecodeCancelled:
+            pass
+
+
+# Base for the tile sources of TiledImageItem: level geometry plus an LRU of
+# tile pixmaps. tile() returns (QPixmap or QImage, source rect), or None while a
+# tile is not available yet.
+class TileSource(QObject):
+    updated = pyqtSignal()
+
+    def __init__(self, width, height, parent=None):
+        super().__init__(parent)
+        self.width = width
+        self.height = height
+        self._tiles = OrderedDict() # (level, tx, ty) -> QPixmap
+        self._tile_bytes = 0
+
+    def level_count(self):
+        return 1
+
+    def level_size(self, level):
+        return self.width, self.height
+
+    def is_level_ready(self, level):
+        return True
+
+    def overview(self):
+        return None
+
+    def tile(self, level, tx, ty):
+        return None
+
+    def stop(self):
+        pass
+
+    def prepare(self, visible):
+        # Called with every (level, tx, ty) the item is about to draw
+        pass
+
+    def memory_bytes(self):
+        # Pixels held for display on top of the decoded image itself
+        return self._tile_bytes
+
+    def _cached_tile(self, key):
+        pixmap = self._tiles.get(key)
+        if pixmap is None:
+            return None
+        self._tiles.move_to_end(key)
+        return pixmap, QRectF(pixmap.rect())
+
+    def _store_tile(self, key, pixmap):
+        self._tiles[key] = pixmap
+        self._add_tile_bytes(pixmap.width() * pixmap.height() * 4)
+        # Over the shared budget: this source gives up its own oldest tiles
+        while _tile_bytes_total > TILE_CACHE_BYTES and len(self._tiles) > 1:
+            _, old = self._tiles.popitem(last=False)
+            self._add_tile_bytes(-old.width() * old.height() * 4)
+
+    def _add_tile_bytes(self, nbytes):
+        global _tile_bytes_total
+        self._tile_bytes += nbytes
+        _tile_bytes_total += nbytes
+
+    def _drop_tiles(self):
+        self._tiles.clear()
+        self._add_tile_bytes(-self._tile_bytes)
+
+    def tile_rect(self, level, tx, ty):
+        w, h = self.level_size(level)
+        return QRect(tx * TILE_SIZE, ty * TILE_SIZE,
+                     min(TILE_SIZE, w - tx * TILE_SIZE), min(TILE_SIZE, h - ty * TILE_SIZE))
+
+
+# Tiles drawn straight out of an already decoded QImage and its background-built
+# pyramid; no per-tile pixmaps are made
+class ImagePyramidSource(TileSource):
+    def __init__(self, image, parent=None):
+        super().__init__(image.width(), image.height(), parent)
+        self.levels = {0: image}
+        self._count = level_count(image.width(), image.height())
+
+        self.builder = None
+        if self._count > 1:
+            # Nearest-neighbour overview right away (cheap: it only samples the
+            # output pixels); the builder replaces it with a filtered one
+            coarsest = self._count - 1
+            size = level_size(image.width(), image.height(), coarsest)
+            self.levels[coarsest] = image.scaled(size[0], size[1], Qt.AspectRatioMode.IgnoreAspectRatio,
+                                                 Qt.TransformationMode.FastTransformation)
+            self.builder = PyramidBuilder(image, self._count)
+            self.builder.signals.level_ready.connect(self._on_level_ready)
+            QThreadPool.globalInstance().start(self.builder)
+
+    def level_count(self):
+        return self._count
+
+    def level_size(self, level):
+        return level_size(self.width, self.height, level)
+
+    def is_level_ready(self, level):
+        return level in self.levels
+
+    def stop(self):
+        if self.builder is not None:
+            self.builder.token.cancel()
+
+    def memory_bytes(self):
+        return sum(img.sizeInBytes() for level, img in self.levels.items() if level > 0)
+
+    def _on_level_ready(self, level, image):
+        self.levels[level] = image
+        self.updated.emit()
+
+    def tile(self, level, tx, ty):
+        return self.levels[level], QRectF(self.tile_rect(level, tx, ty))
+
+
+class RegionSignals(QObject):
+    tile_ready = pyqtSignal(object, QImage) # RegionTileTask, tile
+    overview_ready = pyqtSignal(QImage)
+
+
+class RegionTileTask(QRunnable):
+    def __init__(self, source, key, rect, window=None):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.source = source
+        self.key = key
+        self.rect = rect
+        self.window = window
+        self.token = CancelToken()
+        self.started = False
+
+    def run(self):
+        self.started = True
+        try:
+            qimg = self.source.read_qimage(self.key[0], self.rect, self.token, self.window)
+        except DecodeCancelled:
+            return
+        except Exception as e:
+            if not self.token.cancelled: # Else the reader was closed under it
+                print(f"Error reading tile {self.key}: {e}")
+            return
+        self.source.signals.tile_ready.emit(self, qimg)
+
+
+class RegionOverviewTask(QRunnable):
+    def __init__(self, source):
+        super().__init__()
+        self.source = source
+
+    def run(self):
+        src = self.source
+        try:
+            level = src.level_count() - 1
+            w, h = src.level_size(level)
+            # Kept, so display levels can be re-applied to the overview at once
+            src.overview_samples = src.reader.read_region(level, 0, 0, w, h, src.token)
+            # The range comes from the same read: for a file without a pyramid the
+            # coarsest level is a subsampled pass over the whole image
+            src.value_range = src.reader.value_range(src.overview_samples, src.token)
+            src.token.check()
+            qimg = array_to_qimage(src.overview_samples, src.value_range, src.token)
+        except DecodeCancelled:
+            return
+        except Exception as e:
+            if not src.token.cancelled:
+                print(f"Error reading overview: {e}")
+            return
+        src.signals.overview_ready.emit(qimg)
+
+
+# Tiles read on demand from a TiffRegionReader (memory-mapped or per segment),
+# so the full image never has to be resident. Display levels re-map the kept
+# overview at once and the visible tiles from the mapped file or segment cache.
+class RegionTileSource(TileSource):
+    def __init__(self, reader, levels=None, parent=None):
+        super().__init__(reader.width, reader.height, parent)
+        self.reader = reader
+        self.value_range = None
+        self.levels = levels # levels.Levels, or None for the default conversion
+        self.window = None # (low, high, gamma) the tiles are drawn with
+        self.overview_samples = None
+        self.token = CancelToken()
+        self._overview = None
+        self._stats = None
+        self._pending = {} # key -> RegionTileTask
+        self._stale = {} # key -> QPixmap drawn with the previous levels, until redrawn
+
+        self.signals = RegionSignals()
+        self.signals.tile_ready.connect(self._on_tile_ready)
+        self.signals.overview_ready.connect(self._on_overview_ready)
+
+        self.pool = region_pool()
+        # Above the tiles of panels already open: each new image gets its overview first
+        self.pool.start(RegionOverviewTask(self), 100)
+
+    def level_count(self):
+        return self.reader.level_count
+
+    def level_size(self, level):
+        return self.reader.level_size(level)
+
+    def is_level_ready(self, level):
+        # Tiles of every level can be read, but nothing is shown before the display range is known
+        return self._overview is not None
+
+    def overview(self):
+        return self._overview
+
+    def memory_bytes(self):
+        overview = 0
+        if self._overview is not None:
+            overview = self._overview.width() * self._overview.height() * 4
+        stale = sum(p.width() * p.height() * 4 for p in self._stale.values())
+        return self._tile_bytes + overview + stale
+
+    def read_qimage(self, level, rect, token, window=None):
+        data = self.reader.read_region(level, rect.x(), rect.y(), rect.x() + rect.width(),
+                                       rect.y() + rect.height(), token)
+        token.check()
+        return array_to_qimage(data, self.value_range, token, window)
+
+    def stats(self):
+        # Histogram of the overview; None until it has been read
+        if self._stats is None and self.overview_samples is not None:
+            self._stats = sample_stats(self.overview_samples)
+        return self._stats
+
+    def set_levels(self, levels):
+        self.levels = levels
+        window = levels.window(self.stats()) if levels is not None else None
+        if window == self.window:
+            return
+        self.window = window
+        # Tiles in flight are for the old levels; what is on screen stays until redrawn
+        self._cancel_pending()
+        if self._tiles:
+            self._stale = dict(self._tiles)
+        self._drop_tiles()
+        if self.overview_samples is not None:
+            self._overview = QPixmap.fromImage(array_to_qimage(self.overview_samples, self.value_range, window=window))
+        self.updated.emit()
+
+    def stop(self):
+        self.token.cancel()
+        self._cancel_pending()
+        self._drop_tiles()
+        self._stale = {}
+        # The source holds the reader from here on: its file and maps go with it
+        self.reader.close()
+
+    def _cancel_pending(self):
+        # Only this source's tasks: the pool is shared with the other panels
+        for task in self._pending.values():
+            task.token.cancel()
+            self.pool.tryTake(task)
+        self._pending.clear()
+
+    def prepare(self, visible):
+        # Queued tiles that scrolled out of view are dropped before they are read
+        for key in list(self._pending):
+            task = self._pending[key]
+            if key not in visible and not task.started and self.pool.tryTake(task):
+                del self._pending[key]
+
+    def tile(self, level, tx, ty):
+        key = (level, tx, ty)
+        tile = self._cached_tile(key)
+        if tile is None and key not in self._pending and self._overview is not None:
+            task = RegionTileTask(self, key, self.tile_rect(level, tx, ty), self.window)
+            self._pending[key] = task
+            # Coarse tiles first: they cover more of the view per read
+            self.pool.start(task, level)
+        if tile is None and key in self._stale:
+            pixmap = self._stale[key]
+            tile = pixmap, QRectF(pixmap.rect())
+        return tile
+
+    def _on_tile_ready(self, task, qimg):
+        # Results of cancelled tasks (e.g. drawn with old levels) are dropped
+        if self._pending.get(task.key) is not task:
+            return
+        del self._pending[task.key]
+        if self.token.cancelled or qimg.isNull():
+            return
+        self._stale.pop(task.key, None)
+        self._store_tile(task.key, QPixmap.fromImage(qimg))
+        self.updated.emit()
+
+    def _on_overview_ready(self, qimg):
+        if self.token.cancelled:
+            return
+        if self.levels is not None:
+            # The window may depend on the overview itself (auto contrast)
+            self.window = self.levels.window(self.stats())
+            qimg = array_to_qimage(self.overview_samples, self.value_range, window=self.window)
+        self._overview = QPixmap.fromImage(qimg)
+        self.updated.emit()
+
+
+# Graphics item drawing a very large image from a multi-resolution tile source.
+# Only tiles intersecting the exposed area are drawn, at the level that matches
+# the current zoom; missing tiles show the overview underneath until they arrive.
+class TiledImageItem(QGraphicsItem):
+    def __init__(self, source, parent=None):
+        super().__init__(parent)
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption, True)
+        self.source = source
+        self.source.updated.connect(self.update)
+        self.transformation_mode = Qt.TransformationMode.FastTransformation
+
+    def stop(self):
+        self.source.stop()
+
+    def boundingRect(self):
+        return QRectF(0, 0, self.source.width, self.source.height)
+
+    def setTransformationMode(self, mode):
+        self.transformation_mode = mode
+        self.update()
+
+    def _pick_level(self, lod):
+        # Coarsest level that still has at least as much detail as the screen needs
+        wanted = 0
+        for level in range(1, self.source.level_count()):
+            if self.source.level_size(level)[0] / self.source.width >= lod:
+                wanted = level
+            else:
+                break
+        # Prefer a coarser ready level (cheap) over a finer one while the pyramid builds
+        for level in range(wanted, self.source.level_count()):
+            if self.source.is_level_ready(level):
+                return level
+        for level in range(wanted - 1, -1, -1):
+            if self.source.is_level_ready(level):
+                return level
+        return None
+
+    def paint(self, painter, option, widget=None):
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform,
+                              self.transformation_mode == Qt.TransformationMode.SmoothTransformation)
+
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        level = self._pick_level(lod)
+        if level is None:
+            return
+        lw, lh = self.source.level_size(level)
+        sx = self.source.width / lw
+        sy = self.source.height / lh
+
+        tx0 = max(0, int(exposed.left() / sx) // TILE_SIZE)
+        ty0 = max(0, int(exposed.top() / sy) // TILE_SIZE)
+        tx1 = min((lw - 1) // TILE_SIZE, int(math.ceil(exposed.right() / sx)) // TILE_SIZE)
+        ty1 = min((lh - 1) // TILE_SIZE, int(math.ceil(exposed.bottom() / sy)) // TILE_SIZE)
+        keys = [(level, tx, ty) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+        self.source.prepare(set(keys))
+
+        tiles = [(key, self.source.tile(*key)) for key in keys]
+        overview = self.source.overview()
+        if overview is not None and any(tile is None for _, tile in tiles):
+            painter.drawPixmap(self.boundingRect(), overview, QRectF(overview.rect()))
+
+        for key, tile in tiles:
+            if tile is None:
+                continue
+            device, src_rect = tile
+            src = self.source.tile_rect(*key)
+            target = QRectF(src.x() * sx, src.y() * sy, src.width() * sx, src.height() * sy)
+            if isinstance(device, QImage):
+                painter.drawImage(target, device, src_rect)
+            else:
+                painter.drawPixmap(target, device, src_rect)
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import threading
+from collections import deque, OrderedDict
+
+# Optional timing spans around the stages of loading, scanning and filtering.
+# Spans are kept in memory and can be exported as a Chrome trace (chrome://tracing,
+# ui.perfetto.dev). While tracing is off, span() hands out one shared object that
+# does nothing, so instrumented code costs a function call and a flag check.
+# No Qt in here: spans can be recorded from any thread.
+
+# Events kept for export; the oldest are dropped first
+MAX_EVENTS = 200000
+
+# Files whose last load breakdown is kept for the HUD
+MAX_PATHS = 64
+
+_enabled = False
+_lock = threading.Lock()
+_events = deque(maxlen=MAX_EVENTS) # (name, category, start ns, duration ns, thread id, args)
+_threads = {} # thread id -> name
+_breakdowns = OrderedDict() # path -> OrderedDict(stage -> ms)
+_origin = time.perf_counter_ns()
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(on):
+    global _enabled
+    _enabled = bool(on)
+
+
+def now():
+    return time.perf_counter_ns()
+
+
+class _Span:
+    __slots__ = ('name', 'category', 'path', 'args', 'start')
+
+    def __init__(self, name, category, path, args):
+        self.name = name
+        self.category = category
+        self.path = path
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.start, time.perf_counter_ns() - self.start, self.category, self.path, self.args)
+        return False
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, category='load', path=None, **args):
+    # with span('decode', path=path): ... times the block when tracing is on.
+    # Spans with a path also make up that file's load breakdown.
+    if not _enabled:
+        return _NO_SPAN
+    return _Span(name, category, path, args)
+
+
+def record(name, start_ns, duration_ns, category='load', path=None, args=None):
+    # Records a span that has already ended (e.g. time spent queued)
+    if not _enabled:
+        return
+    thread = threading.current_thread()
+    if path is not None:
+        args = dict(args or {}, path=path)
+    with _lock:
+        _threads.setdefault(thread.ident, thread.name)
+        _events.append((name, category, start_ns, duration_ns, thread.ident, args or None))
+        if path is not None:
+            stages = _breakdowns.get(path)
+            if stages is None:
+                stages = _breakdowns[path] = OrderedDict()
+                while len(_breakdowns) > MAX_PATHS:
+                    _breakdowns.popitem(last=False)
+            else:
+                _breakdowns.move_to_end(path)
+            stages[name] = duration_ns / 1e6
+
+
+def begin(path):
+    # A new load of path starts: its previous breakdown no longer applies
+    if not _enabled:
+        return
+    with _lock:
+        _breakdowns.pop(path, None)
+
+
+def breakdown(path):
+    # [(stage, ms)] of the last load of path, in the order the stages ran
+    with _lock:
+        return list(_breakdowns.get(path, {}).items())
+
+
+def clear():
+    with _lock:
+        _events.clear()
+        _breakdowns.clear()
+
+
+def export_chrome_trace(file_path):
+    # Writes the recorded spans in the Trace Event Format; returns the number of spans
+    pid = os.getpid()
+    with _lock:
+        events = list(_events)
+        threads = dict(_threads)
+    trace = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+             for tid, name in threads.items()]
+    for name, category, start, duration, tid, args in events:
+        event = {'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                 'ts': (start - _origin) / 1000, 'dur': duration / 1000}
+        if args:
+            event['args'] = args
+        trace.append(event)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+    return len(events)
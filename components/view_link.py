@@ -0,0 +1,73 @@
+from PyQt6.QtCore import QObject, QTimer
+
+# Changes are passed on at most once per frame (ms)
+FRAME_MS = 16
+
+
+# Keeps the zoom and centre of several panels together. The shared state is
+# (zoom, cx, cy): screen pixels per image width and the view centre in
+# normalized image coordinates, so images of different sizes show the same
+# region. A wheel burst or drag on one panel updates the others once per frame.
+class ViewLink(QObject):
+    def __init__(self, panels, parent=None):
+        super().__init__(parent)
+        self.panels = []
+        self.enabled = False
+        self.state = None # None: every panel fits its image
+        self._source = None
+        self._connected = set() # id() of panels whose view_changed is hooked up
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FRAME_MS)
+        self._timer.timeout.connect(self._apply)
+        for panel in panels:
+            self.add_panel(panel)
+
+    def add_panel(self, panel):
+        self.panels.append(panel)
+        if id(panel) not in self._connected:
+            # Panels removed and added again stay connected once
+            self._connected.add(id(panel))
+            panel.view_changed.connect(lambda panel=panel: self._on_view_changed(panel))
+        panel.link = self if self.enabled else None
+
+    def remove_panel(self, panel):
+        self.panels.remove(panel)
+        panel.link = None
+        if self._source is panel:
+            self._source = None
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        self.state = None
+        for panel in self.panels:
+            panel.link = self if enabled else None
+        if enabled:
+            # Start from the view of the first panel that shows an image
+            for panel in self.panels:
+                if panel.view_state() is not None:
+                    self._on_view_changed(panel)
+                    break
+
+    def reset(self):
+        # Back to fitting each image
+        self.state = None
+        self._timer.stop()
+        for panel in self.panels:
+            panel.fit_to_view()
+
+    def _on_view_changed(self, panel):
+        if not self.enabled or panel not in self.panels:
+            return
+        state = panel.view_state()
+        if state is None:
+            return
+        self.state = state
+        self._source = panel
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def _apply(self):
+        for panel in self.panels:
+            if panel is not self._source and panel.isVisible():
+                panel.set_view_state(self.state)
@@ -1,16 +1,45 @@
 import sys
 import os
 import glob
-import re
-from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
+from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QPushButton, QLabel, QFileDialog, QSplitter,
-                             QToolButton, QMenu, QSizePolicy, QComboBox, QSpinBox, QLineEdit)
+                             QToolButton, QMenu, QSizePolicy, QComboBox, QSpinBox, QLineEdit,
+                             QSlider, QDoubleSpinBox)
 from PyQt6.QtGui import QAction, QActionGroup, QFontMetrics
-from PyQt6.QtCore import Qt, QSettings
+from PyQt6.QtCore import Qt, QSettings, QStandardPaths, QThreadPool, QTimer
 from components.image_panel import ImagePanel
-
-# Supported extensions
-IMG_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff'}
+from components.image_cache import shared_cache, DEFAULT_BUDGET_BYTES
+from components.decode_pool import shared_pool
+from components.process_decode import ProcessDecoder
+from components.prefetcher import Prefetcher, DEFAULT_DEPTH
+from components.folder_scanner import FolderScanner
+from components.folder_index import FolderIndex
+from components.folder_watcher import FolderWatcher
+from components.file_filter import FileFilter
+from components.filmstrip import Filmstrip
+from components.thumbnails import ThumbnailStore
+from components.compare import Comparer
+from components.pairing import PairGroup, compile_pair_key
+from components.view_link import ViewLink
+from components.levels import Levels
+from components.panel_source import PanelSource
+from components.frame_sync import FrameGate
+from components.archive_source import ARCHIVE_SUFFIXES, is_archive, set_index_directory
+from components import tracing
+
+# List changes arriving in a burst (e.g. while a folder streams in) rebuild the pairing once
+PAIR_REBUILD_MS = 100
+
+# Unmatched files listed per side in the menu
+UNMATCHED_MENU_ITEMS = 100
+
+# Steps of the window sliders over the sample range of the shown images
+LEVEL_SLIDER_STEPS = 1000
+
+# Panels shown side by side; each has its own folder, filter and position
+DEFAULT_PANELS = 2
+MAX_PANELS = 6
+SIDE_KEYS = "ABCDEF"
 
 class FocusClearLineEdit(QLineEdit):
     def keyPressEvent(self, event):
@@ -26,6 +55,73 @@ class FocusClearSpinBox(QSpinBox):
         else:
             super().keyPressEvent(event)
 
+# One panel with its file list (PanelSource), folder and filter controls,
+# filmstrip and pixel readout. All columns share the window's decode pool and cache.
+class SideColumn(QWidget):
+    def __init__(self, key, number, cache, pool, thumbnails, parent=None):
+        super().__init__(parent)
+        self.key = key
+        self.number = number
+        self.source = PanelSource(key)
+        self.file_filter = FileFilter(lambda: (self.source.all_files, self.source.files), self)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(2)
+
+        # Row 1: Load + Filter + Index
+        header = QHBoxLayout()
+        self.btn_load = QToolButton()
+        self.btn_load.setText(self.load_title())
+        self.btn_load.setPopupMode(QToolButton.ToolButtonPopupMode.MenuButtonPopup)
+        self.btn_load.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.btn_load.setStyleSheet("background-color: #333; padding: 5px; border-radius: 4px; color: white;")
+
+        self.txt_filter = FocusClearLineEdit()
+        self.txt_filter.setPlaceholderText("Filter (Regex)...")
+        self.txt_filter.setStyleSheet("background-color: #222; color: #ddd; border: 1px solid #444; border-radius: 3px; padding: 2px;")
+        self.txt_filter.setFixedWidth(150)
+        self.txt_filter.textChanged.connect(self.file_filter.set_pattern)
+
+        lbl_number = QLabel(f"{number}:")
+        lbl_number.setStyleSheet("font-weight: bold; color: #bbb; margin-left: 10px;")
+        self.spin_index = FocusClearSpinBox()
+        self.spin_index.setRange(1, 1)
+        self.spin_index.setFixedWidth(70)
+        self.spin_index.setStyleSheet("background-color: #333; color: white; padding: 5px;")
+        self.lbl_total = QLabel("/ 0")
+        self.lbl_total.setFixedWidth(50)
+
+        header.addWidget(self.btn_load)
+        header.addWidget(self.txt_filter)
+        header.addStretch()
+        header.addWidget(lbl_number)
+        header.addWidget(self.spin_index)
+        header.addWidget(self.lbl_total)
+
+        self.lbl_filename = QLabel("")
+        self.lbl_filename.setStyleSheet("color: #aaa; font-size: 11px;")
+        self.lbl_filename.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        self.panel = ImagePanel(cache=cache, pool=pool)
+        # Thumbnail strip under the panel; clicking one jumps there
+        self.filmstrip = Filmstrip(pool, thumbnails)
+        self.filmstrip.row_clicked.connect(lambda row: self.spin_index.setValue(row + 1))
+
+        # Pixel Info
+        self.lbl_info = QLabel("")
+        self.lbl_info.setStyleSheet("color: #0bd; font-family: monospace; font-size: 14px;")
+        self.panel.pixel_info_changed.connect(self.lbl_info.setText)
+
+        layout.addLayout(header)
+        layout.addWidget(self.lbl_filename)
+        layout.addWidget(self.panel, stretch=1)
+        layout.addWidget(self.filmstrip)
+        layout.addWidget(self.lbl_info)
+
+    def load_title(self):
+        return f"Load {self.number}"
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -39,15 +135,56 @@ class MainWindow(QMainWindow):
         if not isinstance(self.recent_folders, list):
             self.recent_folders = []
 
-        # State
-        self.folder_a = None
-        self.folder_b = None
-        self.all_files_a = [] # Complete list
-        self.all_files_b = [] # Complete list
-        self.files_a = [] # Filtered list
-        self.files_b = [] # Filtered list
-        self.current_index_a = 0
-        self.current_index_b = 0
+        # Decoded image cache shared by all panels (budget in MB, tunable per workstation)
+        self.cache = shared_cache()
+        budget_mb = self.settings.value("cache_budget_mb", DEFAULT_BUDGET_BYTES // (1024 * 1024), type=int)
+        self.cache.set_budget(budget_mb * 1024 * 1024)
+        self.pool = shared_pool(self.cache)
+        # Optional: decode whole TIFFs in worker processes (number of processes, 0 = threads only)
+        decode_processes = self.settings.value("decode_processes", 0, type=int)
+        if decode_processes > 0 and self.pool.processes is None:
+            self.pool.processes = ProcessDecoder(decode_processes)
+        self.prefetcher = Prefetcher(self.cache, self.pool, self.settings.value("prefetch_depth", DEFAULT_DEPTH, type=int), parent=self)
+        # Timing spans for the HUD and trace export; also switched on by the HUD (F3)
+        tracing.set_enabled(self.settings.value("trace_enabled", False, type=bool))
+
+        # State: the panels shown (columns beyond the panel count are kept hidden and empty)
+        self.columns = []
+        self.sides = []
+
+        # Folders are listed in the background and stream in batch by batch;
+        # listings of folders opened before are kept on disk
+        cache_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.GenericCacheLocation)
+        self.folder_index = FolderIndex(os.path.join(cache_dir, "ImageComparisonViewer", "folder_index.sqlite"))
+        # Thumbnails also persist; old ones are trimmed once per session, off the GUI thread
+        self.thumbnails = ThumbnailStore(os.path.join(cache_dir, "ImageComparisonViewer", "thumbnails"))
+        # ZIP/TAR archives open like folders; each is indexed once
+        set_index_directory(os.path.join(cache_dir, "ImageComparisonViewer", "archives"))
+        QThreadPool.globalInstance().start(self.thumbnails.prune)
+        self.scanner = FolderScanner(self.folder_index, self)
+        self.scanner.batch_found.connect(self.on_scan_batch)
+        self.scanner.finished.connect(self.on_scan_finished)
+
+        # Files written into (or deleted from) an open folder show up without a reload
+        self.watcher = FolderWatcher(self)
+        self.watcher.set_listing(lambda key: (self.column_by_key(key).source.all_files, self.scanner.is_scanning(key)))
+        self.watcher.files_changed.connect(self.on_files_changed)
+        self.watcher.failed.connect(self.on_watch_failed)
+
+        # Panels are paired by position, or by a key taken from the file names
+        # (every panel against the first one)
+        self.pair_by_name = False
+        self.pair_key = compile_pair_key("")
+        self.pairs = None # PairGroup of the current lists, built on demand
+        self._pair_timer = QTimer(self)
+        self._pair_timer.setSingleShot(True)
+        self._pair_timer.setInterval(PAIR_REBUILD_MS)
+        self._pair_timer.timeout.connect(self.rebuild_pairs)
+
+        # Difference view: metrics and a heatmap of the first two panels' images, per pair
+        self.comparer = Comparer(self.cache, self)
+        self.comparer.compared.connect(self.on_compared)
+        self.comparer.failed.connect(lambda error: self.lbl_metrics.setText(f"Compare failed: {error}"))
 
         # UI Components
         central_widget = QWidget()
@@ -56,157 +193,246 @@ class MainWindow(QMainWindow):
 
         # Top Control Bar
         control_bar = QHBoxLayout()
-        
-        # Left Controls
-        left_layout = QVBoxLayout()
-        left_layout.setSpacing(2)
-        
-        # Row 1: Load + Filter
-        left_row1 = QHBoxLayout()
-        self.btn_load_a = QToolButton()
-        self.btn_load_a.setText("Load Left")
-        self.btn_load_a.setPopupMode(QToolButton.ToolButtonPopupMode.MenuButtonPopup)
-        self.update_recent_menu(self.btn_load_a, 'A')
-        self.btn_load_a.clicked.connect(lambda: self.select_folder('A'))
-        self.btn_load_a.setFocusPolicy(Qt.FocusPolicy.NoFocus)
-        self.btn_load_a.setStyleSheet("background-color: #333; padding: 5px; border-radius: 4px; color: white;")
-        
-        self.txt_filter_a = FocusClearLineEdit()
-        self.txt_filter_a.setPlaceholderText("Filter (Regex)...")
-        self.txt_filter_a.setStyleSheet("background-color: #222; color: #ddd; border: 1px solid #444; border-radius: 3px; padding: 2px;")
-        self.txt_filter_a.setFixedWidth(150) 
-        self.txt_filter_a.textChanged.connect(lambda: self.apply_filter('A'))
-
-        left_row1.addWidget(self.btn_load_a)
-        left_row1.addWidget(self.txt_filter_a)
-
-        self.lbl_filename_a = QLabel("")
-        self.lbl_filename_a.setStyleSheet("color: #aaa; font-size: 11px;")
-        self.lbl_filename_a.setFixedWidth(250) 
-        self.lbl_filename_a.setAlignment(Qt.AlignmentFlag.AlignCenter)
-
-        left_layout.addLayout(left_row1)
-        left_layout.addWidget(self.lbl_filename_a)
-        
-        # Middle Controls
         middle_layout = QHBoxLayout()
-        
+
         # Interpolation
         self.combo_interp = QComboBox()
         self.combo_interp.addItems(["Nearest", "Bilinear"])
         self.combo_interp.setFocusPolicy(Qt.FocusPolicy.NoFocus)
         self.combo_interp.setStyleSheet("background-color: #333; color: white; padding: 5px;")
         self.combo_interp.currentTextChanged.connect(self.change_interpolation)
-        
-        # L Index
-        lbl_l = QLabel("L:")
-        lbl_l.setStyleSheet("font-weight: bold; color: #bbb;")
-        self.spin_index_a = FocusClearSpinBox()
-        self.spin_index_a.setRange(1, 1)
-        self.spin_index_a.setFixedWidth(70)
-        self.spin_index_a.setStyleSheet("background-color: #333; color: white; padding: 5px;")
-        self.spin_index_a.valueChanged.connect(lambda: self.jump_to_index('A'))
-        self.lbl_total_a = QLabel("/ 0")
-        self.lbl_total_a.setFixedWidth(50)
-
-        # R Index
-        lbl_r = QLabel("R:")
-        lbl_r.setStyleSheet("font-weight: bold; color: #bbb; margin-left: 10px;")
-        self.spin_index_b = FocusClearSpinBox()
-        self.spin_index_b.setRange(1, 1)
-        self.spin_index_b.setFixedWidth(70)
-        self.spin_index_b.setStyleSheet("background-color: #333; color: white; padding: 5px;")
-        self.spin_index_b.valueChanged.connect(lambda: self.jump_to_index('B'))
-        self.lbl_total_b = QLabel("/ 0")
-        self.lbl_total_b.setFixedWidth(50)
+
+        # Pixel probe neighbourhood
+        self.combo_probe = QComboBox()
+        self.combo_probe.addItems(["1x1", "3x3", "5x5", "9x9"])
+        self.combo_probe.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.combo_probe.setStyleSheet("background-color: #333; color: white; padding: 5px;")
+        self.combo_probe.currentTextChanged.connect(self.change_probe_size)
+
+        # Difference view toggle
+        self.btn_diff = QPushButton("Diff")
+        self.btn_diff.setCheckable(True)
+        self.btn_diff.setToolTip("Difference of the first two panels")
+        self.btn_diff.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.btn_diff.setStyleSheet("QPushButton { background-color: #333; color: white; padding: 5px; border-radius: 4px; }"
+                                    "QPushButton:checked { background-color: #3a5f8a; }")
+        self.btn_diff.toggled.connect(self.toggle_diff)
+
+        # Linked zoom/pan toggle
+        self.btn_link = QPushButton("Link")
+        self.btn_link.setCheckable(True)
+        self.btn_link.setToolTip("Zoom and pan all panels together (F: fit)")
+        self.btn_link.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.btn_link.setStyleSheet("QPushButton { background-color: #333; color: white; padding: 5px; border-radius: 4px; }"
+                                    "QPushButton:checked { background-color: #3a5f8a; }")
+
+        # Display levels bar toggle
+        self.btn_levels = QPushButton("Levels")
+        self.btn_levels.setCheckable(True)
+        self.btn_levels.setToolTip("Window/level, gamma and auto contrast")
+        self.btn_levels.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.btn_levels.setStyleSheet("QPushButton { background-color: #333; color: white; padding: 5px; border-radius: 4px; }"
+                                      "QPushButton:checked { background-color: #3a5f8a; }")
+
+        # Number of panels
+        self.spin_panels = FocusClearSpinBox()
+        self.spin_panels.setRange(2, MAX_PANELS)
+        self.spin_panels.setPrefix("Panels: ")
+        self.spin_panels.setFixedWidth(100)
+        self.spin_panels.setStyleSheet("background-color: #333; color: white; padding: 5px;")
+
+        # Pairing
+        self.combo_pairing = QComboBox()
+        self.combo_pairing.addItems(["Pair by Index", "Pair by Name"])
+        self.combo_pairing.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.combo_pairing.setStyleSheet("background-color: #333; color: white; padding: 5px;")
+        self.combo_pairing.currentIndexChanged.connect(self.change_pairing)
+
+        self.txt_pair_key = FocusClearLineEdit()
+        self.txt_pair_key.setPlaceholderText("Pair key (Regex)...")
+        self.txt_pair_key.setToolTip("Empty: name without extension. With a group, the first group is the key.")
+        self.txt_pair_key.setStyleSheet("background-color: #222; color: #ddd; border: 1px solid #444; border-radius: 3px; padding: 2px;")
+        self.txt_pair_key.setFixedWidth(130)
+        self.txt_pair_key.textChanged.connect(self.set_pair_key)
+        self.txt_pair_key.hide()
+
+        self.btn_unmatched = QToolButton()
+        self.btn_unmatched.setText("Unmatched")
+        self.btn_unmatched.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
+        self.btn_unmatched.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.btn_unmatched.setStyleSheet("background-color: #333; padding: 5px; border-radius: 4px; color: white;")
+        unmatched_menu = QMenu(self)
+        unmatched_menu.setStyleSheet("QMenu { background-color: #2b2b2b; color: white; } QMenu::item:selected { background-color: #444; }")
+        unmatched_menu.aboutToShow.connect(self.fill_unmatched_menu)
+        self.btn_unmatched.setMenu(unmatched_menu)
+        self.btn_unmatched.hide()
 
         middle_layout.addWidget(self.combo_interp)
+        middle_layout.addWidget(self.combo_probe)
+        middle_layout.addWidget(self.btn_diff)
+        middle_layout.addWidget(self.btn_link)
+        middle_layout.addWidget(self.btn_levels)
         middle_layout.addSpacing(20)
-        middle_layout.addWidget(lbl_l)
-        middle_layout.addWidget(self.spin_index_a)
-        middle_layout.addWidget(self.lbl_total_a)
-        middle_layout.addWidget(lbl_r)
-        middle_layout.addWidget(self.spin_index_b)
-        middle_layout.addWidget(self.lbl_total_b)
-
-        # Right Controls
-        right_layout = QVBoxLayout()
-        right_layout.setSpacing(2)
-        
-        # Row 1: Load + Filter
-        right_row1 = QHBoxLayout()
-        self.btn_load_b = QToolButton()
-        self.btn_load_b.setText("Load Right")
-        self.btn_load_b.setPopupMode(QToolButton.ToolButtonPopupMode.MenuButtonPopup)
-        self.update_recent_menu(self.btn_load_b, 'B')
-        self.btn_load_b.clicked.connect(lambda: self.select_folder('B'))
-        self.btn_load_b.setFocusPolicy(Qt.FocusPolicy.NoFocus)
-        self.btn_load_b.setStyleSheet("background-color: #333; padding: 5px; border-radius: 4px; color: white;")
-
-        self.txt_filter_b = FocusClearLineEdit()
-        self.txt_filter_b.setPlaceholderText("Filter (Regex)...")
-        self.txt_filter_b.setStyleSheet("background-color: #222; color: #ddd; border: 1px solid #444; border-radius: 3px; padding: 2px;")
-        self.txt_filter_b.setFixedWidth(150)
-        self.txt_filter_b.textChanged.connect(lambda: self.apply_filter('B'))
-
-        right_row1.addWidget(self.btn_load_b)
-        right_row1.addWidget(self.txt_filter_b)
-
-        self.lbl_filename_b = QLabel("")
-        self.lbl_filename_b.setStyleSheet("color: #aaa; font-size: 11px;")
-        self.lbl_filename_b.setFixedWidth(250)
-        self.lbl_filename_b.setAlignment(Qt.AlignmentFlag.AlignCenter)
-
-        right_layout.addLayout(right_row1)
-        right_layout.addWidget(self.lbl_filename_b)
-
-        # Add to Main Control Bar
-        control_bar.addLayout(left_layout)
+        middle_layout.addWidget(self.spin_panels)
+        middle_layout.addSpacing(20)
+        middle_layout.addWidget(self.combo_pairing)
+        middle_layout.addWidget(self.txt_pair_key)
+        middle_layout.addWidget(self.btn_unmatched)
+
         control_bar.addStretch()
         control_bar.addLayout(middle_layout)
         control_bar.addStretch()
-        control_bar.addLayout(right_layout)
 
         main_layout.addLayout(control_bar)
 
-        # Image Area
+        # Display levels: applied to the decoded samples, so nothing is decoded again
+        self.level_low = None # Window in sample values
+        self.level_high = None
+        self.levels_bar = QWidget()
+        levels_layout = QHBoxLayout(self.levels_bar)
+        levels_layout.setContentsMargins(0, 0, 0, 0)
+        self.combo_levels = QComboBox()
+        self.combo_levels.addItems(["As Decoded", "Auto Contrast", "Window"])
+        self.combo_levels.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.combo_levels.setStyleSheet("background-color: #333; color: white; padding: 5px;")
+        self.combo_levels.currentIndexChanged.connect(self.change_levels_mode)
+
+        self.slider_low = QSlider(Qt.Orientation.Horizontal)
+        self.slider_high = QSlider(Qt.Orientation.Horizontal)
+        for slider, value in ((self.slider_low, 0), (self.slider_high, LEVEL_SLIDER_STEPS)):
+            slider.setRange(0, LEVEL_SLIDER_STEPS)
+            slider.setValue(value)
+            slider.setFixedWidth(200)
+            slider.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+            slider.valueChanged.connect(self.move_level_slider)
+
+        self.spin_gamma = QDoubleSpinBox()
+        self.spin_gamma.setRange(0.1, 5.0)
+        self.spin_gamma.setSingleStep(0.1)
+        self.spin_gamma.setValue(1.0)
+        self.spin_gamma.setPrefix("Gamma ")
+        self.spin_gamma.setFocusPolicy(Qt.FocusPolicy.ClickFocus)
+        self.spin_gamma.setStyleSheet("background-color: #333; color: white; padding: 5px;")
+        self.spin_gamma.valueChanged.connect(self.apply_levels)
+
+        self.combo_levels_target = QComboBox()
+        self.combo_levels_target.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.combo_levels_target.setStyleSheet("background-color: #333; color: white; padding: 5px;")
+        self.combo_levels_target.currentIndexChanged.connect(self.sync_level_sliders)
+
+        self.lbl_levels = QLabel("")
+        self.lbl_levels.setStyleSheet("color: #aaa; font-family: monospace;")
+
+        levels_layout.addStretch()
+        levels_layout.addWidget(self.combo_levels)
+        levels_layout.addWidget(QLabel("Min"))
+        levels_layout.addWidget(self.slider_low)
+        levels_layout.addWidget(QLabel("Max"))
+        levels_layout.addWidget(self.slider_high)
+        levels_layout.addWidget(self.spin_gamma)
+        levels_layout.addWidget(self.combo_levels_target)
+        levels_layout.addWidget(self.lbl_levels)
+        levels_layout.addStretch()
+        self.levels_bar.hide()
+        self.btn_levels.toggled.connect(self.levels_bar.setVisible)
+        main_layout.addWidget(self.levels_bar)
+
+        # Image Area: one column per panel, then the difference heatmap (diff mode)
         self.splitter = QSplitter(Qt.Orientation.Horizontal)
-        self.panel_a = ImagePanel()
-        self.panel_b = ImagePanel()
-        self.panel_a.pixel_info_changed.connect(lambda info: self.lbl_info_a.setText(info))
-        self.panel_b.pixel_info_changed.connect(lambda info: self.lbl_info_b.setText(info))
-
-        self.splitter.addWidget(self.panel_a)
-        self.splitter.addWidget(self.panel_b)
-        self.splitter.setSizes([800, 800])
-        
+        self.panel_diff = ImagePanel(cache=self.cache, pool=self.pool)
+        self.panel_diff.hide()
+        self.splitter.addWidget(self.panel_diff)
+
+        # One zoom and centre for every panel, when linked
+        self.view_link = ViewLink([self.panel_diff], self)
+
         main_layout.addWidget(self.splitter, stretch=1)
 
-        # Info Bar (Pixel Info)
+        # Info Bar (Metrics)
         info_layout = QHBoxLayout()
-        self.lbl_info_a = QLabel("")
-        self.lbl_info_a.setStyleSheet("color: #0bd; font-family: monospace; font-size: 14px;")
-        self.lbl_info_a.setFixedWidth(400) 
-        
-        self.lbl_info_b = QLabel("")
-        self.lbl_info_b.setStyleSheet("color: #0bd; font-family: monospace; font-size: 14px;")
-        self.lbl_info_b.setAlignment(Qt.AlignmentFlag.AlignRight)
-        self.lbl_info_b.setFixedWidth(400) 
-        
-        info_layout.addWidget(self.lbl_info_a)
+        self.lbl_metrics = QLabel("")
+        self.lbl_metrics.setStyleSheet("color: #db0; font-family: monospace; font-size: 14px;")
+        self.lbl_metrics.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        info_layout.addStretch()
+        info_layout.addWidget(self.lbl_metrics)
         info_layout.addStretch()
-        info_layout.addWidget(self.lbl_info_b)
         main_layout.addLayout(info_layout)
 
         # Instructions
-        instruction_label = QLabel("Sync: Arrows | Left: A/D | Right: J/L | Zoom: Wheel | Pan: Drag | Right Click: Menu")
+        instruction_label = QLabel("Sync: Arrows | First: A/D | Last: J/L | Zoom: Wheel | Pan: Drag | Right Click: Menu | HUD: F3")
         instruction_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         instruction_label.setStyleSheet("color: #666; font-size: 12px; margin-top: 5px;")
         main_layout.addWidget(instruction_label)
-        
+
+        self.spin_panels.valueChanged.connect(self.set_panel_count)
+        self.spin_panels.setValue(max(2, min(MAX_PANELS, self.settings.value("panel_count", DEFAULT_PANELS, type=int))))
+        self.set_panel_count(self.spin_panels.value())
+        self.btn_link.toggled.connect(self.toggle_link)
+        self.btn_link.setChecked(self.settings.value("link_views", False, type=bool))
+
         # Ensure main window has focus at startup, preventing filters from stealing it
         self.setFocus()
 
+    def column_by_key(self, key):
+        for column in self.columns:
+            if column.key == key:
+                return column
+        return None
+
+    def add_column(self):
+        number = len(self.columns) + 1
+        side = SideColumn(SIDE_KEYS[number - 1], number, self.cache, self.pool, self.thumbnails)
+        self.update_recent_menu(side.btn_load, side)
+        side.btn_load.clicked.connect(lambda: self.select_folder(side))
+        side.file_filter.filtered.connect(lambda files: self.apply_filter(side, files))
+        side.spin_index.valueChanged.connect(lambda: self.jump_to_index(side))
+        # Hovering one panel also reads the others at the same coordinate
+        side.panel.hover_moved.connect(lambda x, y: self.show_pixel_elsewhere(side, x, y))
+        side.panel.image_changed.connect(self.update_compare)
+        side.panel.image_changed.connect(lambda: self.update_page_label(side))
+        side.panel.image_changed.connect(self.sync_level_sliders)
+        side.panel.set_interpolation_mode(self.combo_interp.currentText())
+        side.panel.set_probe_size(int(self.combo_probe.currentText().split('x')[0]))
+        side.panel.set_hud_visible(bool(self.columns) and self.columns[0].panel.hud.isVisible())
+        self.splitter.insertWidget(len(self.columns), side)
+        self.columns.append(side)
+        return side
+
+    def set_panel_count(self, count):
+        while len(self.columns) < count:
+            self.add_column()
+        for side in self.columns[count:]:
+            if side in self.sides:
+                # Hidden columns hold nothing: no folder, image or thumbnails
+                self.close_folder(side, update=False)
+                self.view_link.remove_panel(side.panel)
+                side.hide()
+        for side in self.columns[:count]:
+            if side not in self.sides:
+                self.view_link.add_panel(side.panel)
+                side.show()
+        self.sides = self.columns[:count]
+        self.settings.setValue("panel_count", count)
+
+        # The decode budget is one for all panels; display memory is shared out too
+        for side in self.sides:
+            side.filmstrip.share_memory(count)
+        diff = self.splitter.sizes()[-1] if self.panel_diff.isVisible() else 0
+        width = sum(self.splitter.sizes()) or self.width()
+        self.splitter.setSizes([(width - diff) // count] * count + [0] * (len(self.columns) - count) + [diff])
+
+        self.combo_levels_target.blockSignals(True)
+        target = self.combo_levels_target.currentIndex()
+        self.combo_levels_target.clear()
+        self.combo_levels_target.addItems(["All Panels"] + [f"Panel {side.number}" for side in self.sides])
+        self.combo_levels_target.setCurrentIndex(target if 0 <= target <= count else 0)
+        self.combo_levels_target.blockSignals(False)
+
+        self.pairs = None
+        if self.pair_by_name:
+            self.rebuild_pairs()
+        self.update_images()
+
     def elide_text(self, text, max_len=40):
         if len(text) <= max_len:
             return text
@@ -215,12 +441,16 @@ class MainWindow(QMainWindow):
     def update_recent_menu(self, button, side):
         menu = QMenu(self)
         menu.setStyleSheet("QMenu { background-color: #2b2b2b; color: white; } QMenu::item:selected { background-color: #444; }")
-        
+
         # Close Folder Option
         action_close = QAction("Close Folder", self)
         action_close.triggered.connect(lambda: self.close_folder(side))
         menu.addAction(action_close)
-        
+
+        action_archive = QAction("Open Archive...", self)
+        action_archive.triggered.connect(lambda: self.select_archive(side))
+        menu.addAction(action_archive)
+
         menu.addSeparator()
 
         if not self.recent_folders:
@@ -232,35 +462,28 @@ class MainWindow(QMainWindow):
             label_action.setEnabled(False)
             menu.addAction(label_action)
             menu.addSeparator()
-            
+
             for folder in self.recent_folders:
                 if os.path.exists(folder):
                     action = QAction(folder, self)
                     action.triggered.connect(lambda checked, f=folder: self.load_folder_path(side, f))
                     menu.addAction(action)
-        
+
         button.setMenu(menu)
 
-    def close_folder(self, side):
-        if side == 'A':
-            self.folder_a = None
-            self.all_files_a = []
-            self.files_a = []
-            self.current_index_a = 0
-            self.btn_load_a.setText("Load Left")
-            self.txt_filter_a.clear()
-            self.panel_a.load_image(None)
-            self.lbl_filename_a.setText("")
-        else:
-            self.folder_b = None
-            self.all_files_b = []
-            self.files_b = []
-            self.current_index_b = 0
-            self.btn_load_b.setText("Load Right")
-            self.txt_filter_b.clear()
-            self.panel_b.load_image(None)
-            self.lbl_filename_b.setText("")
-        self.update_images()
+    def close_folder(self, side, update=True):
+        self.scanner.cancel(side.key)
+        self.watcher.unwatch(side.key)
+        self.prefetcher.reset(side.key)
+        side.source.open(None)
+        side.btn_load.setText(side.load_title())
+        side.txt_filter.clear()
+        side.panel.load_image(None)
+        side.lbl_filename.setText("")
+        side.lbl_info.setText("")
+        self.refresh_lists(side)
+        if update:
+            self.update_images()
 
     def add_to_recent(self, folder):
         if folder in self.recent_folders:
@@ -268,183 +491,453 @@ class MainWindow(QMainWindow):
         self.recent_folders.insert(0, folder)
         self.recent_folders = self.recent_folders[:5]
         self.settings.setValue("recent_folders", self.recent_folders)
-        self.update_recent_menu(self.btn_load_a, 'A')
-        self.update_recent_menu(self.btn_load_b, 'B')
+        for side in self.columns:
+            self.update_recent_menu(side.btn_load, side)
 
     def select_folder(self, side):
-        folder = QFileDialog.getExistingDirectory(self, f"Select Folder {side}")
+        folder = QFileDialog.getExistingDirectory(self, f"Select Folder {side.number}")
         if folder:
             self.load_folder_path(side, folder)
 
+    def select_archive(self, side):
+        patterns = " ".join(f"*{suffix}" for suffix in ARCHIVE_SUFFIXES)
+        path, _ = QFileDialog.getOpenFileName(self, f"Select Archive {side.number}", "", f"Archives ({patterns})")
+        if path:
+            self.load_folder_path(side, path)
+
     def load_folder_path(self, side, folder):
         self.add_to_recent(folder)
-        if side == 'A':
-            self.folder_a = folder
-            self.all_files_a = self.get_image_files(folder)
-            self.apply_filter('A') # This will set self.files_a
-            self.btn_load_a.setText(os.path.basename(folder))
-        else:
-            self.folder_b = folder
-            self.all_files_b = self.get_image_files(folder)
-            self.apply_filter('B') # This will set self.files_b
-            self.btn_load_b.setText(os.path.basename(folder))
-        
-    def get_image_files(self, folder):
-        files = []
-        try:
-            for f in os.listdir(folder):
-                _, ext = os.path.splitext(f)
-                if ext.lower() in IMG_EXTENSIONS:
-                    files.append(os.path.join(folder, f))
-            files.sort()
-        except Exception as e:
-            print(f"Error reading folder {folder}: {e}")
-        return files
-
-    def apply_filter(self, side):
-        if side == 'A':
-            pattern = self.txt_filter_a.text()
-            source_files = self.all_files_a
+        side.source.open(folder)
+        side.btn_load.setText(os.path.basename(folder))
+        side.file_filter.reset()
+        # Cancels the scan of the previously opened folder, if still running
+        if is_archive(folder):
+            self.watcher.unwatch(side.key) # Archives are read as they were when opened
         else:
-            pattern = self.txt_filter_b.text()
-            source_files = self.all_files_b
-            
-        filtered = []
-        try:
-            for f in source_files:
-                filename = os.path.basename(f)
-                if not pattern or re.search(pattern, filename):
-                    filtered.append(f)
-        except re.error:
-            print(f"Invalid regex: {pattern}")
-            filtered = source_files 
-
-        if side == 'A':
-            self.files_a = filtered
-            self.current_index_a = 0
-        else:
-            self.files_b = filtered
-            self.current_index_b = 0
-            
+            self.watcher.watch(side.key, folder)
+        self.scanner.start(side.key, folder)
+        self.prefetcher.reset(side.key)
+        self.refresh_lists(side)
         self.update_images()
 
-    def update_images(self):
-        len_a = len(self.files_a)
-        len_b = len(self.files_b)
-        
-        # Update Status A
-        self.lbl_total_a.setText(f"/ {len_a}")
-        if len_a > 0:
-            self.spin_index_a.setMaximum(len_a)
-            self.spin_index_a.blockSignals(True)
-            self.spin_index_a.setValue(self.current_index_a + 1)
-            self.spin_index_a.blockSignals(False)
+    def on_scan_batch(self, key, paths):
+        side = self.column_by_key(key)
+        if side is None:
+            return
+        matched = side.file_filter.extend(paths)
+        shown = side.source.add_batch(paths, matched)
+        if not matched:
+            self.update_status()
+            return
+        self.refresh_lists(side)
+        if shown is None:
+            # First image of the folder: show it right away
+            self.update_images()
         else:
-            self.spin_index_a.setMaximum(1)
-            self.spin_index_a.setValue(0) # 0 to indicate empty
-        
-        # Update Status B
-        self.lbl_total_b.setText(f"/ {len_b}")
-        if len_b > 0:
-            self.spin_index_b.setMaximum(len_b)
-            self.spin_index_b.blockSignals(True)
-            self.spin_index_b.setValue(self.current_index_b + 1)
-            self.spin_index_b.blockSignals(False)
+            self.update_status()
+
+    def on_scan_finished(self, key, error):
+        if error:
+            side = self.column_by_key(key)
+            print(f"Error reading folder {side.source.folder if side else key}: {error}")
+        self.schedule_prefetch()
+
+    def on_watch_failed(self, key, error):
+        side = self.column_by_key(key)
+        print(f"Error reading folder {side.source.folder if side else key}: {error}")
+
+    def on_files_changed(self, key, added, removed):
+        side = self.column_by_key(key)
+        if side is None:
+            return
+        side.file_filter.discard(removed)
+        same = side.source.apply_changes(added, removed, side.file_filter.extend(added))
+        self.refresh_lists(side)
+        if same:
+            self.update_status()
+            self.schedule_prefetch()
         else:
-            self.spin_index_b.setMaximum(1)
-            self.spin_index_b.setValue(0)
-
-        # Update Image A
-        if self.current_index_a < len_a:
-            path_a = self.files_a[self.current_index_a]
-            self.panel_a.load_image(path_a)
-            self.lbl_filename_a.setText(self.elide_text(os.path.basename(path_a)))
+            self.update_images()
+
+    def apply_filter(self, side, files):
+        side.source.set_files(files)
+        self.prefetcher.reset(side.key)
+        self.refresh_lists(side)
+        self.update_status()
+        self.update_side(side)
+        self.schedule_prefetch()
+
+    def schedule_prefetch(self):
+        # Warm the cache for the next frames of every panel in the direction of travel
+        self.prefetcher.schedule([(side.key, side.source.files, side.source.index) for side in self.sides])
+
+    def update_status(self):
+        for side in self.sides:
+            count = len(side.source.files)
+            # Signals stay blocked while the range changes too: a shrinking maximum
+            # clamps the value, which would otherwise read as a jump
+            side.lbl_total.setText(f"/ {count}")
+            side.spin_index.blockSignals(True)
+            if count > 0:
+                side.spin_index.setMaximum(count)
+                side.spin_index.setValue(side.source.index + 1)
+            else:
+                side.spin_index.setMaximum(1)
+                side.spin_index.setValue(0) # 0 to indicate empty
+            side.spin_index.blockSignals(False)
+            side.filmstrip.set_current(side.source.index)
+
+    def refresh_lists(self, side):
+        side.filmstrip.set_files(side.source.files)
+        # Pairs refer to list positions; rebuilt once the burst of changes is over
+        self.pairs = None
+        if self.pair_by_name:
+            self._pair_timer.start()
+
+    def pair_group(self):
+        if self.pairs is None:
+            self.pairs = PairGroup([side.source.files for side in self.sides], self.pair_key)
+        return self.pairs
+
+    def change_pairing(self, index):
+        self.pair_by_name = index == 1
+        self.txt_pair_key.setVisible(self.pair_by_name)
+        self.btn_unmatched.setVisible(self.pair_by_name)
+        self.pairs = None
+        if self.pair_by_name:
+            self.rebuild_pairs()
         else:
-            self.panel_a.load_image(None)
-            self.lbl_filename_a.setText("")
-
-        # Update Image B
-        if self.current_index_b < len_b:
-            path_b = self.files_b[self.current_index_b]
-            self.panel_b.load_image(path_b)
-            self.lbl_filename_b.setText(self.elide_text(os.path.basename(path_b)))
+            self._pair_timer.stop()
+
+    def set_pair_key(self, pattern):
+        self.pair_key = compile_pair_key(pattern)
+        self.pairs = None
+        if self.pair_by_name:
+            self._pair_timer.start()
+
+    def rebuild_pairs(self):
+        self._pair_timer.stop()
+        if not self.pair_by_name:
+            return
+        pairs = self.pair_group()
+        counts = " / ".join(str(pairs.unmatched_count(i)) for i in range(len(self.sides)))
+        self.btn_unmatched.setText(f"Unmatched: {counts}")
+        # The other panels follow the reference one to its partners
+        if self.follow_partner(self.sides[pairs.ref]):
+            self.update_images()
+
+    def follow_partner(self, side):
+        # When pairing by name, moves the other panels to the partners of side's
+        # file. Returns True if any moved.
+        if not self.pair_by_name:
+            return False
+        pairs = self.pair_group()
+        reference = pairs.reference(self.sides.index(side), side.source.index)
+        members = pairs.members(reference) if reference is not None else None
+        if members is None:
+            return False
+        moved = False
+        for other, index in zip(self.sides, members):
+            # Panels with no files (index None) stay as they are
+            if other is not side and index is not None and other.source.index != index:
+                other.source.index = index
+                self.prefetcher.reset(other.key)
+                moved = True
+        return moved
+
+    def step_pair(self, direction):
+        indices = self.pair_group().step([side.source.index for side in self.sides], direction)
+        if indices is None:
+            return
+        for side, index in zip(self.sides, indices):
+            if index is None:
+                continue
+            side.source.index = index
+            self.prefetcher.note_step(side.key, direction)
+        self.update_images()
+
+    def fill_unmatched_menu(self):
+        menu = self.btn_unmatched.menu()
+        menu.clear()
+        pairs = self.pair_group()
+        for i, side in enumerate(self.sides):
+            count = pairs.unmatched_count(i)
+            header = QAction(f"Panel {side.number} only ({count}):", self)
+            header.setEnabled(False)
+            menu.addAction(header)
+            for index in pairs.unmatched(i, UNMATCHED_MENU_ITEMS):
+                action = QAction(os.path.basename(side.source.files[index]), self)
+                action.triggered.connect(lambda checked, s=side, n=index: self.show_index(s, n))
+                menu.addAction(action)
+            if count > UNMATCHED_MENU_ITEMS:
+                more = QAction(f"... and {count - UNMATCHED_MENU_ITEMS} more", self)
+                more.setEnabled(False)
+                menu.addAction(more)
+            menu.addSeparator()
+
+    def show_index(self, side, index):
+        side.spin_index.setValue(index + 1)
+
+    def update_side(self, side):
+        path = side.source.current()
+        if path is not None:
+            side.panel.load_image(path)
+            side.lbl_filename.setText(self.elide_text(os.path.basename(path)))
         else:
-            self.panel_b.load_image(None)
-            self.lbl_filename_b.setText("")
+            side.panel.load_image(None)
+            side.lbl_filename.setText("")
+
+    def update_page_label(self, side):
+        # File name plus the page shown, for multi-page files
+        panel = side.panel
+        if not panel.current_path:
+            return
+        text = self.elide_text(os.path.basename(panel.current_path))
+        if panel.page_count > 1:
+            text += f"  [{panel.current_page + 1}/{panel.page_count}]"
+        side.lbl_filename.setText(text)
+
+    def step_page(self, delta):
+        # All panels move through the pages of their multi-page files together
+        for side in self.sides:
+            if side.panel.page_count > 1:
+                side.panel.show_page(side.panel.current_page + delta)
+
+    def update_images(self):
+        self.update_status()
+        # Every panel's visible load is queued before any prefetch, and the frames
+        # are shown together once all are decoded
+        gate = FrameGate([side.panel for side in self.sides])
+        previous = {side.panel.frame_gate for side in self.sides} - {None}
+        for side in self.sides:
+            side.panel.frame_gate = gate
+            self.update_side(side)
+        # Frames still held at the old gates are stale now: releasing them lets
+        # them bail out (and close any region reader they hold)
+        for old in previous:
+            old.release()
+
+        # Warm the cache for the next frames in the direction of travel
+        self.schedule_prefetch()
 
     def jump_to_index(self, side):
-        changed = False
-        if side == 'A':
-            val = self.spin_index_a.value() - 1
-            if val >= 0 and val < len(self.files_a):
-                self.current_index_a = val
-                changed = True
-        else:
-            val = self.spin_index_b.value() - 1
-            if val >= 0 and val < len(self.files_b):
-                self.current_index_b = val
-                changed = True
-        
-        if changed:
+        if side.source.jump(side.spin_index.value() - 1):
+            # A jump invalidates the guessed direction and any queued prefetch
+            self.prefetcher.reset(side.key)
+            self.follow_partner(side)
             self.update_images()
-        
+
         # We don't need to clear focus here anymore since valueChanged works while typing
         # and we want to keep typing. If we clear focus, it disrupts typing.
         # self.setFocus() # Removed to keep focus in spinbox
 
+    def show_pixel_elsewhere(self, side, x, y):
+        for other in self.sides:
+            if other is not side:
+                other.lbl_info.setText(other.panel.describe_pixel(x, y))
+
+    def toggle_link(self, checked):
+        self.view_link.set_enabled(checked)
+        self.settings.setValue("link_views", checked)
+
+    def fit_views(self):
+        if self.view_link.enabled:
+            self.view_link.reset()
+        else:
+            for side in self.sides:
+                side.panel.fit_to_view()
+            self.panel_diff.fit_to_view()
+
+    def toggle_diff(self, checked):
+        self.panel_diff.setVisible(checked)
+        sizes = self.splitter.sizes()
+        count = len(self.sides)
+        share = sum(sizes) // (count + 1 if checked else count)
+        self.splitter.setSizes([share] * count + [0] * (len(self.columns) - count)
+                               + [sum(sizes) - share * count if checked else 0])
+        if checked:
+            self.update_compare()
+        else:
+            self.comparer.cancel()
+            self.panel_diff.load_image(None)
+            self.lbl_metrics.setText("")
+
+    def update_compare(self):
+        if not self.btn_diff.isChecked():
+            return
+        # Runs again once both panels have finished loading
+        self.lbl_metrics.setText("")
+        self.comparer.request(self.sides[0].panel, self.sides[1].panel)
+
+    def on_compared(self, result, heat):
+        if not self.btn_diff.isChecked():
+            return
+        self.panel_diff.set_image(heat)
+        psnr = "inf" if result.mse == 0 else f"{result.psnr:.2f}"
+        self.lbl_metrics.setText(f"PSNR {psnr} dB | SSIM {result.ssim:.4f} | Max {result.max_error:g} | MSE {result.mse:.4g}")
+
+    def levels_panels(self):
+        target = self.combo_levels_target.currentIndex()
+        if 1 <= target <= len(self.sides):
+            return [self.sides[target - 1].panel]
+        return [side.panel for side in self.sides]
+
+    def levels_stats(self):
+        return [s for s in (panel.level_stats() for panel in self.levels_panels()) if s is not None]
+
+    def levels_range(self):
+        # Sample range the window sliders span: that of the images they apply to
+        stats = self.levels_stats()
+        if not stats:
+            return None
+        lo, hi = min(s.lo for s in stats), max(s.hi for s in stats)
+        return (lo, hi) if hi > lo else (lo, lo + 1)
+
+    def change_levels_mode(self, mode):
+        if mode == 2 and self.level_low is None:
+            # Start the window from what auto contrast shows now, widened to cover
+            # every image it applies to (the ones the slider range is taken from)
+            windows = [Levels().window(stats) for stats in self.levels_stats()]
+            if windows:
+                self.level_low = min(w[0] for w in windows)
+                self.level_high = max(w[1] for w in windows)
+            else:
+                self.level_low, self.level_high = 0, 1
+            self.sync_level_sliders()
+        self.apply_levels()
+
+    def move_level_slider(self):
+        value_range = self.levels_range()
+        if value_range is None:
+            return
+        lo, hi = value_range
+        # The dragged slider pushes the other one along, so low never passes high
+        if self.slider_low.value() > self.slider_high.value():
+            other, value = ((self.slider_high, self.slider_low.value()) if self.sender() is self.slider_low
+                            else (self.slider_low, self.slider_high.value()))
+            other.blockSignals(True)
+            other.setValue(value)
+            other.blockSignals(False)
+        self.level_low = lo + (hi - lo) * self.slider_low.value() / LEVEL_SLIDER_STEPS
+        self.level_high = lo + (hi - lo) * self.slider_high.value() / LEVEL_SLIDER_STEPS
+        if self.combo_levels.currentIndex() != 2:
+            self.combo_levels.blockSignals(True)
+            self.combo_levels.setCurrentIndex(2)
+            self.combo_levels.blockSignals(False)
+        self.apply_levels()
+
+    def sync_level_sliders(self):
+        # Slider positions of the window over the range of the images now shown
+        value_range = self.levels_range()
+        if value_range is None or self.level_low is None:
+            return
+        lo, hi = value_range
+        self.level_low = min(self.level_low, self.level_high)
+        for slider, value in ((self.slider_low, self.level_low), (self.slider_high, self.level_high)):
+            slider.blockSignals(True)
+            slider.setValue(round(max(0.0, min(1.0, (value - lo) / (hi - lo))) * LEVEL_SLIDER_STEPS))
+            slider.blockSignals(False)
+
+    def apply_levels(self):
+        mode = self.combo_levels.currentIndex()
+        gamma = self.spin_gamma.value()
+        if mode == 0:
+            levels = None
+        elif mode == 1 or self.level_low is None:
+            levels = Levels(gamma=gamma)
+        else:
+            levels = Levels(self.level_low, self.level_high, gamma)
+        for panel in self.levels_panels():
+            panel.set_levels(levels)
+        if levels is None:
+            self.lbl_levels.setText("")
+        elif levels.auto:
+            self.lbl_levels.setText(f"auto, gamma {gamma:.2f}")
+        else:
+            self.lbl_levels.setText(f"{levels.low:.4g} .. {levels.high:.4g}")
+
     def change_interpolation(self, text):
-        self.panel_a.set_interpolation_mode(text)
-        self.panel_b.set_interpolation_mode(text)
+        for side in self.columns:
+            side.panel.set_interpolation_mode(text)
+        self.panel_diff.set_interpolation_mode(text)
+
+    def change_probe_size(self, text):
+        size = int(text.split('x')[0])
+        for side in self.columns:
+            side.panel.set_probe_size(size)
+
+    def step_side(self, side, delta):
+        if side.source.step(delta):
+            self.prefetcher.note_step(side.key, delta)
+            self.update_images()
 
     def keyPressEvent(self, event):
         key = event.key()
-        len_a = len(self.files_a)
-        len_b = len(self.files_b)
-        
-        # Sync Navigation
-        if key == Qt.Key.Key_Right:
-            changed = False
-            if self.current_index_a < len_a - 1:
-                self.current_index_a += 1
-                changed = True
-            if self.current_index_b < len_b - 1:
-                self.current_index_b += 1
-                changed = True
-            if changed: self.update_images()
-                
-        elif key == Qt.Key.Key_Left:
+
+        # Sync Navigation (by name: from pair to pair)
+        if key in (Qt.Key.Key_Right, Qt.Key.Key_Left) and self.pair_by_name:
+            self.step_pair(1 if key == Qt.Key.Key_Right else -1)
+
+        elif key in (Qt.Key.Key_Right, Qt.Key.Key_Left):
+            delta = 1 if key == Qt.Key.Key_Right else -1
             changed = False
-            if self.current_index_a > 0:
-                self.current_index_a -= 1
-                changed = True
-            if self.current_index_b > 0:
-                self.current_index_b -= 1
-                changed = True
+            for side in self.sides:
+                if side.source.step(delta):
+                    self.prefetcher.note_step(side.key, delta)
+                    changed = True
             if changed: self.update_images()
 
-        # Independent Left (A/D)
+        # Independent first panel (A/D)
         elif key == Qt.Key.Key_D:
-            if self.current_index_a < len_a - 1:
-                self.current_index_a += 1
-                self.update_images()
+            self.step_side(self.sides[0], 1)
         elif key == Qt.Key.Key_A:
-            if self.current_index_a > 0:
-                self.current_index_a -= 1
-                self.update_images()
+            self.step_side(self.sides[0], -1)
 
-        # Independent Right (J/L)
+        # Independent last panel (J/L)
         elif key == Qt.Key.Key_L:
-            if self.current_index_b < len_b - 1:
-                self.current_index_b += 1
-                self.update_images()
+            self.step_side(self.sides[-1], 1)
         elif key == Qt.Key.Key_J:
-            if self.current_index_b > 0:
-                self.current_index_b -= 1
-                self.update_images()
-                
+            self.step_side(self.sides[-1], -1)
+
+        elif key == Qt.Key.Key_F:
+            self.fit_views()
+
+        # Pages of multi-page TIFFs (z-stacks)
+        elif key in (Qt.Key.Key_PageDown, Qt.Key.Key_PageUp):
+            step = 1 if key == Qt.Key.Key_PageDown else -1
+            if event.modifiers() & Qt.KeyboardModifier.ShiftModifier:
+                step *= 10
+            self.step_page(step)
+
+        # Performance HUD / trace export
+        elif key == Qt.Key.Key_F3:
+            if event.modifiers() & Qt.KeyboardModifier.ShiftModifier:
+                self.export_trace()
+            else:
+                self.toggle_hud()
+
         else:
             super().keyPressEvent(event)
 
+    def toggle_hud(self):
+        visible = not self.sides[0].panel.hud.isVisible()
+        if visible:
+            tracing.set_enabled(True)
+        for side in self.columns:
+            side.panel.set_hud_visible(visible)
+
+    def export_trace(self):
+        if not tracing.enabled():
+            print("Tracing is off: press F3 (or set trace_enabled) before reproducing the slowdown")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Export Trace", "trace.json", "Chrome Trace (*.json)")
+        if path:
+            try:
+                count = tracing.export_chrome_trace(path)
+                print(f"Wrote {count} spans to {path}")
+            except OSError as e:
+                print(f"Error writing trace {path}: {e}")
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MainWindow()
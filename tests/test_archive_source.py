@@ -0,0 +1,163 @@
+import io
+import os
+import tarfile
+import zipfile
+import pytest
+from components import archive_source
+from components.archive_source import (Archive, disk_path, is_archive, is_member, list_archive, member_path,
+                                       open_archive, open_member, read_member, split_member)
+
+PAYLOADS = {'b.png': bytes(range(256)) * 40, 'a.tif': b'II*\x00' + b'\x07' * 3000, 'sub/c.jpg': b'\xff\xd8' * 700}
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(tmp_path):
+    archive_source.set_index_directory(None)
+    yield
+    archive_source.set_index_directory(None)
+    with archive_source._archives_lock:
+        for archive in archive_source._archives.values():
+            archive.close()
+        archive_source._archives.clear()
+
+
+def make_zip(path, compression):
+    with zipfile.ZipFile(path, 'w', compression) as zf:
+        for name, data in PAYLOADS.items():
+            zf.writestr(name, data)
+        zf.writestr('notes.txt', b'not an image')
+        zf.writestr('dir/', b'')
+    return str(path)
+
+
+def make_tar(path, mode):
+    with tarfile.open(path, mode) as tf:
+        for name, data in list(PAYLOADS.items()) + [('notes.txt', b'not an image')]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    return str(path)
+
+
+def test_member_paths(tmp_path):
+    path = make_zip(tmp_path / 'set.zip', zipfile.ZIP_STORED)
+    member = member_path(path, 'sub/c.jpg')
+    assert split_member(member) == (path, 'sub/c.jpg')
+    assert is_member(member) and disk_path(member) == path
+    assert split_member(path) is None and disk_path(path) == path
+    assert is_archive('x/Y.TAR.GZ') and is_archive('a.tgz') and not is_archive('a.gz')
+
+
+def test_directory_named_like_an_archive_is_not_one(tmp_path):
+    folder = tmp_path / 'photos.zip'
+    folder.mkdir()
+    (folder / 'a.png').write_bytes(b'x')
+    assert split_member(str(folder / 'a.png')) is None
+    assert disk_path(str(folder / 'a.png')) == str(folder / 'a.png')
+
+
+@pytest.mark.parametrize('compression', [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED, zipfile.ZIP_BZIP2])
+def test_zip_members(tmp_path, compression):
+    path = make_zip(tmp_path / 'set.zip', compression)
+    archive = Archive.build(path)
+    assert archive.kind == 'zip'
+    assert archive.names() == ['a.tif', 'b.png', 'sub/c.jpg'] # Images only
+    for name, data in PAYLOADS.items():
+        assert archive.read(name) == data
+        with archive.open(name) as f:
+            assert f.read() == data
+    with pytest.raises(FileNotFoundError):
+        archive.read('notes.txt')
+
+
+def test_stored_zip_member_is_a_seekable_window(tmp_path):
+    path = make_zip(tmp_path / 'set.zip', zipfile.ZIP_STORED)
+    data = PAYLOADS['b.png']
+    f = Archive.build(path).open('b.png')
+    assert isinstance(f, io.BufferedReader)
+    f.seek(1000)
+    assert f.read(10) == data[1000:1010]
+    f.seek(-5, io.SEEK_END)
+    assert f.read() == data[-5:]
+    f.seek(0)
+    assert f.read(3) == data[:3]
+    f.close()
+
+
+def test_deflated_zip_member_is_read_into_memory(tmp_path):
+    path = make_zip(tmp_path / 'set.zip', zipfile.ZIP_DEFLATED)
+    f = Archive.build(path).open('b.png')
+    assert isinstance(f, io.BytesIO) and f.getvalue() == PAYLOADS['b.png']
+
+
+@pytest.mark.parametrize('name,mode', [('set.tar', 'w'), ('set.tar.gz', 'w:gz'), ('set.tbz2', 'w:bz2'),
+                                       ('set.tar.xz', 'w:xz')])
+def test_tar_members(tmp_path, name, mode):
+    path = make_tar(tmp_path / name, mode)
+    archive = Archive.build(path)
+    assert archive.kind == 'tar'
+    assert archive.seekable == (mode == 'w')
+    assert archive.names() == ['a.tif', 'b.png', 'sub/c.jpg']
+    # Out of order, so a compressed stream has to start over
+    for member in ['sub/c.jpg', 'a.tif', 'b.png', 'a.tif']:
+        assert archive.read(member) == PAYLOADS[member]
+        with archive.open(member) as f:
+            assert f.read() == PAYLOADS[member]
+    archive.close()
+
+
+def test_member_functions(tmp_path):
+    path = make_tar(tmp_path / 'set.tar.gz', 'w:gz')
+    members = list_archive(path)
+    assert members == [member_path(path, n) for n in ['a.tif', 'b.png', 'sub/c.jpg']]
+    assert read_member(members[1]) == PAYLOADS['b.png']
+    with open_member(members[2]) as f:
+        assert f.read() == PAYLOADS['sub/c.jpg']
+    assert archive_source.file_source(members[0]).read() == PAYLOADS['a.tif']
+    assert archive_source.file_source(path) == path
+
+
+def test_index_is_stored_and_reused(tmp_path, monkeypatch):
+    index_dir = tmp_path / 'index'
+    archive_source.set_index_directory(str(index_dir))
+    path = make_zip(tmp_path / 'set.zip', zipfile.ZIP_DEFLATED)
+    assert open_archive(path) is open_archive(path)
+    assert len(os.listdir(index_dir)) == 1
+    archive_source._archives.clear()
+
+    def no_build(*args, **kwargs):
+        raise AssertionError("archive indexed again")
+    monkeypatch.setattr(Archive, 'build', no_build)
+    archive = open_archive(path)
+    assert archive.names() == ['a.tif', 'b.png', 'sub/c.jpg']
+    assert archive.read('b.png') == PAYLOADS['b.png']
+
+
+def test_rewritten_archive_is_indexed_again(tmp_path):
+    archive_source.set_index_directory(str(tmp_path / 'index'))
+    path = make_zip(tmp_path / 'set.zip', zipfile.ZIP_STORED)
+    first = open_archive(path)
+    with zipfile.ZipFile(path, 'w') as zf:
+        zf.writestr('z.png', b'new')
+    os.utime(path, ns=(0, 0)) # A different mtime, whatever the file system resolution
+    assert open_archive(path) is not first
+    assert list_archive(path) == [member_path(path, 'z.png')]
+
+
+def test_open_archives_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_source, 'MAX_OPEN_ARCHIVES', 2)
+    paths = [make_zip(tmp_path / f"s{i}.zip", zipfile.ZIP_STORED) for i in range(3)]
+    for path in paths:
+        open_archive(path)
+    assert [key[0] for key in archive_source._archives] == [os.path.normcase(os.path.abspath(p)) for p in paths[1:]]
+
+
+def test_cache_key_of_a_member_follows_its_archive(tmp_path):
+    image_cache = pytest.importorskip('components.image_cache')
+    path = make_zip(tmp_path / 'set.zip', zipfile.ZIP_STORED)
+    st = os.stat(path)
+    key_a = image_cache.cache_key(member_path(path, 'a.tif'))
+    key_b = image_cache.cache_key(member_path(path, 'b.png'))
+    assert key_a[1:] == key_b[1:] == (st.st_mtime_ns, st.st_size)
+    assert key_a != key_b
+    assert image_cache.cache_key(str(tmp_path / 'missing.zip' / 'a.tif')) is None
@@ -0,0 +1,65 @@
+import io
+import json
+import numpy as np
+import pytest
+tifffile = pytest.importorskip('tifffile')
+pytest.importorskip('PyQt6.QtGui')
+import batch_compare
+
+
+@pytest.fixture
+def folders(tmp_path):
+    rng = np.random.default_rng(17)
+    a, b = tmp_path / 'a', tmp_path / 'b'
+    a.mkdir()
+    b.mkdir()
+    for i in range(3):
+        image = rng.integers(0, 65536, (40, 30), dtype=np.uint16)
+        tifffile.imwrite(str(a / f"f{i}.tif"), image)
+        other = image.copy()
+        other[0, 0] ^= 0x100 * i # Pair i differs in one sample, by 256 * i
+        tifffile.imwrite(str(b / f"f{i}.tif"), other)
+    (a / 'skip.txt').write_text('not an image')
+    return a, b
+
+
+def test_list_side_lists_and_filters_like_the_viewer(folders):
+    a, _ = folders
+    assert [p.rsplit('/', 1)[-1] for p in batch_compare.list_side(str(a), '')] == ['f0.tif', 'f1.tif', 'f2.tif']
+    assert [p.rsplit('/', 1)[-1] for p in batch_compare.list_side(str(a), '[12]')] == ['f1.tif', 'f2.tif']
+
+
+def test_compare_pair(folders):
+    a, b = folders
+    same = batch_compare.compare_pair(0, str(a / 'f0.tif'), str(b / 'f0.tif'))
+    assert same['mse'] == 0 and same['width'] == 30 and same['height'] == 40
+    differs = batch_compare.compare_pair(2, str(a / 'f2.tif'), str(b / 'f2.tif'))
+    assert differs['max_error'] == 512 and 'error' not in differs
+
+
+def test_compare_pair_reports_errors(folders):
+    a, _ = folders
+    row = batch_compare.compare_pair(5, str(a / 'f0.tif'), str(a / 'skip.txt'))
+    assert row['index'] == 5 and row['error']
+
+
+def test_json_lines_have_no_infinite_values():
+    stream = io.StringIO()
+    batch_compare._JsonLinesWriter(stream).write({'index': 0, 'psnr': float('inf'), 'mse': 0.0})
+    assert json.loads(stream.getvalue()) == {'index': 0, 'psnr': None, 'mse': 0.0}
+
+
+def test_run_writes_rows_in_pair_order(folders):
+    a, b = folders
+    pairs = [(i, str(a / f"f{i}.tif"), str(b / f"f{i}.tif")) for i in range(3)]
+    pairs.append((3, str(a / 'f0.tif'), str(a / 'skip.txt')))
+    rows = []
+
+    class Collect:
+        def write(self, row):
+            rows.append(row)
+
+    failed = batch_compare.run(iter(pairs), Collect(), workers=2, flush=lambda: None)
+    assert failed == 1
+    assert [row['index'] for row in rows] == [0, 1, 2, 3]
+    assert [row['max_error'] for row in rows[:3]] == [0, 256, 512]
@@ -0,0 +1,162 @@
+import threading
+import pytest
+QtCore = pytest.importorskip('PyQt6.QtCore')
+from components.decode_pool import DecodePool
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+@pytest.fixture
+def pool(app):
+    pool = DecodePool(max_threads=1)
+    yield pool
+    pool.clear()
+    pool.wait()
+
+
+def finish(app, pool):
+    # Runs every job and delivers their results
+    assert pool.wait(5000)
+    app.processEvents()
+
+
+class Blocker:
+    # A decode that holds the only worker until released
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, path, token):
+        self.started.set()
+        self.release.wait(5)
+        return path
+
+
+def recorder(order):
+    def decode(path, token):
+        order.append(path)
+        return path.upper()
+    return decode
+
+
+def test_higher_priority_runs_first(app, pool):
+    blocker = Blocker()
+    order = []
+    pool.submit('block', 'k0', 5, decode=blocker)
+    assert blocker.started.wait(5)
+    for path, priority in (('low', 0), ('high', 2), ('mid', 1)):
+        pool.submit(path, path, priority, decode=recorder(order))
+    blocker.release.set()
+    finish(app, pool)
+    assert order == ['high', 'mid', 'low']
+
+
+def test_a_more_urgent_request_bumps_a_queued_job(app, pool):
+    blocker = Blocker()
+    order = []
+    pool.submit('block', 'k0', 5, decode=blocker)
+    assert blocker.started.wait(5)
+    pool.submit('a', 'a', 0, decode=recorder(order))
+    pool.submit('b', 'b', 1, decode=recorder(order))
+    pool.submit('a', 'a', 2, decode=recorder(order))
+    blocker.release.set()
+    finish(app, pool)
+    assert order == ['a', 'b']
+
+
+def test_identical_requests_share_one_job(app, pool):
+    blocker = Blocker()
+    order, results = [], []
+    pool.submit('block', 'k0', 5, decode=blocker)
+    assert blocker.started.wait(5)
+    first = pool.submit('a', 'a', 1, callback=lambda *args: results.append(args), decode=recorder(order))
+    second = pool.submit('a', 'a', 1, callback=lambda *args: results.append(args), decode=recorder(order))
+    assert first.job is second.job
+    blocker.release.set()
+    finish(app, pool)
+    assert order == ['a']
+    assert results == [('a', 'A', None), ('a', 'A', None)]
+
+
+def test_cancelled_queued_job_never_runs(app, pool):
+    blocker = Blocker()
+    order, results = [], []
+    pool.submit('block', 'k0', 5, decode=blocker)
+    assert blocker.started.wait(5)
+    request = pool.submit('a', 'a', 1, callback=lambda *args: results.append(args), decode=recorder(order))
+    request.cancel()
+    assert request.cancelled and 'a' not in pool._jobs
+    blocker.release.set()
+    finish(app, pool)
+    assert order == [] and results == []
+
+
+def test_job_runs_while_one_request_still_waits(app, pool):
+    blocker = Blocker()
+    results = []
+    pool.submit('block', 'k0', 5, decode=blocker)
+    assert blocker.started.wait(5)
+    first = pool.submit('a', 'a', 1, callback=lambda *args: results.append('first'), decode=recorder([]))
+    pool.submit('a', 'a', 1, callback=lambda *args: results.append('second'), decode=recorder([]))
+    first.cancel()
+    assert not first.job.token.cancelled
+    blocker.release.set()
+    finish(app, pool)
+    assert results == ['second']
+
+
+def test_running_job_is_cancelled_cooperatively(app, pool):
+    started = threading.Event()
+    errors = []
+
+    def slow(path, token):
+        started.set()
+        while True:
+            token.check()
+
+    request = pool.submit('a', 'a', 1, callback=lambda path, result, error: errors.append(error), decode=slow)
+    assert started.wait(5)
+    request.cancel()
+    finish(app, pool)
+    assert errors == [] # Nobody is told about a cancelled job
+    assert 'a' not in pool._jobs
+
+
+def test_owner_is_capped_to_its_jobs_in_flight(app, pool):
+    blocker = Blocker()
+    owner = object()
+    pool.submit('block', 'k0', 5, decode=blocker)
+    assert blocker.started.wait(5)
+    requests = [pool.submit(p, p, 1, owner=owner, decode=recorder([])) for p in 'abc']
+    assert [r.cancelled for r in requests] == [True, False, False] # The oldest gives way
+    assert pool.in_flight(owner) == 2
+    request = pool.submit('d', 'd', 1, owner=owner, limit=3, decode=recorder([]))
+    assert pool.in_flight(owner) == 3 and not request.cancelled
+    pool.cancel_owner(owner)
+    assert pool.in_flight(owner) == 0
+    blocker.release.set()
+    finish(app, pool)
+
+
+def test_errors_reach_the_callback(app, pool):
+    results = []
+
+    def broken(path, token):
+        raise ValueError("bad file")
+    pool.submit('a', 'a', 1, callback=lambda *args: results.append(args), decode=broken)
+    finish(app, pool)
+    assert results == [('a', None, 'bad file')]
+
+
+def test_unkeyed_requests_merge_by_path(app, pool):
+    blocker = Blocker()
+    pool.submit('block', 'k0', 5, decode=blocker)
+    assert blocker.started.wait(5)
+    first = pool.submit('a', None, 1, decode=recorder([]))
+    assert pool.submit('a', None, 1, decode=recorder([])).job is first.job
+    assert pool.submit('b', None, 1, decode=recorder([])).job is not first.job
+    blocker.release.set()
+    finish(app, pool)
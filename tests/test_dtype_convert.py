@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+from components.dtype_convert import convert_into, rows_per_chunk, to_uint8, value_range
+
+# Small enough that every test image is converted in several row chunks
+CHUNK_BYTES = 1024
+
+
+def old_load_tiff_math(data):
+    # The conversion ImageLoader._load_tiff did before the chunked engine
+    if data.dtype.kind == 'f':
+        data_min = np.nanmin(data)
+        data_max = np.nanmax(data)
+        if data_max != data_min:
+            data = (data - data_min) / (data_max - data_min)
+        else:
+            data = np.zeros_like(data)
+        data = (data * 255).astype(np.uint8)
+    elif data.dtype == np.uint16:
+        data = (data / 256).astype(np.uint8)
+    return data
+
+
+def stretched(data, work):
+    # The old float branch applied to integer samples, in the engine's work type
+    return old_load_tiff_math(data.astype(work))
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(6)
+
+
+def test_chunk_size_splits_the_test_images():
+    data = np.zeros((37, 53), np.float32)
+    assert rows_per_chunk(data, CHUNK_BYTES) < data.shape[0] // 4
+
+
+@pytest.mark.parametrize('shape', [(37, 53), (29, 41, 3)])
+def test_float32_matches_old_math(rng, shape):
+    data = (rng.standard_normal(shape) * 1000 + 50).astype(np.float32)
+    expected = old_load_tiff_math(data)
+    assert np.array_equal(to_uint8(data, chunk_bytes=CHUNK_BYTES), expected)
+
+
+def test_float64_with_nan_matches_old_math_where_finite(rng):
+    data = rng.uniform(-3, 7, (37, 53))
+    data[::5, ::7] = np.nan
+    finite = np.isfinite(data)
+    with np.errstate(invalid='ignore'):
+        expected = old_load_tiff_math(data)
+    out = to_uint8(data, chunk_bytes=CHUNK_BYTES)
+    assert np.array_equal(out[finite], expected[finite])
+    # The old cast of NaN was undefined; NaN is now shown as black
+    assert not out[~finite].any()
+
+
+def test_constant_float_is_black():
+    data = np.full((37, 53), 3.5, np.float32)
+    assert np.array_equal(to_uint8(data, chunk_bytes=CHUNK_BYTES), old_load_tiff_math(data))
+
+
+def test_uint16_matches_old_math(rng):
+    data = rng.integers(0, 65536, (37, 53), dtype=np.uint16)
+    assert np.array_equal(to_uint8(data, chunk_bytes=CHUNK_BYTES), old_load_tiff_math(data))
+
+
+def test_big_endian_uint16_is_now_converted(rng):
+    native = rng.integers(0, 65536, (37, 53), dtype=np.uint16)
+    data = native.astype('>u2')
+    # The old code only recognised native uint16 and passed these samples on unconverted
+    assert old_load_tiff_math(data).dtype != np.uint8
+    out = to_uint8(data, chunk_bytes=CHUNK_BYTES)
+    assert np.array_equal(out, old_load_tiff_math(native))
+
+
+@pytest.mark.parametrize('dtype, work', [(np.int16, np.float32), ('>i2', np.float32),
+                                         (np.uint32, np.float64), ('>f4', np.float32)])
+def test_other_types_are_stretched_like_float(rng, dtype, work):
+    dtype = np.dtype(dtype)
+    info = np.iinfo(dtype) if dtype.kind in 'iu' else None
+    if info is not None:
+        data = rng.integers(info.min, info.max, (37, 53), dtype=dtype.newbyteorder('=')).astype(dtype)
+    else:
+        data = rng.standard_normal((37, 53)).astype(dtype)
+    if dtype.kind in 'iu':
+        # Passed on unconverted before (shown as garbage); now a min/max stretch
+        assert old_load_tiff_math(data).dtype != np.uint8
+    expected = stretched(data.astype(dtype.newbyteorder('=')), work)
+    assert np.array_equal(to_uint8(data, chunk_bytes=CHUNK_BYTES), expected)
+
+
+def test_convert_into_writes_a_strided_view(rng):
+    data = (rng.standard_normal((37, 53, 3)) * 10).astype(np.float32)
+    # Rows padded like a QImage scan line
+    buffer = np.full((37, 53 * 3 + 5), 7, np.uint8)
+    out = buffer[:, :53 * 3].reshape(37, 53, 3)
+    convert_into(data, out, chunk_bytes=CHUNK_BYTES)
+    assert np.array_equal(out, old_load_tiff_math(data))
+    assert (buffer[:, 53 * 3:] == 7).all()
+
+
+def test_value_range_skips_nan(rng):
+    data = rng.uniform(-3, 7, (37, 53))
+    data[0, 0] = np.nan
+    lo, hi = value_range(data, CHUNK_BYTES)
+    assert lo == np.nanmin(data) and hi == np.nanmax(data)
+
+
+def test_uint8_is_returned_as_is(rng):
+    data = rng.integers(0, 256, (37, 53), dtype=np.uint8)
+    assert to_uint8(data, chunk_bytes=CHUNK_BYTES) is data
@@ -0,0 +1,49 @@
+import itertools
+import re
+import pytest
+pytest.importorskip('PyQt6.QtCore')
+from components.file_filter import compile_filter, match_files, narrows
+
+# Every name over a small alphabet, to check narrowing exhaustively
+NAMES = [''.join(p) for n in range(1, 5) for p in itertools.product('ab.1', repeat=n)]
+
+
+def matching(pattern):
+    regex = re.compile(pattern)
+    return {name for name in NAMES if regex.search(name)}
+
+
+@pytest.mark.parametrize('old, new', [('a', 'ab'), ('a.', 'a.1'), ('a|b', 'a|ba'), ('[ab]', '[ab]1'),
+                                      ('^a', '^ab'), ('a*', 'a*b'), ('(a)', '(a)b')])
+def test_narrowing_patterns_match_a_subset(old, new):
+    assert narrows(old, new)
+    assert matching(new) <= matching(old)
+
+
+@pytest.mark.parametrize('old, new', [('a', 'a|b'), ('a', 'a*'), ('a', 'a?'), ('a', 'b'), ('ab', 'a'),
+                                      ('', 'a'), ('a', 'a.')])
+def test_other_edits_do_not_narrow(old, new):
+    assert not narrows(old, new)
+
+
+def test_narrows_never_claims_a_superset():
+    # Any plain-character extension of any valid pattern over the alphabet
+    patterns = [''.join(p) for n in range(1, 3) for p in itertools.product('ab.|*', repeat=n)]
+    for old in patterns:
+        if compile_filter(old) is None:
+            continue
+        for tail in ['a', 'b1', '1']:
+            new = old + tail
+            if narrows(old, new) and compile_filter(new) is not None:
+                assert matching(new) <= matching(old), (old, new)
+
+
+def test_match_files_uses_base_names():
+    files = ['/x/a1.png', '/a/b2.png', '/x/a3.png']
+    names = {'/x/a1.png': 'a1.png'}
+    assert match_files(files, names, re.compile('^a')) == ['/x/a1.png', '/x/a3.png']
+
+
+def test_invalid_or_empty_pattern_shows_everything():
+    assert compile_filter('') is None
+    assert compile_filter('a(') is None
@@ -0,0 +1,45 @@
+import random
+import pytest
+from components.file_listing import SMALL_CHANGE, apply_changes, is_image_name, list_image_files
+
+
+def reference(files, added, removed):
+    return sorted((set(files) - set(removed)) | set(added))
+
+
+@pytest.mark.parametrize('count', [3, SMALL_CHANGE + 40])
+def test_apply_changes_matches_set_arithmetic(count):
+    # Both the bisecting (small) and the merging (large) path
+    rng = random.Random(count)
+    universe = [f"/d/img_{i:05d}.png" for i in range(4 * count)]
+    files = sorted(rng.sample(universe, 2 * count))
+    # As the watcher reports them: disjoint, some added ones already listed and
+    # some removed ones never listed
+    changed = rng.sample(universe, 2 * count)
+    added, removed = sorted(changed[:count]), sorted(changed[count:])
+    expected = reference(files, added, removed)
+    assert apply_changes(list(files), added, removed) == expected
+
+
+def test_apply_changes_keeps_the_list_sorted_and_unique():
+    files = ['/d/a.png', '/d/c.png']
+    assert apply_changes(files, ['/d/b.png', '/d/c.png'], []) == ['/d/a.png', '/d/b.png', '/d/c.png']
+    many = [f"/d/n{i:04d}.png" for i in range(SMALL_CHANGE * 2)]
+    assert apply_changes(['/d/n0000.png'], many, []) == many
+
+
+def test_apply_changes_without_changes():
+    files = ['/d/a.png']
+    assert apply_changes(files, [], []) == ['/d/a.png']
+
+
+def test_image_names():
+    assert is_image_name('x.PNG') and is_image_name('a.b.tiff')
+    assert not is_image_name('notes.txt') and not is_image_name('png')
+
+
+def test_list_image_files(tmp_path):
+    for name in ['b.jpg', 'a.tif', 'c.txt']:
+        (tmp_path / name).write_bytes(b'')
+    (tmp_path / 'dir.png').mkdir()
+    assert list_image_files(str(tmp_path)) == [str(tmp_path / 'a.tif'), str(tmp_path / 'b.jpg')]
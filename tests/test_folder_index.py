@@ -0,0 +1,139 @@
+import itertools
+import os
+import sqlite3
+import time
+import pytest
+from components import folder_index
+from components.folder_index import FolderIndex
+
+# A directory mtime well outside the racy window
+OLD = 1_000_000_000 * 10**9
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = FolderIndex(str(tmp_path / 'db' / 'index.sqlite'))
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Every call is a second later, so "least recently used" is well defined
+    ticks = itertools.count(2_000_000_000)
+    monkeypatch.setattr(folder_index.time, 'time', lambda: float(next(ticks)))
+
+
+ENTRIES = {'a.png': (10, 111), 'b.tif': (20, 222)}
+
+
+def test_round_trip(index, tmp_path):
+    assert index.load(str(tmp_path / 'x')) is None
+    index.store(str(tmp_path / 'x'), OLD, ENTRIES)
+    listing = index.load(str(tmp_path / 'x'))
+    assert listing.dir_mtime_ns == OLD and listing.entries == ENTRIES
+    # Stored again: replaced, not merged
+    index.store(str(tmp_path / 'x'), OLD + 1, {'c.png': (1, 2)})
+    listing = index.load(str(tmp_path / 'x'))
+    assert listing.dir_mtime_ns == OLD + 1 and listing.entries == {'c.png': (1, 2)}
+
+
+def test_survives_reopening(tmp_path):
+    db = str(tmp_path / 'index.sqlite')
+    first = FolderIndex(db)
+    first.store(str(tmp_path / 'x'), OLD, ENTRIES)
+    first.close()
+    second = FolderIndex(db)
+    assert second.load(str(tmp_path / 'x')).entries == ENTRIES
+    second.close()
+
+
+def test_racy_listing_is_not_stored(index, tmp_path):
+    # The directory may still change within its mtime's tick
+    index.store(str(tmp_path / 'x'), time.time_ns(), ENTRIES)
+    assert index.load(str(tmp_path / 'x')) is None
+    index.store(str(tmp_path / 'x'), time.time_ns() - int((folder_index.RACY_SECONDS + 1) * 1e9), ENTRIES)
+    assert index.load(str(tmp_path / 'x')) is not None
+
+
+def test_listing_filtered_with_other_rules_is_ignored(index, tmp_path, monkeypatch):
+    index.store(str(tmp_path / 'x'), OLD, ENTRIES)
+    monkeypatch.setattr(folder_index, '_RULES', '.png')
+    assert index.load(str(tmp_path / 'x')) is None
+
+
+def test_least_recently_used_folders_are_pruned(index, tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(folder_index, 'MAX_FOLDERS', 3)
+    folders = [str(tmp_path / f"f{i}") for i in range(5)]
+    for folder in folders[:3]:
+        index.store(folder, OLD, ENTRIES)
+    index.load(folders[0]) # Opened again: now the most recent
+    index.store(folders[3], OLD, ENTRIES)
+    index.store(folders[4], OLD, ENTRIES)
+    assert [index.load(f) is not None for f in folders] == [True, False, False, True, True]
+    # Their files go with them
+    conn = sqlite3.connect(index.db_path)
+    assert conn.execute("SELECT COUNT(*) FROM files").fetchone()[0] == 3 * len(ENTRIES)
+    conn.close()
+
+
+def test_old_schema_is_replaced(tmp_path):
+    db = tmp_path / 'index.sqlite'
+    conn = sqlite3.connect(str(db))
+    conn.executescript("CREATE TABLE folders (path TEXT); PRAGMA user_version = 0;")
+    conn.close()
+    index = FolderIndex(str(db))
+    index.store(str(tmp_path / 'x'), OLD, ENTRIES)
+    assert index.load(str(tmp_path / 'x')).entries == ENTRIES
+    index.close()
+
+
+def test_unusable_database_is_not_an_error(tmp_path):
+    blocker = tmp_path / 'file'
+    blocker.write_text('')
+    index = FolderIndex(str(blocker / 'index.sqlite')) # Its directory is a file
+    index.store(str(tmp_path / 'x'), OLD, ENTRIES)
+    assert index.load(str(tmp_path / 'x')) is None
+
+
+def scan(folder, index):
+    # Runs a folder scan on this thread; returns the paths delivered and the error
+    scanner = pytest.importorskip('components.folder_scanner')
+    signals = scanner.ScanSignals()
+    found, finished = [], []
+    signals.batch_found.connect(lambda scan_id, paths: found.extend(paths))
+    signals.finished.connect(lambda scan_id, error: finished.append(error))
+    scanner.FolderScanTask(1, str(folder), signals, scanner.CancelToken(), index).run()
+    assert finished == [None]
+    return sorted(found)
+
+
+def age(folder):
+    # Moves the directory mtime out of the racy window
+    os.utime(folder, ns=(OLD, OLD))
+
+
+def test_scan_is_served_from_the_index_until_the_folder_changes(index, tmp_path, monkeypatch):
+    folder = tmp_path / 'images'
+    folder.mkdir()
+    for name in ('a.png', 'b.tif', 'notes.txt'):
+        (folder / name).write_bytes(b'x')
+    age(folder)
+    expected = [str(folder / 'a.png'), str(folder / 'b.tif')]
+    assert scan(folder, index) == expected
+    assert set(index.load(str(folder)).entries) == {'a.png', 'b.tif'}
+
+    from components import folder_scanner
+    listed = []
+    real = folder_scanner.iter_image_entries
+    monkeypatch.setattr(folder_scanner, 'iter_image_entries',
+                        lambda *args: listed.append(args) or real(*args))
+    assert scan(folder, index) == expected
+    assert listed == [] # Unchanged folder: not listed at all
+
+    # A new file changes the directory mtime: the stored listing is stale
+    (folder / 'c.png').write_bytes(b'x')
+    os.utime(folder, ns=(OLD + 10**9, OLD + 10**9))
+    assert scan(folder, index) == expected + [str(folder / 'c.png')]
+    assert len(listed) == 1
+    assert set(index.load(str(folder)).entries) == {'a.png', 'b.tif', 'c.png'}
@@ -0,0 +1,73 @@
+import pytest
+QtCore = pytest.importorskip('PyQt6.QtCore')
+from components import folder_scanner
+from components.folder_scanner import CancelToken, FolderScanner, FolderScanTask, ScanSignals
+
+
+def run_scan(folder, token=None):
+    # Runs a scan on this thread; returns its batches and what finished reported
+    signals = ScanSignals()
+    batches, finished = [], []
+    signals.batch_found.connect(lambda scan_id, paths: batches.append(paths))
+    signals.finished.connect(lambda scan_id, error: finished.append(error))
+    FolderScanTask(7, str(folder), signals, token or CancelToken()).run()
+    return batches, finished
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for i in range(300):
+        (tmp_path / f"{i:04d}.png").write_bytes(b'x')
+    (tmp_path / 'notes.txt').write_bytes(b'x')
+    return tmp_path
+
+
+def test_batches_start_small_and_grow(folder, monkeypatch):
+    monkeypatch.setattr(folder_scanner, 'FLUSH_INTERVAL', 1e9)
+    monkeypatch.setattr(folder_scanner, 'MAX_BATCH', 100)
+    batches, finished = run_scan(folder)
+    assert [len(b) for b in batches] == [1, 8, 64, 100, 100, 27]
+    assert all(b == sorted(b) for b in batches)
+    assert sorted(p for b in batches for p in b) == [str(folder / f"{i:04d}.png") for i in range(300)]
+    assert finished == [None]
+
+
+def test_slow_listing_still_delivers(folder, monkeypatch):
+    monkeypatch.setattr(folder_scanner, 'FLUSH_INTERVAL', 0)
+    batches, _ = run_scan(folder)
+    assert len(batches) == 300 # Every entry is overdue
+
+
+def test_cancelled_scan_reports_nothing_more(folder):
+    token = CancelToken()
+    signals = ScanSignals()
+    batches, finished = [], []
+    signals.batch_found.connect(lambda scan_id, paths: (batches.append(paths), token.cancel()))
+    signals.finished.connect(lambda scan_id, error: finished.append(error))
+    FolderScanTask(1, str(folder), signals, token).run()
+    assert len(batches) == 1 and finished == []
+
+
+def test_missing_folder_reports_an_error(tmp_path):
+    batches, finished = run_scan(tmp_path / 'missing')
+    assert batches == [] and len(finished) == 1 and finished[0]
+
+
+def test_superseded_scans_are_dropped():
+    scanner = FolderScanner()
+    delivered, finished = [], []
+    scanner.batch_found.connect(lambda side, paths: delivered.append((side, paths)))
+    scanner.finished.connect(lambda side, error: finished.append(side))
+    scanner._scans['A'] = (1, CancelToken())
+    old_token = scanner._scans['A'][1]
+    scanner.cancel('A')
+    scanner._scans['A'] = (2, CancelToken())
+    assert old_token.cancelled
+    # Signals of scan 1 that were already queued arrive after scan 2 started
+    scanner._on_batch(1, ['old'])
+    scanner._on_finished(1, None)
+    scanner._on_batch(2, ['new'])
+    assert delivered == [('A', ['new'])] and finished == []
+    assert scanner.is_scanning('A')
+    scanner._on_finished(2, None)
+    assert finished == ['A'] and not scanner.is_scanning('A')
@@ -0,0 +1,67 @@
+import os
+import shutil
+import time
+import pytest
+QtCore = pytest.importorskip('PyQt6.QtCore')
+from components import folder_watcher
+from components.folder_watcher import FolderWatcher
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+def wait_until(app, condition, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not condition() and time.monotonic() < end:
+        app.processEvents()
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def watched(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(folder_watcher, 'COALESCE_MS', 10)
+    folder = tmp_path / 'images'
+    folder.mkdir()
+    (folder / 'a.png').write_bytes(b'x')
+    files = [str(folder / 'a.png')]
+    watcher = FolderWatcher()
+    watcher.set_listing(lambda side: (files, False))
+    watcher.watch('A', str(folder))
+    watcher.watcher.directoryChanged.disconnect() # The tests trigger the diffs themselves
+    events = []
+    watcher.files_changed.connect(lambda side, added, removed: events.append(('changed', side, added, removed)))
+    watcher.failed.connect(lambda side, error: events.append(('failed', side)))
+    yield watcher, folder, files, events
+    watcher.unwatch('A')
+
+
+def test_changes_are_reported(app, watched):
+    watcher, folder, files, events = watched
+    (folder / 'b.png').write_bytes(b'x')
+    (folder / 'notes.txt').write_bytes(b'x')
+    os.remove(folder / 'a.png')
+    watcher._diff('A')
+    assert wait_until(app, lambda: events)
+    assert events == [('changed', 'A', [str(folder / 'b.png')], [str(folder / 'a.png')])]
+    assert not watcher._running
+
+
+def test_deleted_folder_releases_the_diff(app, watched):
+    watcher, folder, files, events = watched
+    shutil.rmtree(folder)
+    watcher._diff('A')
+    assert wait_until(app, lambda: events)
+    assert events == [('failed', 'A')]
+    assert not watcher._running
+    # Nothing is left retrying
+    assert not any(timer.isActive() for timer in watcher._timers.values())
+
+    # The folder coming back is picked up again
+    folder.mkdir()
+    (folder / 'c.png').write_bytes(b'x')
+    watcher._diff('A')
+    assert wait_until(app, lambda: len(events) == 2)
+    assert events[1] == ('changed', 'A', [str(folder / 'c.png')], files)
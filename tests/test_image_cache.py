@@ -0,0 +1,132 @@
+import os
+import threading
+from components.image_cache import ImageCache, cache_key, image_nbytes, page_key
+
+
+class Image:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = ImageCache(budget_bytes=100)
+    images = {k: Image(30) for k in 'abcd'}
+    for k in 'abc':
+        cache.put(k, images[k])
+    assert cache.used_bytes == 90
+    assert cache.get('a') is images['a'] # a is now the most recent
+    cache.put('d', images['d'])
+    assert not cache.contains('b')
+    assert all(cache.contains(k) for k in 'acd')
+    assert cache.used_bytes == 90
+    assert cache.stats()['evictions'] == 1
+
+
+def test_one_large_image_evicts_several():
+    cache = ImageCache(budget_bytes=100)
+    for k in 'abcd':
+        cache.put(k, Image(25))
+    cache.put('big', Image(70))
+    assert [k for k in 'abcd' if cache.contains(k)] == ['d']
+    assert cache.used_bytes == 95
+
+
+def test_image_over_the_budget_is_not_cached():
+    cache = ImageCache(budget_bytes=100)
+    cache.put('a', Image(50))
+    big = Image(101)
+    assert cache.put('big', big) is big
+    assert not cache.contains('big') and cache.contains('a')
+
+
+def test_put_returns_the_canonical_image():
+    cache = ImageCache(budget_bytes=100)
+    first, second = Image(10), Image(10)
+    assert cache.put('a', first) is first
+    # A second decode of the same file shares the first buffer
+    assert cache.put('a', second) is first
+    assert cache.used_bytes == 10
+    assert cache.put(None, second) is second # Unkeyed: not cached
+    assert cache.put('b', None) is None
+
+
+def test_put_of_a_known_key_refreshes_it():
+    cache = ImageCache(budget_bytes=30)
+    for k in 'abc':
+        cache.put(k, Image(10))
+    cache.put('a', Image(10))
+    cache.put('d', Image(10))
+    assert cache.contains('a') and not cache.contains('b')
+
+
+def test_peek_contains_and_size_of_leave_order_and_counters():
+    cache = ImageCache(budget_bytes=20)
+    cache.put('a', Image(10))
+    cache.put('b', Image(10))
+    assert cache.peek('a') is not None and cache.contains('a') and cache.size_of('a') == 10
+    assert cache.size_of('x') == 0 and cache.peek(None) is None
+    cache.put('c', Image(10))
+    assert not cache.contains('a') # Still the least recently used
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (0, 0)
+    assert cache.get('b') is not None and cache.get('a') is None
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 1)
+
+
+def test_shrinking_the_budget_evicts():
+    cache = ImageCache(budget_bytes=100)
+    for k in 'abcd':
+        cache.put(k, Image(25))
+    cache.set_budget(50)
+    assert cache.budget == 50 and cache.used_bytes == 50
+    assert [k for k in 'abcd' if cache.contains(k)] == ['c', 'd']
+
+
+def test_discard_and_clear():
+    cache = ImageCache(budget_bytes=100)
+    cache.put('a', Image(25))
+    cache.put('b', Image(25))
+    cache.discard('a')
+    cache.discard('missing')
+    assert cache.used_bytes == 25 and not cache.contains('a')
+    cache.clear()
+    assert cache.used_bytes == 0 and cache.stats()['entries'] == 0
+
+
+def test_concurrent_puts_stay_within_budget():
+    cache = ImageCache(budget_bytes=1000)
+
+    def fill(offset):
+        for i in range(500):
+            cache.put((offset, i % 60), Image(7 + i % 5))
+            cache.get((offset, (i * 7) % 60))
+    threads = [threading.Thread(target=fill, args=(t,)) for t in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = cache.stats()
+    assert stats['used_bytes'] <= 1000
+    assert stats['used_bytes'] == sum(cache.size_of(k) for k in cache._entries)
+
+
+def test_cache_key_follows_the_file(tmp_path):
+    path = tmp_path / 'a.png'
+    path.write_bytes(b'1234')
+    key = cache_key(str(path))
+    assert key == cache_key(str(path))
+    path.write_bytes(b'123456') # Edited in place
+    assert cache_key(str(path)) != key
+    os.remove(path)
+    assert cache_key(str(path)) is None
+
+
+def test_page_key():
+    assert page_key(('a', 1, 2), 0) == ('a', 1, 2)
+    assert page_key(('a', 1, 2), 3) == ('a', 1, 2, ('page', 3))
+    assert page_key(None, 3) is None
+
+
+def test_image_nbytes():
+    assert image_nbytes(Image(12)) == 12
+    assert image_nbytes(object()) == 0
@@ -0,0 +1,46 @@
+import math
+import numpy as np
+import pytest
+from components.image_metrics import compare
+
+# Strips of a few dozen rows, so windows straddling strips are exercised
+CHUNK_BYTES = 1 << 16
+
+
+def run(a, b):
+    return compare(lambda y0, y1: a[y0:y1], lambda y0, y1: b[y0:y1], a.shape, b.shape, a.dtype, b.dtype,
+                   chunk_bytes=CHUNK_BYTES)
+
+
+def noisy(shape, dtype, seed=16):
+    rng = np.random.default_rng(seed)
+    a = (rng.random(shape) * 200).astype(dtype)
+    b = np.clip(a.astype(np.float64) + rng.normal(0, 20, shape), 0, 255).astype(dtype)
+    return a, b
+
+
+@pytest.mark.parametrize('shape, dtype', [((300, 257), np.uint8), ((300, 257, 3), np.uint8),
+                                          ((200, 190, 4), np.uint8), ((150, 160, 3), np.float32)])
+def test_ssim_matches_skimage(shape, dtype):
+    metrics = pytest.importorskip('skimage.metrics')
+    a, b = noisy(shape, dtype)
+    result = run(a, b)
+    expected = metrics.structural_similarity(a.astype(np.float64), b.astype(np.float64),
+                                             data_range=result.data_range,
+                                             channel_axis=2 if a.ndim == 3 else None)
+    assert result.ssim == pytest.approx(expected, abs=1e-7)
+
+
+def test_mse_psnr_and_max_error():
+    a, b = noisy((120, 90, 3), np.uint8)
+    result = run(a, b)
+    d = a.astype(np.float64) - b
+    assert result.mse == pytest.approx(np.mean(d * d))
+    assert result.max_error == np.abs(d).max()
+    assert result.psnr == pytest.approx(10 * math.log10(255 ** 2 / result.mse))
+
+
+def test_identical_images():
+    a, _ = noisy((64, 64), np.uint16)
+    result = run(a, a)
+    assert result.mse == 0 and result.psnr == math.inf and result.ssim == pytest.approx(1.0)
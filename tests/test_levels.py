@@ -0,0 +1,132 @@
+import numpy as np
+import pytest
+from components.levels import AUTO_CLIP, HIST_BINS, Levels, level_table, levels_into, sample_stats
+
+# Small enough that every test image is mapped in several row chunks
+CHUNK_BYTES = 1024
+
+
+def reference(data, low, high, gamma):
+    # The window and gamma applied to every sample in float64
+    t = np.clip((data.astype(np.float64) - low) / (high - low), 0, 1) ** (1.0 / gamma)
+    return (t * 255 + 0.5).astype(np.uint8)
+
+
+def mapped(data, window):
+    out = np.empty(data.shape, np.uint8)
+    assert levels_into(data, out, window, chunk_bytes=CHUNK_BYTES) is out
+    return out
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(23)
+
+
+def test_stats_of_uint16(rng):
+    data = rng.integers(1000, 3000, (300, 200), dtype=np.uint16)
+    stats = sample_stats(data)
+    assert (stats.lo, stats.hi) == (data.min(), data.max())
+    assert stats.counts.sum() == data.size and len(stats.counts) == HIST_BINS
+    assert stats.percentile(50) == pytest.approx(np.percentile(data, 50), abs=10)
+
+
+def test_stats_skip_alpha_and_nan(rng):
+    rgba = rng.integers(10, 20, (40, 30, 4), dtype=np.uint8)
+    rgba[..., 3] = 255
+    assert sample_stats(rgba).hi == 19
+    data = rng.random((50, 60)).astype(np.float32) * 4 - 1
+    data[::7, ::3] = np.nan
+    stats = sample_stats(data)
+    assert (stats.lo, stats.hi) == (float(np.nanmin(data)), float(np.nanmax(data)))
+    assert stats.counts.sum() == np.isfinite(data).sum()
+
+
+def test_stats_of_a_huge_image_are_subsampled(monkeypatch):
+    monkeypatch.setattr('components.levels.STATS_SAMPLES', 1000)
+    data = np.arange(200 * 300, dtype=np.uint16).reshape(200, 300)
+    assert sample_stats(data).counts.sum() <= 1100
+
+
+def test_auto_window_clips_the_tails(rng):
+    data = rng.integers(0, 1000, (400, 400)).astype(np.uint16)
+    data[0, :10] = 60000 # A few hot pixels
+    low, high, gamma = Levels(gamma=1.5).window(sample_stats(data))
+    assert low == pytest.approx(np.percentile(data, AUTO_CLIP), abs=70)
+    assert high == pytest.approx(np.percentile(data, 100 - AUTO_CLIP), abs=70)
+    assert gamma == 1.5
+
+
+def test_window():
+    assert Levels(10, 20, 2.0).window(None) == (10, 20, 2.0) # Fixed: no stats needed
+    assert Levels().window(None) is None # Auto: unknown until the image is there
+    assert Levels(low=10).auto
+
+
+def test_window_of_a_constant_or_empty_image():
+    assert Levels().window(sample_stats(np.full((8, 8), 7, np.uint16))) == (7.0, 7.0, 1.0)
+    assert Levels().window(sample_stats(np.full((8, 8), np.nan, np.float32))) == (0.0, 0.0, 1.0)
+
+
+def test_level_table():
+    table = level_table(np.dtype(np.uint8), (0, 255, 1.0))
+    np.testing.assert_array_equal(table, np.arange(256))
+    # Indexed by the raw bits: for big-endian samples, the byte-swapped value
+    table = level_table(np.dtype('>u2'), (0, 65535, 1.0))
+    raw = np.arange(65536, dtype=np.uint16)
+    np.testing.assert_array_equal(table, reference(raw.view('>u2'), 0, 65535, 1.0))
+    assert table[0x0001] == reference(np.array([256]), 0, 65535, 1.0)[0]
+    signed = level_table(np.dtype(np.int8), (-128, 127, 1.0))
+    assert signed[0x80] == 0 and signed[0x7f] == 255
+
+
+@pytest.mark.parametrize('gamma', [1.0, 0.5, 2.2])
+def test_uint8(rng, gamma):
+    data = rng.integers(0, 256, (37, 53), dtype=np.uint8)
+    np.testing.assert_array_equal(mapped(data, (40, 200, gamma)), reference(data, 40, 200, gamma))
+
+
+@pytest.mark.parametrize('dtype', ['<u2', '>u2', '<i2'])
+def test_16_bit(rng, dtype):
+    data = rng.integers(-3000 if dtype == '<i2' else 0, 30000, (37, 53)).astype(dtype)
+    np.testing.assert_array_equal(mapped(data, (500, 20000, 1.3)), reference(data, 500, 20000, 1.3))
+
+
+def test_float_with_nan(rng):
+    data = (rng.random((37, 53)) * 10 - 2).astype(np.float32)
+    data[::5, ::4] = np.nan
+    out = mapped(data, (0.0, 6.0, 0.8))
+    finite = np.isfinite(data)
+    expected = reference(np.nan_to_num(data), 0.0, 6.0, 0.8)
+    # Floats go through a 4096-step table: off by at most one level
+    assert np.abs(out[finite].astype(int) - expected[finite]).max() <= 1
+    assert (out[~finite] == 0).all()
+
+
+def test_zero_width_window_is_a_threshold(rng):
+    data = rng.integers(0, 10, (20, 20)).astype(np.float64)
+    np.testing.assert_array_equal(mapped(data, (5.0, 5.0, 1.0)), np.where(data >= 5, 255, 0))
+    ints = data.astype(np.uint16)
+    np.testing.assert_array_equal(mapped(ints, (5, 5, 1.0)), np.where(ints >= 5, 255, 0))
+
+
+def test_constant_image():
+    data = np.full((20, 30), 1234, np.uint16)
+    np.testing.assert_array_equal(mapped(data, (1234, 1234, 1.0)), 255)
+    window = Levels().window(sample_stats(data.astype(np.float32)))
+    np.testing.assert_array_equal(mapped(data.astype(np.float32), window), 255)
+
+
+def test_alpha_is_kept(rng):
+    rgba = rng.integers(0, 65536, (25, 30, 4), dtype=np.uint16)
+    out = mapped(rgba, (0, 65535, 1.0))
+    np.testing.assert_array_equal(out[..., :3], reference(rgba[..., :3], 0, 65535, 1.0))
+    np.testing.assert_array_equal(out[..., 3], (rgba[..., 3] / 256).astype(np.uint8))
+
+
+def test_into_a_strided_view(rng):
+    data = rng.integers(0, 256, (30, 20), dtype=np.uint8)
+    buffer = np.zeros((30, 24), np.uint8) # Row padding, like a QImage
+    levels_into(data, buffer[:, :20], (0, 255, 1.0), chunk_bytes=CHUNK_BYTES)
+    np.testing.assert_array_equal(buffer[:, :20], data)
+    assert not buffer[:, 20:].any()
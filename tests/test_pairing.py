@@ -0,0 +1,90 @@
+import os
+from components.pairing import PairGroup, PairIndex, compile_pair_key, file_keys, stem_key
+
+
+def paths(folder, names):
+    return [os.path.join(folder, n) for n in names]
+
+
+def test_stem_key():
+    assert stem_key('a.tif') == 'a'
+    assert stem_key('a.b.png') == 'a.b'
+    assert stem_key('noext') == 'noext'
+    assert file_keys(paths('x', ['a.tif', 'noext', 'c.d.png'])) == ['a', 'noext', 'c.d']
+
+
+def test_compile_pair_key():
+    assert compile_pair_key('') is stem_key
+    assert compile_pair_key('(') is stem_key # Invalid pattern
+    group = compile_pair_key(r'_(\d+)\.')
+    assert group('scan_012.tif') == '012' and group('scan.tif') is None
+    whole = compile_pair_key(r'\d+')
+    assert whole('img42_v2.png') == '42'
+
+
+def test_one_missing_file_does_not_shift_later_pairs():
+    index = PairIndex(paths('a', ['1.tif', '2.tif', '3.tif', '4.tif']),
+                      paths('b', ['1.png', '3.png', '4.png', '5.png']))
+    assert index.pairs == [(0, 0), (2, 1), (3, 2)]
+    assert len(index) == 3
+    assert index.partner('A', 2) == 1 and index.partner('B', 1) == 2
+    assert index.partner('A', 1) is None and index.partner('B', 3) is None
+
+
+def test_first_file_of_a_key_wins():
+    key = compile_pair_key(r'^(\w)')
+    index = PairIndex(paths('a', ['x1', 'x2', 'y1']), paths('b', ['x9', 'x8', 'y9']), key)
+    assert index.pairs == [(0, 0), (2, 2)]
+    assert index.partner('A', 1) is None and index.partner('B', 1) is None
+
+
+def test_unpairable_names_are_skipped():
+    key = compile_pair_key(r'_(\d+)')
+    index = PairIndex(paths('a', ['plain', 'a_1', 'a_2']), paths('b', ['other', 'b_2', 'b_1']), key)
+    assert index.pairs == [(1, 2), (2, 1)]
+    assert index.partner('A', 0) is None and index.partner('B', 0) is None
+
+
+def test_empty_lists():
+    index = PairIndex([], paths('b', ['1']))
+    assert len(index) == 0 and index.partner('B', 0) is None
+
+
+def test_group_pairs_every_list_with_the_reference():
+    group = PairGroup([paths('a', ['1', '2', '3']), paths('b', ['1', '3']), paths('c', ['0', '1', '2', '3'])])
+    assert group.common == [0, 2]
+    assert group.members(2) == [2, 1, 3]
+    assert group.members(1) is None
+    assert group.reference(2, 3) == 2
+    assert group.step([0, 0, 1], 1) == [2, 1, 3]
+    assert group.step([1, 5, 2], -1) == [0, 0, 1] # From a file not in any group
+    assert [group.unmatched_count(i) for i in range(3)] == [1, 0, 2]
+    assert group.unmatched(2) == [0, 2]
+
+
+def test_group_skips_empty_lists():
+    # A panel with no folder open must not leave every other file unmatched
+    group = PairGroup([paths('a', ['1', '2', '3']), paths('b', ['1', '3']), []])
+    assert group.common == [0, 2]
+    assert group.members(0) == [0, 0, None]
+    assert group.step([0, 0, 0], 1) == [2, 1, None]
+    assert group.reference(2, 0) is None
+    assert [group.unmatched_count(i) for i in range(3)] == [1, 0, 0]
+    assert group.unmatched(2) == []
+
+
+def test_group_reference_is_the_first_list_with_files():
+    group = PairGroup([[], paths('b', ['1', '2']), paths('c', ['2', '3'])])
+    assert group.ref == 1
+    assert group.common == [1]
+    assert group.members(1) == [None, 1, 0]
+    assert group.step([0, 0, 1], 1) == [None, 1, 0]
+    assert [group.unmatched_count(i) for i in range(3)] == [0, 1, 1]
+    assert group.unmatched(2) == [1]
+
+
+def test_group_of_one_list_with_files():
+    group = PairGroup([paths('a', ['1', '2']), [], []])
+    assert group.common == [0, 1]
+    assert group.step([0, 0, 0], 1) == [1, None, None]
+    assert PairGroup([[], []]).step([0, 0], 1) is None
@@ -0,0 +1,146 @@
+import os
+import pytest
+pytest.importorskip('PyQt6.QtGui')
+from PyQt6.QtGui import QImage
+from components.decode_pool import PRIORITY_PREFETCH
+from components.decoding import DecodedImage
+from components.image_cache import ImageCache, cache_key
+from components.prefetcher import Prefetcher
+
+
+class Request:
+    def __init__(self, path, callback):
+        self.path = path
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+# Records submissions instead of decoding
+class Pool:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, path, key, priority, owner=None, callback=None, limit=None):
+        assert priority == PRIORITY_PREFETCH and key == cache_key(path)
+        request = Request(path, callback)
+        self.submitted.append(request)
+        return request
+
+    def cancel_owner(self, owner):
+        for request in self.submitted:
+            request.cancel()
+
+    def live(self):
+        return [os.path.basename(r.path) for r in self.submitted if not r.cancelled]
+
+
+class Image:
+    def __init__(self, nbytes):
+        self.nbytes = nbytes
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for i in range(10):
+        path = tmp_path / f"{i}.png"
+        path.write_bytes(b'x')
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def pool():
+    return Pool()
+
+
+def make(pool, budget=1000, depth=4):
+    return Prefetcher(ImageCache(budget), pool, depth=depth)
+
+
+def test_direction_is_guessed_from_recent_steps(pool):
+    prefetcher = make(pool)
+    assert prefetcher.direction('A') == 0
+    for step in (1, 1, -1):
+        prefetcher.note_step('A', step)
+    assert prefetcher.direction('A') == 1
+    for step in (-1, -1, -1):
+        prefetcher.note_step('A', step)
+    assert prefetcher.direction('A') == -1 # Only the last few steps count
+    prefetcher.reset('A')
+    assert prefetcher.direction('A') == 0
+
+
+def test_fetches_ahead_then_one_behind(pool, files):
+    prefetcher = make(pool)
+    prefetcher.note_step('A', 1)
+    prefetcher.schedule([('A', files, 5)])
+    assert pool.live() == ['6.png', '7.png', '8.png', '9.png', '4.png']
+    pool.submitted.clear()
+    prefetcher.reset('A')
+    prefetcher.note_step('A', -1)
+    prefetcher.schedule([('A', files, 2)])
+    assert pool.live() == ['1.png', '0.png', '3.png']
+
+
+def test_alternates_without_a_direction(pool, files):
+    make(pool).schedule([('A', files, 5)])
+    assert pool.live() == ['6.png', '4.png', '7.png', '3.png']
+
+
+def test_sides_are_interleaved(pool, files):
+    prefetcher = make(pool, depth=2)
+    prefetcher.note_step('A', 1)
+    prefetcher.note_step('B', 1)
+    prefetcher.schedule([('A', files[:5], 0), ('B', files[5:], 0)])
+    assert pool.live() == ['1.png', '6.png', '2.png', '7.png']
+
+
+def test_work_that_left_the_window_is_cancelled(pool, files):
+    prefetcher = make(pool)
+    prefetcher.note_step('A', 1)
+    prefetcher.schedule([('A', files, 0)])
+    first = {r.path: r for r in pool.submitted}
+    prefetcher.schedule([('A', files, 2)])
+    # 1 is behind now but kept warm; 2 is on screen and out of the window
+    assert first[files[2]].cancelled and not first[files[1]].cancelled
+    assert not first[files[3]].cancelled
+    assert sorted(pool.live()) == ['1.png', '3.png', '4.png', '5.png', '6.png']
+    assert len(pool.submitted) == 6 # Only 5 and 6 were new
+
+
+def test_cached_images_fill_the_window(pool, files):
+    prefetcher = make(pool, budget=1000)
+    prefetcher.note_step('A', 1)
+    for path in files[1:3]:
+        prefetcher.cache.put(cache_key(path), Image(300))
+    prefetcher.schedule([('A', files, 0)])
+    # 600 bytes held already: one more decode reaches the 500-byte ceiling
+    assert prefetcher.memory_ceiling() == 500
+    assert prefetcher.window_bytes == 600
+    assert pool.live() == []
+
+
+def test_decodes_stop_at_the_memory_ceiling(pool, files):
+    decoded = DecodedImage(QImage(100, 100, QImage.Format.Format_Grayscale8))
+    prefetcher = make(pool, budget=5 * decoded.nbytes) # Ceiling: two and a half images
+    prefetcher.note_step('A', 1)
+    prefetcher.schedule([('A', files, 0)])
+    assert pool.live() == ['1.png', '2.png', '3.png', '4.png']
+    pool.submitted[0].callback(files[1], decoded, None)
+    pool.submitted[1].callback(files[2], decoded, None)
+    assert not pool.submitted[2].cancelled
+    pool.submitted[2].callback(files[3], decoded, None)
+    assert prefetcher.window_bytes == 3 * decoded.nbytes
+    assert pool.submitted[3].cancelled
+
+
+def test_failed_decodes_are_forgotten(pool, files):
+    prefetcher = make(pool)
+    prefetcher.note_step('A', 1)
+    prefetcher.schedule([('A', files, 0)])
+    pool.submitted[0].callback(files[1], None, "Failed to decode")
+    assert prefetcher.window_bytes == 0 and cache_key(files[1]) not in prefetcher._pending
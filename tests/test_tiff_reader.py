@@ -0,0 +1,224 @@
+import numpy as np
+import pytest
+tifffile = pytest.importorskip('tifffile')
+from components import tiff_reader
+from components.dtype_convert import value_range
+from components.tiff_reader import TiffRegionReader, TiffStack, keep_stack, open_stack
+
+
+def write_stack(path, count=5, shape=(16, 12), dtype=np.uint16):
+    # Page i is filled with i * 100
+    pages = np.stack([np.full(shape, i * 100, dtype=dtype) for i in range(count)])
+    tifffile.imwrite(str(path), pages, photometric='minisblack')
+    return pages
+
+
+@pytest.fixture(autouse=True)
+def no_open_stacks():
+    tiff_reader._stacks.clear()
+    yield
+    for stack in tiff_reader._stacks.values():
+        stack.close()
+    tiff_reader._stacks.clear()
+
+
+def test_stack_reads_each_page(tmp_path):
+    path = tmp_path / 'stack.tif'
+    pages = write_stack(path)
+    stack = TiffStack.from_file(str(path), tifffile.TiffFile(str(path)))
+    try:
+        assert stack.count == 5
+        for i in range(5):
+            np.testing.assert_array_equal(stack.read(i), pages[i])
+        # Out-of-range indices are clamped to the first and last page
+        np.testing.assert_array_equal(stack.read(-3), pages[0])
+        np.testing.assert_array_equal(stack.read(99), pages[4])
+    finally:
+        stack.close()
+
+
+def test_pages_of_every_series(tmp_path):
+    path = tmp_path / 'series.tif'
+    with tifffile.TiffWriter(str(path)) as tw:
+        tw.write(np.full((8, 8), 1, np.uint8))
+        tw.write(np.full((2, 6, 6), 2, np.uint8))
+    stack = TiffStack.from_file(str(path), tifffile.TiffFile(str(path)))
+    try:
+        assert stack.count == 3
+        assert stack.read(0).shape == (8, 8)
+        assert stack.read(2).shape == (6, 6) and stack.read(2)[0, 0] == 2
+    finally:
+        stack.close()
+
+
+def test_planar_rgb_page_is_interleaved(tmp_path):
+    path = tmp_path / 'planar.tif'
+    rgb = np.arange(2 * 3 * 5 * 7, dtype=np.uint8).reshape(2, 3, 5, 7)
+    tifffile.imwrite(str(path), rgb, photometric='rgb', planarconfig='separate')
+    stack = TiffStack.from_file(str(path), tifffile.TiffFile(str(path)))
+    try:
+        np.testing.assert_array_equal(stack.read(1), np.moveaxis(rgb[1], 0, 2))
+    finally:
+        stack.close()
+
+
+def test_single_page_is_not_a_stack(tmp_path):
+    path = tmp_path / 'one.tif'
+    tifffile.imwrite(str(path), np.zeros((4, 4), np.uint8))
+    tif = tifffile.TiffFile(str(path))
+    try:
+        assert TiffStack.from_file(str(path), tif) is None
+        assert tif.asarray().shape == (4, 4) # Left open and usable
+    finally:
+        tif.close()
+
+
+def test_cancelled_read(tmp_path):
+    decoding = pytest.importorskip('components.decoding')
+    path = tmp_path / 'stack.tif'
+    write_stack(path, count=2)
+    stack = TiffStack.from_file(str(path), tifffile.TiffFile(str(path)))
+    token = decoding.CancelToken()
+    token.cancel()
+    try:
+        with pytest.raises(decoding.DecodeCancelled):
+            stack.read(1, token)
+    finally:
+        stack.close()
+
+
+def test_kept_stacks(tmp_path, monkeypatch):
+    monkeypatch.setattr(tiff_reader, 'MAX_OPEN_STACKS', 2)
+    stacks = []
+    for i in range(3):
+        path = tmp_path / f"s{i}.tif"
+        write_stack(path, count=2)
+        stacks.append(TiffStack.from_file(str(path), tifffile.TiffFile(str(path))))
+        keep_stack(stacks[-1])
+    assert open_stack(str(tmp_path / 's0.tif')) is None # Evicted
+    assert open_stack(str(tmp_path / 's1.tif')) is stacks[1]
+    assert open_stack(str(tmp_path / 's2.tif')) is stacks[2]
+    stacks[0].close()
+    # A rewritten file is not served from the old stack
+    write_stack(tmp_path / 's2.tif', count=3, shape=(20, 20))
+    assert open_stack(str(tmp_path / 's2.tif')) is None
+
+
+def test_load_tiff_pages(tmp_path):
+    decoding = pytest.importorskip('components.decoding')
+    path = tmp_path / 'stack.tif'
+    pages = write_stack(path, count=4)
+    decoded = decoding.load_tiff(str(path), page=2)
+    assert decoded.page_count == 4
+    np.testing.assert_array_equal(decoded.source, pages[2])
+    stack = open_stack(str(path))
+    assert stack is not None and stack.count == 4
+    # Later pages come from the kept stack
+    assert decoding.load_tiff(str(path), page=3).source[0, 0] == 300
+    assert open_stack(str(path)) is stack
+
+
+def test_load_tiff_single_page(tmp_path):
+    decoding = pytest.importorskip('components.decoding')
+    path = tmp_path / 'one.tif'
+    tifffile.imwrite(str(path), np.full((4, 4), 7, np.uint16))
+    decoded = decoding.load_tiff(str(path))
+    assert decoded.page_count == 1
+    assert open_stack(str(path)) is None
+
+
+def image(shape=(700, 520), dtype=np.uint16):
+    return np.arange(np.prod(shape), dtype=np.uint64).reshape(shape).astype(dtype)
+
+
+@pytest.fixture
+def small_levels(monkeypatch):
+    # Subsampled levels for test-sized images
+    monkeypatch.setattr(tiff_reader, 'OVERVIEW_SIDE', 100)
+
+
+def open_reader(path):
+    reader = TiffRegionReader.open(str(path), min_side=0)
+    assert reader is not None
+    return reader
+
+
+@pytest.mark.parametrize('layout', [
+    {'compression': 'zlib', 'tile': (64, 64)},
+    {'compression': 'zlib', 'rowsperstrip': 16},
+    {}, # Contiguous: memory-mapped
+])
+def test_region_reads(tmp_path, small_levels, layout):
+    data = image()
+    path = tmp_path / 'big.tif'
+    tifffile.imwrite(str(path), data, **layout)
+    reader = open_reader(path)
+    try:
+        assert (reader.levels[0][0].memmap is not None) == (not layout)
+        assert (reader.width, reader.height) == (520, 700)
+        np.testing.assert_array_equal(reader.read_region(0, 70, 33, 300, 650), data[33:650, 70:300])
+        # Clipped to the image
+        np.testing.assert_array_equal(reader.read_region(0, -10, 690, 600, 800), data[690:, :])
+        # Coarser levels subsample the full resolution
+        assert reader.level_count == 4
+        with tifffile.TiffFile(str(path)) as tif:
+            full = tif.asarray()
+        for index in range(1, reader.level_count):
+            step = reader.levels[index][1]
+            w, h = reader.level_size(index)
+            np.testing.assert_array_equal(reader.read_region(index, 0, 0, w, h), full[::step, ::step])
+            np.testing.assert_array_equal(reader.read_region(index, 3, 5, 17, 40), full[::step, ::step][5:40, 3:17])
+    finally:
+        reader.close()
+
+
+def test_rgb_region(tmp_path):
+    data = image((300, 260, 3), np.uint8)
+    path = tmp_path / 'rgb.tif'
+    tifffile.imwrite(str(path), data, photometric='rgb', compression='zlib', tile=(32, 32))
+    reader = open_reader(path)
+    try:
+        np.testing.assert_array_equal(reader.read_region(0, 40, 50, 200, 290), data[50:290, 40:200])
+    finally:
+        reader.close()
+
+
+def test_large_compressed_segments_are_decoded_whole(tmp_path):
+    data = image()
+    path = tmp_path / 'strip.tif'
+    tifffile.imwrite(str(path), data, compression='zlib', rowsperstrip=700)
+    assert TiffRegionReader.open(str(path), min_side=0) is None
+    # Uncompressed, the same layout is memory-mapped
+    tifffile.imwrite(str(path), data, rowsperstrip=700)
+    open_reader(path).close()
+
+
+def test_small_files_are_not_read_by_region(tmp_path):
+    path = tmp_path / 'small.tif'
+    tifffile.imwrite(str(path), image(), compression='zlib', tile=(64, 64))
+    assert TiffRegionReader.open(str(path), min_side=1000) is None
+
+
+def test_value_range_from_samples_already_read(tmp_path, small_levels):
+    data = image(dtype=np.float32)
+    path = tmp_path / 'float.tif'
+    tifffile.imwrite(str(path), data, compression='zlib', tile=(64, 64))
+    reader = open_reader(path)
+    try:
+        coarsest = reader.level_count - 1
+        w, h = reader.level_size(coarsest)
+        samples = reader.read_region(coarsest, 0, 0, w, h)
+        assert reader.value_range(samples) == reader.value_range() == value_range(samples)
+    finally:
+        reader.close()
+
+
+def test_closed_reader_shares_and_releases(tmp_path):
+    path = tmp_path / 'big.tif'
+    tifffile.imwrite(str(path), image())
+    reader = open_reader(path)
+    assert reader.share() is reader
+    reader.close()
+    assert reader.levels[0][0].memmap is not None # One holder left
+    reader.close()
+    assert reader.levels[0][0].memmap is None and reader.tif.filehandle.closed